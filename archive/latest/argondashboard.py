@@ -3,6 +3,7 @@
 import time
 import os
 import sys
+import struct
 
 import signal
 import curses
@@ -29,7 +30,121 @@ COLORPAIRID_GOOD=6
 
 INPUTREFRESHMS=100
 DISPLAYREFRESHMS=5000
-UPS_LOGFILE="/dev/shm/upslog.txt"
+# Battery state, published by the service as a fixed layout record: magic,
+# version, percent, on battery flag, status id, sequence (odd while the record
+# is being written), time of the last change.  See argononeupd.py
+UPS_STATEFILE="/dev/shm/upsstate.bin"
+UPS_STATEFORMAT="<4sBBBBId"
+UPS_STATESIZE=struct.calcsize(UPS_STATEFORMAT)
+UPS_STATEMAGIC=b"AUPS"
+UPS_STATEVERSION=1
+UPS_STATUSLIST=["", "Battery", "Charging", "Charged"]
+# Samples published by the system monitor's collector, if one is running: a
+# header, the series names, then a ring of slots, each guarded by a sequence
+# that is odd while it is being written.  See monitor/samplebus.py
+MONITOR_BUSFILE="/dev/shm/oneupmon.bus"
+MONITOR_BUSHEADERFORMAT="<4sIIIIQd"
+MONITOR_BUSSLOTFORMAT="<QQqd"
+MONITOR_BUSSLOTSIZE=struct.calcsize(MONITOR_BUSSLOTFORMAT)
+MONITOR_BUSMAGIC=b"OUMB"
+MONITOR_BUSVERSION=1
+MONITOR_BUSHEADERSIZE=64
+MONITOR_BUSNAMESOFFSET=MONITOR_BUSHEADERSIZE+12
+
+
+#############
+# Battery (copied)
+#############
+
+def battery_decodestate(record):
+	# Turns a state record into the status the service reports, {} if there is none
+	outobj = {}
+	if len(record) < UPS_STATESIZE:
+		return outobj
+	magic, version, percent, onbattery, statusid, sequence, updated = struct.unpack(UPS_STATEFORMAT, record[:UPS_STATESIZE])
+	if magic != UPS_STATEMAGIC or version != UPS_STATEVERSION or statusid <= 0 or statusid >= len(UPS_STATUSLIST):
+		return outobj
+	outobj["status"] = UPS_STATUSLIST[statusid]
+	outobj["percent"] = percent
+	outobj["onbattery"] = onbattery
+	outobj["time"] = updated
+	outobj["power"] = UPS_STATUSLIST[statusid]+" "+str(percent)+"%"
+	return outobj
+
+
+def battery_loadstate():
+	# Reads the state the service publishes, retrying if it changed mid-read
+	try:
+		fd = os.open(UPS_STATEFILE, os.O_RDONLY)
+		try:
+			maxretry = 10
+			while maxretry > 0:
+				maxretry = maxretry - 1
+				sequence = os.pread(fd, 4, 8)
+				record = os.pread(fd, UPS_STATESIZE, 0)
+				if len(record) == UPS_STATESIZE and (sequence[0]&1) == 0 and record[8:12] == sequence and os.pread(fd, 4, 8) == sequence:
+					return battery_decodestate(record)
+		finally:
+			os.close(fd)
+	except OSError:
+		pass
+	return {}
+
+
+#############
+# Monitor (copied)
+#############
+
+def monitor_loadsample():
+	# Reads the newest sample the monitor published, as "<group>/<name>" -> value
+	# (e.g. "cpu/cpu0", "temperatures/CPU"). {} if no collector is publishing, or
+	# it stopped, in which case the panels read the system themselves
+	outobj = {}
+	try:
+		fd = os.open(MONITOR_BUSFILE, os.O_RDONLY)
+		try:
+			header = os.pread(fd, struct.calcsize(MONITOR_BUSHEADERFORMAT), 0)
+			magic, version, slots, maxseries, namessize, written, interval = struct.unpack(MONITOR_BUSHEADERFORMAT, header)
+			if magic != MONITOR_BUSMAGIC or version != MONITOR_BUSVERSION or written == 0:
+				return outobj
+			slotsize = -(-(MONITOR_BUSSLOTSIZE + 8*maxseries)//64)*64
+			offset = MONITOR_BUSHEADERSIZE + namessize + ((written-1)%slots)*slotsize
+			maxretry = 10
+			while maxretry > 0:
+				maxretry = maxretry - 1
+				sequence, generation, timestamp, walltime = struct.unpack(MONITOR_BUSSLOTFORMAT, os.pread(fd, MONITOR_BUSSLOTSIZE, offset))
+				if (sequence&1) != 0:
+					continue
+				# Samples older than five intervals mean the collector has gone
+				if (time.monotonic_ns()-timestamp)/1e9 >= max(5, 5*interval):
+					return outobj
+				namessequence, nameslength = struct.unpack("<QI", os.pread(fd, 12, MONITOR_BUSHEADERSIZE))
+				if (namessequence&1) != 0 or namessequence//2 != generation:
+					continue
+				names = os.pread(fd, nameslength, MONITOR_BUSNAMESOFFSET).decode("utf8").split("\n") if nameslength > 0 else []
+				values = struct.unpack("<"+str(len(names))+"d", os.pread(fd, 8*len(names), offset+MONITOR_BUSSLOTSIZE))
+				if os.pread(fd, 8, offset) != struct.pack("<Q", sequence) or os.pread(fd, 8, MONITOR_BUSHEADERSIZE) != struct.pack("<Q", namessequence):
+					continue
+				for idx in range(len(names)):
+					# NaN is a reading the collector does not have yet
+					if values[idx] == values[idx]:
+						outobj[names[idx]] = values[idx]
+				return outobj
+		finally:
+			os.close(fd)
+	except (OSError, ValueError, struct.error):
+		pass
+	return {}
+
+
+def monitor_getgroup(monitorobj, group):
+	# Values of one group of the sample, e.g. "temperatures" -> {"CPU": 45.2, "nvme0n1": 38.0}
+	outobj = {}
+	prefix = group+"/"
+	for curname in monitorobj:
+		if curname.startswith(prefix):
+			outobj[curname[len(prefix):]] = monitorobj[curname]
+	return outobj
 
 
 ###################
@@ -54,29 +169,16 @@ def displayipbattery(stdscr):
 	try:
 		status = ""
 		level = ""
-		outobj = {}
 		# Load status
-		fp = open(UPS_LOGFILE, "r")
-		logdata = fp.read()
-		alllines = logdata.split("\n")
-		ctr = 0
-		while ctr < len(alllines):
-			tmpval = alllines[ctr].strip()
-			curinfo = tmpval.split(":")
-			if len(curinfo) > 1:
-				tmpattrib = curinfo[0].lower().split(" ")
-				# The rest are assumed to be value
-				outobj[tmpattrib[0]] = tmpval[(len(curinfo[0])+1):].strip()
-			ctr = ctr + 1
+		outobj = battery_loadstate()
 
 		# Map to data
 		try:
-			statuslist = outobj["power"].lower().split(" ")
-			if statuslist[0] == "battery":
+			if outobj["onbattery"] != 0:
 				tmp_charging = 0
 			else:
 				tmp_charging = 1
-			tmp_battery = int(statuslist[1].replace("%",""))
+			tmp_battery = outobj["percent"]
 
 			colorpairidx = COLORPAIRID_DEFAULT
 			if tmp_charging:
@@ -106,29 +208,39 @@ def displayipbattery(stdscr):
 		pass
 
 
-def displayramcpu(stdscr, refcpu, rowstart, colstart):
-	curusage_b = argonsysinfo_getcpuusagesnapshot()
+def displayramcpu(stdscr, refcpu, rowstart, colstart, monitorobj = {}):
+	# CPU usage comes from the monitor if it is publishing, /proc/stat otherwise
+	monitorcpu = monitor_getgroup(monitorobj, "cpu")
+	curusage_b = None
+	if len(monitorcpu) == 0:
+		curusage_b = argonsysinfo_getcpuusagesnapshot()
+		if refcpu is None:
+			refcpu = curusage_b
 	try:
 		outputlist = []
 		tmpraminfo = argonsysinfo_getram()
 		outputlist.append({"title": "ram ", "value": tmpraminfo[1]+" "+tmpraminfo[0]+" Free"})
 
-		for cpuname in refcpu:
-			if cpuname == "cpu":
-				continue
-			if refcpu[cpuname]["total"] == curusage_b[cpuname]["total"]:
-				outputlist.append({"title": cpuname, "value": "Loading"})
-			else:
-				total = curusage_b[cpuname]["total"]-refcpu[cpuname]["total"]
-				idle = curusage_b[cpuname]["idle"]-refcpu[cpuname]["idle"]
-				outputlist.append({"title": cpuname, "value": str(int(100*(total-idle)/(total)))+"% Used"})
+		if len(monitorcpu) > 0:
+			for cpuname in monitorcpu:
+				outputlist.append({"title": cpuname, "value": str(int(monitorcpu[cpuname]))+"% Used"})
+		else:
+			for cpuname in refcpu:
+				if cpuname == "cpu":
+					continue
+				if refcpu[cpuname]["total"] == curusage_b[cpuname]["total"]:
+					outputlist.append({"title": cpuname, "value": "Loading"})
+				else:
+					total = curusage_b[cpuname]["total"]-refcpu[cpuname]["total"]
+					idle = curusage_b[cpuname]["idle"]-refcpu[cpuname]["idle"]
+					outputlist.append({"title": cpuname, "value": str(int(100*(total-idle)/(total)))+"% Used"})
 		displaytitlevaluelist(stdscr, rowstart, colstart, outputlist)
 	except:
 		pass
 	return curusage_b
 
 
-def displaytempfan(stdscr, rowstart, colstart):
+def displaytempfan(stdscr, rowstart, colstart, monitorobj = {}):
 	try:
 		outputlist = []
 		try:
@@ -147,8 +259,16 @@ def displaytempfan(stdscr, rowstart, colstart):
 		mincval = 200
 
 
-		# Get min/max of hdd temp
-		hddtempobj = argonsysinfo_gethddtemp()
+		# Get min/max of hdd temp, from the monitor if it is publishing, so
+		# smartctl is not run again
+		monitortemp = monitor_getgroup(monitorobj, "temperatures")
+		if "CPU" in monitortemp:
+			hddtempobj = {}
+			for curdev in monitortemp:
+				if curdev != "CPU":
+					hddtempobj[curdev] = monitortemp[curdev]
+		else:
+			hddtempobj = argonsysinfo_gethddtemp()
 		for curdev in hddtempobj:
 			if hddtempobj[curdev] < mincval:
 				mincval = hddtempobj[curdev]
@@ -156,7 +276,10 @@ def displaytempfan(stdscr, rowstart, colstart):
 				maxcval = hddtempobj[curdev]
 			hddtempctr = hddtempctr + 1
 
-		cpucval = argonsysinfo_getcputemp()
+		if "CPU" in monitortemp:
+			cpucval = monitortemp["CPU"]
+		else:
+			cpucval = argonsysinfo_getcputemp()
 		if hddtempctr > 0:
 			alltempobj = {"cpu": cpucval,"hdd min": mincval, "hdd max": maxcval}
 			# Update max C val to CPU Temp if necessary
@@ -312,7 +435,9 @@ def mainloop(stdscr):
 
 		stdscr.nodelay(True)
 
-		refcpu = argonsysinfo_getcpuusagesnapshot()
+		refcpu = None
+		if len(monitor_loadsample()) == 0:
+			refcpu = argonsysinfo_getcpuusagesnapshot()
 		while True:
 			try:
 				key = stdscr.getch()
@@ -344,9 +469,10 @@ def mainloop(stdscr):
 				# Data Columns
 				rowstart = 7
 				colstart = 20
-				refcpu = displayramcpu(stdscr, refcpu, rowstart, colstart)
+				monitorobj = monitor_loadsample()
+				refcpu = displayramcpu(stdscr, refcpu, rowstart, colstart, monitorobj)
 				displaystorage(stdscr, rowstart, colstart+30)
-				displaytempfan(stdscr, rowstart, colstart+60)
+				displaytempfan(stdscr, rowstart, colstart+60, monitorobj)
 
 				# Main refresh even
 				stdscr.refresh()
@@ -16,12 +16,21 @@ import subprocess
 import sys
 import os
 import time
+import struct
 
 from threading import Thread
 from queue import Queue
 
 
-UPS_LOGFILE="/dev/shm/upslog.txt"
+# Battery state, published by the service as a fixed layout record: magic,
+# version, percent, on battery flag, status id, sequence (odd while the record
+# is being written), time of the last change.  See argononeupd.py
+UPS_STATEFILE="/dev/shm/upsstate.bin"
+UPS_STATEFORMAT="<4sBBBBId"
+UPS_STATESIZE=struct.calcsize(UPS_STATEFORMAT)
+UPS_STATEMAGIC=b"AUPS"
+UPS_STATEVERSION=1
+UPS_STATUSLIST=["", "Battery", "Charging", "Charged"]
 KEYBOARD_LOCKFILE="/dev/shm/argononeupkeyboardlock.txt"
 
 
@@ -120,30 +129,42 @@ def notifymessage(message, iscritical):
 # Battery (copied)
 #############
 
-def battery_loadlogdata():
-	# status, version, time, schedule
+def battery_decodestate(record):
+	# Turns a state record into the status the service reports, {} if there is none
 	outobj = {}
+	if len(record) < UPS_STATESIZE:
+		return outobj
+	magic, version, percent, onbattery, statusid, sequence, updated = struct.unpack(UPS_STATEFORMAT, record[:UPS_STATESIZE])
+	if magic != UPS_STATEMAGIC or version != UPS_STATEVERSION or statusid <= 0 or statusid >= len(UPS_STATUSLIST):
+		return outobj
+	outobj["status"] = UPS_STATUSLIST[statusid]
+	outobj["percent"] = percent
+	outobj["onbattery"] = onbattery
+	outobj["time"] = updated
+	outobj["power"] = UPS_STATUSLIST[statusid]+" "+str(percent)+"%"
+	return outobj
+
+
+def battery_loadstate():
+	# Reads the state the service publishes, retrying if it changed mid-read
 	try:
-		fp = open(UPS_LOGFILE, "r")
-		logdata = fp.read()
-		alllines = logdata.split("\n")
-		ctr = 0
-		while ctr < len(alllines):
-			tmpval = alllines[ctr].strip()
-			curinfo = tmpval.split(":")
-			if len(curinfo) > 1:
-				tmpattrib = curinfo[0].lower().split(" ")
-				# The rest are assumed to be value
-				outobj[tmpattrib[0]] = tmpval[(len(curinfo[0])+1):].strip()
-			ctr = ctr + 1
-	except Exception as einit:
+		fd = os.open(UPS_STATEFILE, os.O_RDONLY)
+		try:
+			maxretry = 10
+			while maxretry > 0:
+				maxretry = maxretry - 1
+				sequence = os.pread(fd, 4, 8)
+				record = os.pread(fd, UPS_STATESIZE, 0)
+				if len(record) == UPS_STATESIZE and (sequence[0]&1) == 0 and record[8:12] == sequence and os.pread(fd, 4, 8) == sequence:
+					return battery_decodestate(record)
+		finally:
+			os.close(fd)
+	except OSError as einit:
 		try:
 			debuglog("keyboard-battery-error", str(einit))
 		except:
 			debuglog("keyboard-battery-error", "Error getting battery status")
-		#pass
-
-	return outobj
+	return {}
 
 
 def keyboardevent_getdevicepaths():
@@ -615,7 +636,7 @@ def keyboardevemt_keyhandler(readq):
 								debuglog("keyboard-volumeother-error", "Error adjusting value")
 							pass
 					elif adjusttype == ADJUSTTYPE_BATTERYINFO:
-						outobj = battery_loadlogdata()
+						outobj = battery_loadstate()
 						try:
 							notifymessage(outobj["power"], False)
 						except:
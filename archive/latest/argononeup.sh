@@ -204,6 +204,8 @@ if [ ! -f $daemonconfigfile ]; then
 	echo '#' >> $daemonconfigfile
 	echo '# lidshutdownsecs number of seconds till shutdown when lid is closed 0 if do nothing' >> $daemonconfigfile
 	echo 'lidshutdownsecs=300' >> $daemonconfigfile
+	echo '# batteryalertgpio GPIO line wired to the battery gauge ALRT pin, -1 to poll the gauge instead' >> $daemonconfigfile
+	echo 'batteryalertgpio=-1' >> $daemonconfigfile
 fi
 
 # Lid Config Script
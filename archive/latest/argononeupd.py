@@ -10,8 +10,11 @@
 import sys
 import os
 import time
+import mmap
+import socket
+import struct
 
-from threading import Thread
+from threading import Thread, Lock
 from queue import Queue
 
 sys.path.append("/etc/argon/")
@@ -24,7 +27,17 @@ bus = argonregister_initializebusobj()
 # Constants
 ADDR_BATTERY = 0x64
 
-UPS_LOGFILE="/dev/shm/upslog.txt"
+# Battery state, published by the service as a fixed layout record: magic,
+# version, percent, on battery flag, status id, sequence (odd while the record
+# is being written), time of the last change.  Subscribers to the socket are sent
+# the same record whenever it changes.
+UPS_STATEFILE="/dev/shm/upsstate.bin"
+UPS_STATESOCKET="/dev/shm/upsstate.sock"
+UPS_STATEFORMAT="<4sBBBBId"
+UPS_STATESIZE=struct.calcsize(UPS_STATEFORMAT)
+UPS_STATEMAGIC=b"AUPS"
+UPS_STATEVERSION=1
+UPS_STATUSLIST=["", "Battery", "Charging", "Charged"]
 
 
 ###################
@@ -59,10 +72,31 @@ def notifymessage(message, iscritical):
 # Battery
 #############
 REG_CONTROL = 0x08
+REG_GPIOCONFIG = 0x0A
 REG_SOCALERT = 0x0b
 REG_PROFILE = 0x10
 REG_ICSTATE = 0xA7
 
+# REG_GPIOCONFIG bit that pulls the gauge's ALRT pin low whenever SOC changes
+GPIOCONFIG_SOCCHANGE = 0x40
+
+# Battery poll interval in seconds; it doubles while nothing changes, and drops
+# back to the minimum when something does
+BATTERY_POLLMINSECS = 2
+BATTERY_POLLMAXSECS = 30
+# On battery at or below this percent, poll at the minimum so a charger being
+# plugged in cancels the shutdown promptly
+BATTERY_POLLFASTPERCENT = 10
+
+# Gauge registers 0x02 (VCELL) to 0x0F (CURRENT) are read as one block, so every
+# value decoded from a snapshot comes from the same instant
+REG_SNAPSHOT = 0x02
+SNAPSHOT_LEN = 14
+SNAPSHOT_TTLSECS = 1.0
+
+battery_snapshotlock = Lock()
+battery_snapshotdata = None
+battery_snapshottime = 0
 
 
 def battery_restart():
@@ -129,29 +163,18 @@ def battery_getstatus(restartifnotactive):
 
 def battery_checkupdateprofile():
 	try:
-		REG_GPIOCONFIG = 0x0A
-
 		PROFILE_DATALIST = [0x32,0x00,0x00,0x00,0x00,0x00,0x00,0x00,0xA8,0xAA,0xBE,0xC6,0xB8,0xAE,0xC2,0x98,0x82,0xFF,0xFF,0xCA,0x98,0x75,0x63,0x55,0x4E,0x4C,0x49,0x98,0x88,0xDC,0x34,0xDB,0xD3,0xD4,0xD3,0xD0,0xCE,0xCB,0xBB,0xE7,0xA2,0xC2,0xC4,0xAE,0x96,0x89,0x80,0x74,0x67,0x63,0x71,0x8E,0x9F,0x85,0x6F,0x3B,0x20,0x00,0xAB,0x10,0xFF,0xB0,0x73,0x00,0x00,0x00,0x64,0x08,0xD3,0x77,0x00,0x00,0x00,0x00,0x00,0x00,0x00,0x00,0x00,0xFA]
 
 		PROFILE_LEN = len(PROFILE_DATALIST)
 
 		# Try to compare profile if battery is active
-		tmpidx = 0
-
 		tmpval = battery_getstatus(True)
 		if tmpval == 0:
-			# Status OK, check profile
-			tmpidx = 0
-			while tmpidx < PROFILE_LEN:
-				tmpval = bus.read_byte_data(ADDR_BATTERY, REG_PROFILE+tmpidx)
-				if tmpval != PROFILE_DATALIST[tmpidx]:
-					debuglog("battery-profile-error", "Mismatch")
-					break
-				tmpidx = tmpidx + 1
-
-			if tmpidx == PROFILE_LEN:
+			# Status OK, check profile; read in block transactions, not a byte at a time
+			if argonregister_readblock(bus, ADDR_BATTERY, REG_PROFILE, PROFILE_LEN) == PROFILE_DATALIST:
 				# Matched
 				return 0
+			debuglog("battery-profile-error", "Mismatch")
 		else:
 			debuglog("battery-profile", "Status Error "+str(tmpval)+", will attempt to update")
 
@@ -168,10 +191,7 @@ def battery_checkupdateprofile():
 		time.sleep(0.5)
 
 		# Write Profile
-		tmpidx = 0
-		while tmpidx < PROFILE_LEN:
-			bus.write_byte_data(ADDR_BATTERY, REG_PROFILE+tmpidx, PROFILE_DATALIST[tmpidx])
-			tmpidx = tmpidx + 1
+		argonregister_writeblock(bus, ADDR_BATTERY, REG_PROFILE, PROFILE_DATALIST)
 
 		debuglog("battery-profile", "Profile Updated,Restarting...")
 
@@ -201,26 +221,44 @@ def battery_checkupdateprofile():
 
 
 
+def battery_getsnapshot(maxagesecs=SNAPSHOT_TTLSECS):
+	# Registers REG_SNAPSHOT onwards, read at most once every maxagesecs however
+	# many callers ask
+	global battery_snapshotdata, battery_snapshottime
+	with battery_snapshotlock:
+		curtime = time.monotonic()
+		if battery_snapshotdata is None or curtime - battery_snapshottime >= maxagesecs:
+			battery_snapshotdata = argonregister_readblock(bus, ADDR_BATTERY, REG_SNAPSHOT, SNAPSHOT_LEN)
+			battery_snapshottime = curtime
+		return battery_snapshotdata
+
+
+def battery_decodesnapshot(snapshot):
+	# Raw 16 bit words for VCELL, TEMP and CURRENT; their scaling is not known yet
+	# (see battery/tools/cw2217_probe.py).  Current is thought to be
+	# (52.4 * current) / (32768 * R_SENSE) with R_SENSE 10.0
+	def getword(register):
+		idx = register - REG_SNAPSHOT
+		return (snapshot[idx] << 8) | snapshot[idx+1]
+
+	SOC_HIGH_REG = 0x04
+	CURRENT_HIGH_REG = 0x0E
+	socpercent = snapshot[SOC_HIGH_REG - REG_SNAPSHOT]
+	current = getword(CURRENT_HIGH_REG)
+	return {
+		"vcell": getword(0x02),
+		"soc": min(socpercent, 100),
+		"socfraction": snapshot[SOC_HIGH_REG + 1 - REG_SNAPSHOT] / 256.0,
+		"temp": getword(0x06),
+		"current": current - 0x10000 if current & 0x8000 else current,
+		"discharging": 1 if (current & 0x8000) > 0 else 0
+	}
+
+
 def battery_getpercent():
 	# State of Charge (SOC)
 	try:
-		SOC_HIGH_REG = 0x04
-
-		socpercent = bus.read_byte_data(ADDR_BATTERY, SOC_HIGH_REG)
-		if socpercent > 100:
-			return 100
-		elif socpercent > 0:
-			return socpercent
-
-		# Support Fraction percent
-		#SOC_LOW_REG = 0x05
-		#soc_low = bus.read_byte_data(ADDR_BATTERY, SOC_LOW_REG)
-		#socpercentfloat = socpercent + (soc_low / 256.0)
-		#if socpercentfloat > 100.0:
-		#	return 100.0
-		#elif socpercentfloat > 0.0:
-		#	return socpercentfloat
-
+		return battery_decodesnapshot(battery_getsnapshot())["soc"]
 	except Exception as e:
 		try:
 			debuglog("battery-percenterror", str(e))
@@ -231,22 +269,9 @@ def battery_getpercent():
 
 
 def battery_isplugged():
-	# State of Charge (SOC)
+	# Current direction, set when discharging
 	try:
-		CURRENT_HIGH_REG = 0x0E
-
-		current_high = bus.read_byte_data(ADDR_BATTERY, CURRENT_HIGH_REG)
-
-		if (current_high & 0x80) > 0:
-			return 1
-
-		#CURRENT_LOW_REG = 0x0F
-		#R_SENSE = 10.0
-		#current_low = bus.read_byte_data(ADDR_BATTERY, CURRENT_LOW_REG)
-		#raw_current = int.from_bytes([current_high, current_low], byteorder='big', signed=True)
-		#current = (52.4 * raw_current) / (32768 * R_SENSE)
-
-
+		return battery_decodesnapshot(battery_getsnapshot())["discharging"]
 	except Exception as e:
 		try:
 			debuglog("battery-chargingerror", str(e))
@@ -255,38 +280,224 @@ def battery_isplugged():
 
 	return 0
 
-def battery_loadlogdata():
-	# status, version, time, schedule
+def battery_decodestate(record):
+	# Turns a state record into the status the service reports, {} if there is none
 	outobj = {}
+	if len(record) < UPS_STATESIZE:
+		return outobj
+	magic, version, percent, onbattery, statusid, sequence, updated = struct.unpack(UPS_STATEFORMAT, record[:UPS_STATESIZE])
+	if magic != UPS_STATEMAGIC or version != UPS_STATEVERSION or statusid <= 0 or statusid >= len(UPS_STATUSLIST):
+		return outobj
+	outobj["status"] = UPS_STATUSLIST[statusid]
+	outobj["percent"] = percent
+	outobj["onbattery"] = onbattery
+	outobj["time"] = updated
+	outobj["power"] = UPS_STATUSLIST[statusid]+" "+str(percent)+"%"
+	return outobj
+
+
+def battery_loadstate():
+	# Reads the state the service publishes, retrying if it changed mid-read
 	try:
-		fp = open(UPS_LOGFILE, "r")
-		logdata = fp.read()
-		alllines = logdata.split("\n")
-		ctr = 0
-		while ctr < len(alllines):
-			tmpval = alllines[ctr].strip()
-			curinfo = tmpval.split(":")
-			if len(curinfo) > 1:
-				tmpattrib = curinfo[0].lower().split(" ")
-				# The rest are assumed to be value
-				outobj[tmpattrib[0]] = tmpval[(len(curinfo[0])+1):].strip()
-			ctr = ctr + 1
+		fd = os.open(UPS_STATEFILE, os.O_RDONLY)
+		try:
+			maxretry = 10
+			while maxretry > 0:
+				maxretry = maxretry - 1
+				sequence = os.pread(fd, 4, 8)
+				record = os.pread(fd, UPS_STATESIZE, 0)
+				if len(record) == UPS_STATESIZE and (sequence[0]&1) == 0 and record[8:12] == sequence and os.pread(fd, 4, 8) == sequence:
+					return battery_decodestate(record)
+		finally:
+			os.close(fd)
 	except OSError:
 		pass
+	return {}
 
-	return outobj
 
-def battery_check(readq):
-	CMDSTARTBYTE=0xfe
-	CMDCONTROLBYTECOUNT=3
-	CHECKSTATUSLOOPFREQ=50
+def battery_openstate():
+	# Creates the state record and the subscriber socket
+	upsstate = {"lock": Lock(), "sequence": 0, "record": b"", "map": None, "server": None, "subscribers": []}
+	try:
+		fd = os.open(UPS_STATEFILE, os.O_RDWR | os.O_CREAT, 0o644)
+		os.ftruncate(fd, UPS_STATESIZE)
+		upsstate["map"] = mmap.mmap(fd, UPS_STATESIZE)
+		os.close(fd)
+	except Exception as e:
+		try:
+			debuglog("battery-state-error", str(e))
+		except:
+			debuglog("battery-state-error", "Unable to create state file")
+
+	try:
+		if os.path.exists(UPS_STATESOCKET):
+			os.unlink(UPS_STATESOCKET)
+		server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		server.bind(UPS_STATESOCKET)
+		# Desktop users subscribe too
+		os.chmod(UPS_STATESOCKET, 0o666)
+		server.listen(8)
+		upsstate["server"] = server
+	except Exception as e:
+		try:
+			debuglog("battery-state-error", str(e))
+		except:
+			debuglog("battery-state-error", "Unable to create state socket")
+	return upsstate
+
+
+def battery_stateserver(upsstate):
+	# Accepts subscribers; each is sent the current state, then every change
+	server = upsstate["server"]
+	while server is not None:
+		try:
+			conn, addr = server.accept()
+			conn.setblocking(False)
+			with upsstate["lock"]:
+				if len(upsstate["record"]) > 0:
+					conn.send(upsstate["record"])
+				upsstate["subscribers"].append(conn)
+		except Exception as e:
+			try:
+				debuglog("battery-state-error", str(e))
+			except:
+				debuglog("battery-state-error", "Accept Failed")
+			time.sleep(1)
+
+
+def battery_publishstate(upsstate, percent, onbattery, statusid):
+	# Writes the record in place and pushes it to subscribers; only called on change
+	with upsstate["lock"]:
+		sequence = upsstate["sequence"]
+		record = struct.pack(UPS_STATEFORMAT, UPS_STATEMAGIC, UPS_STATEVERSION, percent, onbattery, statusid, sequence+2, time.time())
+		statemap = upsstate["map"]
+		if statemap is not None:
+			# Odd sequence while the fields change, the new even one last
+			statemap[8:12] = struct.pack("<I", sequence+1)
+			statemap[0:8] = record[0:8]
+			statemap[12:UPS_STATESIZE] = record[12:]
+			statemap[8:12] = record[8:12]
+		upsstate["sequence"] = sequence+2
+		upsstate["record"] = record
+
+		activelist = []
+		for conn in upsstate["subscribers"]:
+			try:
+				# A record is smaller than any socket buffer, one that can't take
+				# it has stopped reading
+				conn.send(record)
+				activelist.append(conn)
+			except OSError:
+				conn.close()
+		upsstate["subscribers"] = activelist
+
+
+def battery_watchstate():
+	# Prints every state change the service pushes
+	conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+	conn.connect(UPS_STATESOCKET)
+	record = b""
+	while True:
+		data = conn.recv(UPS_STATESIZE - len(record))
+		if len(data) == 0:
+			break
+		record = record + data
+		if len(record) == UPS_STATESIZE:
+			outobj = battery_decodestate(record)
+			if "power" in outobj:
+				print(time.asctime(time.localtime(outobj["time"]))+" "+outobj["power"], flush=True)
+			record = b""
+	conn.close()
+
+
+def battery_enablealert(enable):
+	# Have the gauge signal SOC changes on its ALRT pin (profile updates clear it)
+	try:
+		if enable:
+			bus.write_byte_data(ADDR_BATTERY, REG_GPIOCONFIG, GPIOCONFIG_SOCCHANGE)
+		else:
+			bus.write_byte_data(ADDR_BATTERY, REG_GPIOCONFIG, 0)
+		return 0
+	except Exception as e:
+		try:
+			debuglog("battery-alerterror", str(e))
+		except:
+			debuglog("battery-alerterror", "Alert Config Failed")
+	return 1
+
+
+def battery_openalertline(lineid):
+	# Returns a function that waits up to N seconds for the gauge's ALRT pin to
+	# fall, returning True if it did, or None if the line can't be watched
+	if lineid < 0:
+		return None
+	# Pi5 mapping, 0 for older
+	for chippath in ['/dev/gpiochip4', '/dev/gpiochip0']:
+		try:
+			chip = gpiod.Chip(chippath)
+			break
+		except Exception:
+			chippath = ""
+	if len(chippath) == 0:
+		debuglog("battery-alertline", "Unable to initialize GPIO")
+		return None
+
+	try:
+		# libgpiod 1.x
+		lineobj = chip.get_line(lineid)
+		lineobj.request(consumer="argon-battery", type=gpiod.LINE_REQ_EV_FALLING_EDGE, flags=gpiod.LINE_REQ_FLAG_BIAS_PULL_UP)
+
+		def waitalert(timeoutsecs):
+			if not lineobj.event_wait(int(timeoutsecs)):
+				return False
+			lineobj.event_read_multiple()
+			return True
+
+		debuglog("battery-alertline", "Watching line "+str(lineid))
+		return waitalert
+	except Exception:
+		pass
+
+	try:
+		# libgpiod 2.x
+		chip.close()
+		request = gpiod.request_lines(
+			chippath,
+			consumer="argon-battery",
+			config={lineid: gpiod.LineSettings(direction=gpiod.line.Direction.INPUT, edge_detection=gpiod.line.Edge.FALLING, bias=gpiod.line.Bias.PULL_UP)}
+		)
+
+		def waitalert(timeoutsecs):
+			if not request.wait_edge_events(timeoutsecs):
+				return False
+			request.read_edge_events()
+			return True
+
+		debuglog("battery-alertline", "Watching line "+str(lineid))
+		return waitalert
+	except Exception as e:
+		try:
+			debuglog("battery-alertline-error", str(e))
+		except:
+			debuglog("battery-alertline-error", "Unable to watch line")
+	return None
 
-	CMDsendrequest = [ 0xfe, 0, 0, 0xfe, 0xfe, 0, 0, 0xfe, 0, 0, 0]
 
-	lastcmdtime=""
-	loopCtr = CHECKSTATUSLOOPFREQ
-	sendcmdid = -1
+def battery_wait(waitalert, timeoutsecs):
+	# Sleep until the next poll is due, or the gauge signals a SOC change
+	if waitalert is not None:
+		try:
+			return waitalert(timeoutsecs)
+		except Exception as e:
+			try:
+				debuglog("battery-alertline-error", str(e))
+			except:
+				debuglog("battery-alertline-error", "Wait Failed")
+	time.sleep(timeoutsecs)
+	return False
+
 
+def battery_check(readq):
 	debuglog("battery", "Starting")
 
 	updatedesktopicon("Argon ONE UP", "/etc/argon/argon40.png")
@@ -305,7 +516,16 @@ def battery_check(readq):
 		time.sleep(10)
 		maxretry = maxretry - 1
 
-	while maxretry > 0: # Outer loop; maxretry never decrements so infinite
+	# Wake on the gauge's ALRT pin if its GPIO line is configured, polling is
+	# still needed to notice the charger being plugged in or out
+	waitalert = battery_openalertline(argonpowerbutton_getconfigval("batteryalertgpio"))
+	if waitalert is None:
+		debuglog("battery", "No alert line, polling")
+
+	upsstate = battery_openstate()
+	Thread(target = battery_stateserver, args = (upsstate, ), daemon = True).start()
+
+	while True: # Outer loop
 		qdata = ""
 		if readq.empty() == False:
 			qdata = readq.get()
@@ -320,95 +540,91 @@ def battery_check(readq):
 		statusstr = ""
 
 		needsupdate=False
+		statusid=0
 		device_battery=0
 		device_charging=0
 
-		while True: # Command loop
+		if waitalert is not None:
+			battery_enablealert(True)
+		pollsecs = BATTERY_POLLMINSECS
+
+		while True: # Poll loop
 			try:
-				if sendcmdid < 0:
-					cmddatastr = ""
-
-					if cmddatastr == "":
-						if loopCtr >= CHECKSTATUSLOOPFREQ:
-							# Check Battery Status
-							sendcmdid = 0
-							loopCtr = 0
+				tmp_battery = battery_getpercent()
+				tmp_charging = battery_isplugged()
+
+				if tmp_charging != device_charging or tmp_battery!=device_battery:
+					device_battery=tmp_battery
+					device_charging=tmp_charging
+					tmpiconfile = "/etc/argon/ups/"
+					needsupdate=True
+					curnotifymsg = ""
+					curnotifycritical = False
+
+					if device_charging == 0:
+						if "Shutting Down" in prevnotifymsg:
+							os.system("shutdown -c ""Charging, shutdown cancelled.""")
+							debuglog("battery-shutdown", "Abort")
+
+					if device_battery>99:
+						# Prevents switching issue
+						statusstr = "Charged"
+						statusid = 3
+						curnotifymsg = statusstr
+						tmpiconfile = tmpiconfile+"charge_"+str(device_battery)
+					elif device_charging == 0:
+						statusstr = "Charging"
+						statusid = 2
+						curnotifymsg = statusstr
+						tmpiconfile = tmpiconfile+"charge_"+str(device_battery)
+					else:
+						statusstr = "Battery"
+						statusid = 1
+						tmpiconfile = tmpiconfile+"discharge_"+str(device_battery)
+
+						if device_battery > 50:
+							curnotifymsg="Battery Mode"
+						elif device_battery > 20:
+							curnotifymsg="50%% Battery"
+						elif device_battery > 10:
+							curnotifymsg="20%% Battery"
+						elif device_battery > 5:
+							#curnotifymsg="Low Battery"
+							curnotifymsg="Low Battery: The device may power off automatically soon."
+							curnotifycritical=True
 						else:
-							loopCtr = loopCtr + 1
-							if (loopCtr&1) == 0:
-								sendcmdid = 0	# Check Battery Status
-
-				if sendcmdid == 0:
-					tmp_battery = battery_getpercent()
-					tmp_charging = battery_isplugged()
-
-					if tmp_charging != device_charging or tmp_battery!=device_battery:
-						device_battery=tmp_battery
-						device_charging=tmp_charging
-						tmpiconfile = "/etc/argon/ups/"
-						needsupdate=True
-						curnotifymsg = ""
-						curnotifycritical = False
-
-						if device_charging == 0:
-							if "Shutting Down" in prevnotifymsg:
-								os.system("shutdown -c ""Charging, shutdown cancelled.""")
-								debuglog("battery-shutdown", "Abort")
-
-						if device_battery>99:
-							# Prevents switching issue
-							statusstr = "Charged"
-							curnotifymsg = statusstr
-							tmpiconfile = tmpiconfile+"charge_"+str(device_battery)
-						elif device_charging == 0:
-							statusstr = "Charging"
-							curnotifymsg = statusstr
-							tmpiconfile = tmpiconfile+"charge_"+str(device_battery)
-						else:
-							statusstr = "Battery"
-							tmpiconfile = tmpiconfile+"discharge_"+str(device_battery)
-
-							if device_battery > 50:
-								curnotifymsg="Battery Mode"
-							elif device_battery > 20:
-								curnotifymsg="50%% Battery"
-							elif device_battery > 10:
-								curnotifymsg="20%% Battery"
-							elif device_battery > 5:
-								#curnotifymsg="Low Battery"
-								curnotifymsg="Low Battery: The device may power off automatically soon."
-								curnotifycritical=True
-							else:
-								curnotifymsg="CRITICAL BATTERY: Shutting Down in 1 minute"
-								curnotifycritical=True
-
-						tmpiconfile = tmpiconfile + ".png"
-						statusstr = statusstr + " " + str(device_battery)+"%"
-
-						# Add/update desktop icons too; add check to minimize write
-						if previconfile != tmpiconfile:
-							updatedesktopicon(statusstr, tmpiconfile)
-						previconfile = tmpiconfile
-
-						# Send notification if necessary
-						if prevnotifymsg != curnotifymsg:
-							notifymessage(curnotifymsg, curnotifycritical)
-							if device_battery <= 5 and device_charging != 0:
-								os.system("shutdown +1 """+curnotifymsg+".""")
-								debuglog("battery-shutdown", "Shutdown in 1 minute")
-						prevnotifymsg = curnotifymsg
-
-
-					sendcmdid=-1
+							curnotifymsg="CRITICAL BATTERY: Shutting Down in 1 minute"
+							curnotifycritical=True
+
+					tmpiconfile = tmpiconfile + ".png"
+					statusstr = statusstr + " " + str(device_battery)+"%"
+
+					# Add/update desktop icons too; add check to minimize write
+					if previconfile != tmpiconfile:
+						updatedesktopicon(statusstr, tmpiconfile)
+					previconfile = tmpiconfile
+
+					# Send notification if necessary
+					if prevnotifymsg != curnotifymsg:
+						notifymessage(curnotifymsg, curnotifycritical)
+						if device_battery <= 5 and device_charging != 0:
+							os.system("shutdown +1 """+curnotifymsg+".""")
+							debuglog("battery-shutdown", "Shutdown in 1 minute")
+					prevnotifymsg = curnotifymsg
+					pollsecs = BATTERY_POLLMINSECS
+				else:
+					pollsecs = min(pollsecs * 2, BATTERY_POLLMAXSECS)
+
+				if device_charging != 0 and device_battery <= BATTERY_POLLFASTPERCENT:
+					pollsecs = BATTERY_POLLMINSECS
 
 				if needsupdate==True:
-					# Log File
-					otherstr = ""
-					with open(UPS_LOGFILE, "w") as txt_file:
-						txt_file.write("Status as of: "+time.asctime(time.localtime(time.time()))+"\n  Power:"+statusstr+"\n"+otherstr)
-
+					battery_publishstate(upsstate, device_battery, device_charging, statusid)
 					needsupdate=False
 
+				if battery_wait(waitalert, pollsecs):
+					pollsecs = BATTERY_POLLMINSECS
+
 			except Exception as e:
 				try:
 					debuglog("battery-error", str(e))
@@ -441,11 +657,18 @@ def updatedesktopicon(statusstr, tmpiconfile):
 if len(sys.argv) > 1:
 	cmd = sys.argv[1].upper()
 	if cmd == "GETBATTERY":
-		outobj = battery_loadlogdata()
+		outobj = battery_loadstate()
 		try:
 			print(outobj["power"])
 		except:
 			print("Error retrieving battery status")
+	elif cmd == "WATCHBATTERY":
+		try:
+			battery_watchstate()
+		except KeyboardInterrupt:
+			pass
+		except Exception:
+			print("Error retrieving battery status")
 	elif cmd == "RESETBATTERY":
 		battery_checkupdateprofile()
 
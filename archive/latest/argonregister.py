@@ -18,6 +18,9 @@ ADDR_ARGONONEREG_FW=0x81
 ADDR_ARGONONEREG_IR=0x82
 ADDR_ARGONONEREG_CTRL=0x86
 
+# Most bytes SMBus moves in one block transaction
+I2C_BLOCKMAX=32
+
 # Initialize bus
 def argonregister_initializebusobj():
 	try:
@@ -72,3 +75,22 @@ def argonregister_setircode(busobj, vallist):
 		return
 
 	busobj.write_i2c_block_data(ADDR_ARGONONEREG, ADDR_ARGONONEREG_IR, vallist)
+
+# Reads consecutive registers of a device, I2C_BLOCKMAX bytes per transaction
+def argonregister_readblock(busobj, devaddr, register, length):
+	if busobj is None:
+		return []
+	outlist = []
+	while len(outlist) < length:
+		chunklen = min(I2C_BLOCKMAX, length - len(outlist))
+		outlist = outlist + busobj.read_i2c_block_data(devaddr, register + len(outlist), chunklen)
+	return outlist
+
+# Writes consecutive registers of a device, I2C_BLOCKMAX bytes per transaction
+def argonregister_writeblock(busobj, devaddr, register, vallist):
+	if busobj is None:
+		return
+	idx = 0
+	while idx < len(vallist):
+		busobj.write_i2c_block_data(devaddr, register + idx, vallist[idx:idx + I2C_BLOCKMAX])
+		idx = idx + I2C_BLOCKMAX
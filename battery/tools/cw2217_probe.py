@@ -11,11 +11,19 @@ i2c-dev access is available). Compare the candidate interpretations against:
 Usage:
     sudo python3 cw2217_probe.py [--bus 1] [--addr 0x64] [--interval 2] [--count 10]
 
+To measure how the battery really charges and discharges, log raw register
+snapshots (up to 10 per second) through a full discharge and charge, then
+analyse the log on any machine:
+    sudo python3 cw2217_probe.py --log battery.csv --interval 1
+    python3 cw2217_probe.py --analyse battery.csv [--ref-mv 3850] [--ref-temp 31]
+
 Dependencies:
     pip install smbus2        (or: apt install python3-smbus)
 """
 
 import argparse
+import csv
+import math
 import time
 import sys
 
@@ -25,7 +33,8 @@ except ImportError:
     try:
         from smbus import SMBus
     except ImportError:
-        sys.exit("smbus2 (or smbus) is required: pip install smbus2")
+        # Only needed to talk to the gauge, --analyse works without it
+        SMBus = None
 
 # ── Register map ────────────────────────────────────────────────────────────
 REG_VCELL_H   = 0x02   # cell voltage, high byte
@@ -39,6 +48,27 @@ REG_CURRENT_L = 0x0F
 REG_CONTROL   = 0x08
 REG_ICSTATE   = 0xA7
 
+# VCELL through CURRENT are contiguous, so one block read covers them all
+BLOCK_FIRST   = REG_VCELL_H
+BLOCK_LEN     = REG_CURRENT_L - REG_VCELL_H + 1
+
+# ── Logging and analysis ────────────────────────────────────────────────────
+LOG_COLUMNS   = ["time"] + [f"r{BLOCK_FIRST + i:02x}" for i in range(BLOCK_LEN)] + [f"r{REG_ICSTATE:02x}"]
+LOG_MIN_INTERVAL = 0.1   # 10 Hz
+LOG_FLUSH_SECS   = 5.0
+
+# What oneUpPower.c assumes today, for comparison
+DRIVER_LIFE_SECONDS        = 6 * 60 * 60
+DRIVER_CHARGE_FULL_SECONDS = ((2 * 60) + 30) * 60
+
+# Plausible ranges for one Li-ion cell, used to rank the scaling candidates
+CELL_MV_RANGE  = (2800, 4400)
+CELL_TEMP_RANGE = (-10, 70)
+
+# SOC bands the rates are measured over, and the least time worth reporting
+BAND_PERCENT  = 10
+BAND_MIN_SECS = 60
+
 
 def read_byte(bus, addr, reg):
     try:
@@ -47,6 +77,18 @@ def read_byte(bus, addr, reg):
         return f"ERR({e.errno})"
 
 
+def read_block(bus, addr, reg, length):
+    """Read consecutive registers in one transaction (at most 32 bytes).
+
+    Returns a list of byte values, or a list of the same error string if the
+    read failed, so callers can index it like the single-byte reads.
+    """
+    try:
+        return bus.read_i2c_block_data(addr, reg, length)
+    except OSError as e:
+        return [f"ERR({e.errno})"] * length
+
+
 def candidate_voltage(hi, lo):
     """Return a dict of candidate voltage interpretations in mV."""
     if not isinstance(hi, int) or not isinstance(lo, int):
@@ -93,16 +135,18 @@ def print_row(label, hi, lo):
 
 
 def probe_once(bus, addr):
-    vcell_h   = read_byte(bus, addr, REG_VCELL_H)
-    vcell_l   = read_byte(bus, addr, REG_VCELL_L)
-    soc_h     = read_byte(bus, addr, REG_SOC_H)
-    soc_l     = read_byte(bus, addr, REG_SOC_L)
-    temp_h    = read_byte(bus, addr, REG_TEMP_H)
-    temp_l    = read_byte(bus, addr, REG_TEMP_L)
-    current_h = read_byte(bus, addr, REG_CURRENT_H)
-    current_l = read_byte(bus, addr, REG_CURRENT_L)
+    # Two transactions: the 0x02-0x0F block, and IC state
+    block     = read_block(bus, addr, BLOCK_FIRST, BLOCK_LEN)
+    vcell_h   = block[REG_VCELL_H   - BLOCK_FIRST]
+    vcell_l   = block[REG_VCELL_L   - BLOCK_FIRST]
+    soc_h     = block[REG_SOC_H     - BLOCK_FIRST]
+    soc_l     = block[REG_SOC_L     - BLOCK_FIRST]
+    temp_h    = block[REG_TEMP_H    - BLOCK_FIRST]
+    temp_l    = block[REG_TEMP_L    - BLOCK_FIRST]
+    current_h = block[REG_CURRENT_H - BLOCK_FIRST]
+    current_l = block[REG_CURRENT_L - BLOCK_FIRST]
+    control   = block[REG_CONTROL   - BLOCK_FIRST]
     icstate   = read_byte(bus, addr, REG_ICSTATE)
-    control   = read_byte(bus, addr, REG_CONTROL)
 
     print(f"\n{'─'*60}")
     print(f"  Time:     {time.strftime('%H:%M:%S')}")
@@ -132,6 +176,215 @@ def probe_once(bus, addr):
         print(f"    {desc:<35} {val:7.1f} °C")
 
 
+def log_snapshots(bus, addr, path, interval, count):
+    """Append raw register snapshots to a CSV file, one row per read.
+
+    Reads are scheduled against the monotonic clock, so the rate holds even
+    when a read is slow.  Rows are flushed every LOG_FLUSH_SECS rather than
+    one write per row.  Failed reads are skipped.
+    """
+    interval = max(LOG_MIN_INTERVAL, interval)
+    with open(path, "a", newline="") as f:
+        writer = csv.writer(f)
+        if f.tell() == 0:
+            writer.writerow(LOG_COLUMNS)
+        rows = 0
+        next_read = time.monotonic()
+        next_flush = next_read + LOG_FLUSH_SECS
+        while not count or rows < count:
+            block = read_block(bus, addr, BLOCK_FIRST, BLOCK_LEN)
+            icstate = read_byte(bus, addr, REG_ICSTATE)
+            if isinstance(block[0], int) and isinstance(icstate, int):
+                writer.writerow([f"{time.time():.3f}"] + block + [icstate])
+                rows += 1
+            now = time.monotonic()
+            if now >= next_flush:
+                f.flush()
+                next_flush = now + LOG_FLUSH_SECS
+                print(f"\r  {rows} snapshots logged", end="", flush=True)
+            next_read += interval
+            if next_read > now:
+                time.sleep(next_read - now)
+            else:
+                # Fell behind, don't try to catch up with a burst
+                next_read = now
+    print(f"\r  {rows} snapshots logged")
+
+
+def load_log(path):
+    """Read a log written by log_snapshots.
+
+    Returns a list of (time, registers) where registers maps each register
+    address to its value.
+    """
+    samples = []
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        regs = [int(name[1:], 16) for name in header[1:]]
+        for row in reader:
+            if len(row) != len(header):
+                continue
+            samples.append((float(row[0]), dict(zip(regs, map(int, row[1:])))))
+    samples.sort(key=lambda sample: sample[0])
+    return samples
+
+
+def correlation(xs, ys):
+    """Pearson correlation of two equal length lists, 0 if either is constant."""
+    n = len(xs)
+    if n < 2:
+        return 0.0
+    mx = sum(xs) / n
+    my = sum(ys) / n
+    sxy = sum((x - mx) * (y - my) for x, y in zip(xs, ys))
+    sxx = sum((x - mx) ** 2 for x in xs)
+    syy = sum((y - my) ** 2 for y in ys)
+    if sxx == 0 or syy == 0:
+        return 0.0
+    return sxy / math.sqrt(sxx * syy)
+
+
+def rank_candidates(name, unit, series, limits, reference, soc=None):
+    """Print each candidate interpretation of a register pair, best first.
+
+    series maps each candidate to its values over the log.  With a reference
+    reading the candidate whose median is closest wins, otherwise the one with
+    the most values inside limits, then (for voltage) the one that follows SOC
+    best.
+    """
+    rows = []
+    for desc, values in series.items():
+        if not values:
+            continue
+        ordered = sorted(values)
+        median = ordered[len(ordered) // 2]
+        inside = sum(limits[0] <= v <= limits[1] for v in values) / len(values)
+        follows = correlation(values, soc) if soc is not None else 0.0
+        if reference is not None:
+            score = (-abs(median - reference),)
+        else:
+            score = (inside, follows)
+        rows.append((score, desc, ordered[0], median, ordered[-1], inside, follows))
+    rows.sort(reverse=True)
+
+    print(f"\n  {name} candidates, best first"
+          + (f" (closest to {reference} {unit})" if reference is not None else
+             f" (most readings within {limits[0]}..{limits[1]} {unit})"))
+    for index, (_, desc, low, median, high, inside, follows) in enumerate(rows):
+        mark = "*" if index == 0 else " "
+        extra = f"  r(SOC) {follows:+.2f}" if soc is not None else ""
+        print(f"  {mark} {desc:<28} min {low:8.1f}  median {median:8.1f}  max {high:8.1f} {unit}"
+              f"  in range {inside:4.0%}{extra}")
+    if reference is None and len(rows) > 1 and rows[0][0] == rows[1][0]:
+        print("    (a tie, a reference reading is needed to choose)")
+
+
+def band_rates(samples):
+    """Measure the charge and discharge rate in every SOC band.
+
+    Consecutive snapshots with the same current direction, both in the same
+    band, add their SOC change and elapsed time to that band, so the rate is
+    the SOC slope over all the time spent in the band.  Pauses in the log
+    (more than a minute between snapshots) are skipped.
+
+    Returns a dict {"discharge": rates, "charge": rates} where rates maps the
+    band's lower edge to %/s (positive), or None where too little was logged.
+    """
+    bands = range(0, 100, BAND_PERCENT)
+    totals = {direction: {band: [0.0, 0.0] for band in bands} for direction in ("discharge", "charge")}
+    prev = None
+    for when, regs in samples:
+        soc = min(100.0, regs[REG_SOC_H] + regs[REG_SOC_L] / 256)
+        direction = "discharge" if regs[REG_CURRENT_H] & 0x80 else "charge"
+        if prev is not None:
+            pwhen, psoc, pdirection = prev
+            band = min(int(psoc) // BAND_PERCENT * BAND_PERCENT, 100 - BAND_PERCENT)
+            same_band = min(int(soc) // BAND_PERCENT * BAND_PERCENT, 100 - BAND_PERCENT) == band
+            if direction == pdirection and same_band and 0 < when - pwhen <= 60:
+                totals[direction][band][0] += soc - psoc
+                totals[direction][band][1] += when - pwhen
+        prev = (when, soc, direction)
+
+    rates = {}
+    for direction, by_band in totals.items():
+        sign = -1 if direction == "discharge" else 1
+        rates[direction] = {}
+        for band, (change, secs) in by_band.items():
+            rate = sign * change / secs if secs >= BAND_MIN_SECS else None
+            rates[direction][band] = rate if rate and rate > 0 else None
+    return rates
+
+
+def fill_rates(rates):
+    """Fill bands with no measurement from the average of those measured."""
+    known = [rate for rate in rates.values() if rate]
+    if not known:
+        return None
+    average = len(known) / sum(1 / rate for rate in known)
+    return {band: rate or average for band, rate in rates.items()}
+
+
+def format_secs(secs):
+    if secs is None:
+        return "     -"
+    minutes = int(round(secs / 60))
+    return f"{minutes // 60:3d}:{minutes % 60:02d}"
+
+
+def analyse(path, ref_mv, ref_temp):
+    """Analyse a log: rank the scaling candidates and print measured time-to-empty
+    and time-to-full tables.
+    """
+    samples = load_log(path)
+    if len(samples) < 2:
+        sys.exit(f"{path}: not enough snapshots to analyse")
+    span = samples[-1][0] - samples[0][0]
+    print(f"{path}: {len(samples)} snapshots over {format_secs(span).strip()} h")
+
+    soc = [regs[REG_SOC_H] + regs[REG_SOC_L] / 256 for _, regs in samples]
+    voltage = {}
+    temperature = {}
+    for _, regs in samples:
+        for desc, value in candidate_voltage(regs[REG_VCELL_H], regs[REG_VCELL_L]).items():
+            voltage.setdefault(desc, []).append(value)
+        for desc, value in candidate_temp(regs[REG_TEMP_H], regs[REG_TEMP_L]).items():
+            temperature.setdefault(desc, []).append(value)
+    rank_candidates("Voltage", "mV", voltage, CELL_MV_RANGE, ref_mv, soc)
+    rank_candidates("Temperature", "°C", temperature, CELL_TEMP_RANGE, ref_temp)
+
+    rates = band_rates(samples)
+    discharge = fill_rates(rates["discharge"])
+    charge = fill_rates(rates["charge"])
+    bands = sorted(rates["discharge"])
+
+    print("\n  Measured rates (~ marks bands with no data, given the average)")
+    print("    SOC band    discharge %/h    charge %/h")
+    for band in reversed(bands):
+        cells = []
+        for measured, filled in ((rates["discharge"][band], discharge), (rates["charge"][band], charge)):
+            if filled is None:
+                cells.append("        -")
+            else:
+                cells.append(f"{filled[band] * 3600:8.2f}{' ' if measured else '~'}")
+        print(f"    {band:3d}-{band + BAND_PERCENT:<3d}%     {cells[0]}       {cells[1]}")
+
+    # Time from each SOC level down to 0%, and up to 100%
+    print("\n    SOC    to empty    to full")
+    for level in range(100, -1, -BAND_PERCENT):
+        to_empty = sum(BAND_PERCENT / discharge[band] for band in bands if band < level) if discharge else None
+        to_full = sum(BAND_PERCENT / charge[band] for band in bands if band >= level) if charge else None
+        print(f"    {level:3d}%     {format_secs(to_empty)}     {format_secs(to_full)}")
+
+    print()
+    if discharge:
+        print(f"  Full discharge {format_secs(sum(BAND_PERCENT / rate for rate in discharge.values())).strip()} h, "
+              f"driver assumes {format_secs(DRIVER_LIFE_SECONDS).strip()} h")
+    if charge:
+        print(f"  Full charge    {format_secs(sum(BAND_PERCENT / rate for rate in charge.values())).strip()} h, "
+              f"driver assumes {format_secs(DRIVER_CHARGE_FULL_SECONDS).strip()} h")
+
+
 def main():
     ap = argparse.ArgumentParser(description=__doc__,
                                  formatter_class=argparse.RawDescriptionHelpFormatter)
@@ -140,8 +393,34 @@ def main():
                     help="CW2217 I2C address (default 0x64)")
     ap.add_argument("--interval", type=float, default=2.0, help="seconds between reads (default 2)")
     ap.add_argument("--count",    type=int,   default=0,   help="number of reads, 0=infinite")
+    ap.add_argument("--log",      metavar="FILE",
+                    help=f"append raw snapshots to a CSV file instead of printing (at most {1 / LOG_MIN_INTERVAL:g} per second)")
+    ap.add_argument("--analyse",  metavar="FILE",
+                    help="analyse a log written with --log, no hardware needed")
+    ap.add_argument("--ref-mv",   type=float, help="multimeter reading of the cell during the log, in mV")
+    ap.add_argument("--ref-temp", type=float, help="thermometer reading during the log, in °C")
     args = ap.parse_args()
 
+    if args.analyse:
+        analyse(args.analyse, args.ref_mv, args.ref_temp)
+        return
+    if SMBus is None:
+        sys.exit("smbus2 (or smbus) is required: pip install smbus2")
+
+    if args.log:
+        print(f"CW2217 register logger — bus {args.bus}, addr 0x{args.addr:02X}, to {args.log}")
+        print("Ctrl-C to stop.\n")
+        try:
+            with SMBus(args.bus) as bus:
+                log_snapshots(bus, args.addr, args.log, args.interval, args.count)
+        except KeyboardInterrupt:
+            print("\nStopped.")
+        except PermissionError:
+            sys.exit("Permission denied — try: sudo python3 cw2217_probe.py")
+        except OSError as e:
+            sys.exit(f"I2C error opening bus {args.bus}: {e}")
+        return
+
     print(f"CW2217 register probe — bus {args.bus}, addr 0x{args.addr:02X}")
     print("Compare voltage candidates to a multimeter on the battery terminals.")
     print("Compare temperature candidates to an ambient thermometer.")
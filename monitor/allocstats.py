@@ -0,0 +1,69 @@
+#!/usr/bin/python3
+#
+# Debug counters for memory allocation and garbage collection.
+#
+import gc
+import sys
+import time
+
+class AllocationStats:
+    '''
+    Count how much memory and garbage collector work happens between two ticks.
+
+    The number of allocated memory blocks is compared with the previous tick, so a
+    steady state shows a delta of zero.  Garbage collections are counted, and timed,
+    through gc.callbacks; this includes collections started on any thread.
+
+    Call close() to stop counting collections.
+    '''
+    def __init__( self ):
+        self._blocks  = sys.getallocatedblocks()
+        self._gcStart = 0
+        self.collections = 0
+        self.pauseNs     = 0
+        self.ticks       = 0
+        self.maxPauseNs  = 0
+        gc.callbacks.append( self._gcCallback )
+
+    def _gcCallback( self, phase : str, info : dict ) -> None:
+        if phase == "start":
+            self._gcStart = time.perf_counter_ns()
+        else:
+            pause = time.perf_counter_ns() - self._gcStart
+            self.collections += 1
+            self.pauseNs     += pause
+            if pause > self.maxPauseNs:
+                self.maxPauseNs = pause
+
+    def tick( self ) -> tuple[int,int,float]:
+        '''
+        Finish the current tick, and start the next one.
+
+        Returns:
+            A tuple of (change in allocated blocks, garbage collections, milliseconds
+            spent in garbage collection) for the tick that just ended.
+        '''
+        blocks = sys.getallocatedblocks()
+        result = ( blocks - self._blocks, self.collections, self.pauseNs / 1e6 )
+        self._blocks     = blocks
+        self.collections = 0
+        self.pauseNs     = 0
+        self.ticks      += 1
+        return result
+
+    def close( self ) -> None:
+        '''
+        Stop counting garbage collections.
+        '''
+        if self._gcCallback in gc.callbacks:
+            gc.callbacks.remove( self._gcCallback )
+
+if __name__ == "__main__":
+
+    stats = AllocationStats()
+    keep = []
+    for i in range( 5 ):
+        keep.append( [ {} for _ in range( 1000 ) ] )
+        gc.collect()
+        print( stats.tick() )
+    stats.close()
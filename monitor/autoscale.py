@@ -0,0 +1,112 @@
+#!/usr/bin/python3
+#
+# Pick the unit and axis ceiling for charts whose values cover a huge range.
+#
+import bisect
+import math
+
+# The units used for bytes per second, on the disk and network charts
+BYTE_RATE_UNITS = [("Bytes/s", 1), ("KiB/s", 1024), ("MiB/s", 1024**2), ("GiB/s", 1024**3)]
+
+class AutoScaler:
+    '''
+    Choose a unit, and a power of two ceiling in that unit, for the largest value
+    on a chart.
+
+    Growing happens at once: the unit is found by a binary search of the unit
+    factors, and the ceiling is the next power of two above the value in that unit
+    (from frexp, an exact log2), so a jump from bytes to GiB per second takes one
+    update.  Shrinking has hysteresis: the maximum has to stay below shrinkThreshold
+    of the current ceiling for shrinkTicks updates in a row, and then the scale
+    drops straight to the best fit.
+
+    Parameters:
+        units           - List of (name, factor), smallest factor first
+        minCeiling      - Smallest ceiling used, in the chosen unit
+        shrinkTicks     - Updates the maximum must stay low before shrinking
+        shrinkThreshold - Fraction of the current ceiling the maximum must stay below
+    '''
+    def __init__( self, units : list[tuple[str,float]], minCeiling : int = 4, shrinkTicks : int = 10,
+                  shrinkThreshold : float = 0.5 ):
+        self.units           = list( units )
+        self.minCeiling      = minCeiling
+        self.shrinkTicks     = shrinkTicks
+        self.shrinkThreshold = shrinkThreshold
+        self._factors        = [ factor for _, factor in self.units ]
+        self.index           = 0
+        self.ceiling         = minCeiling
+        self._low            = 0
+
+    @property
+    def name( self ) -> str:
+        '''
+        The name of the current unit, e.g. "MiB/s".
+        '''
+        return self.units[self.index][0]
+
+    @property
+    def factor( self ) -> float:
+        '''
+        The number of raw units in one of the current unit.
+        '''
+        return self.units[self.index][1]
+
+    @property
+    def top( self ) -> float:
+        '''
+        The current ceiling in raw units.
+        '''
+        return self.ceiling * self.factor
+
+    def bestFit( self, maximum : float ) -> tuple[int,int]:
+        '''
+        The unit, and the ceiling in that unit, that best fit a value.
+
+        Returns:
+            A tuple of (unit index, ceiling)
+        '''
+        if not maximum > 0:
+            return (0, self.minCeiling)
+        index = max( 0, bisect.bisect_right( self._factors, maximum ) - 1 )
+        # frexp gives value = m * 2**e with 0.5 <= m < 1, so 2**e is the smallest
+        # power of two above the value
+        ceiling = 1 << max( 0, math.frexp( maximum / self._factors[index] )[1] )
+        return (index, max( self.minCeiling, ceiling ))
+
+    def fit( self, maximum : float ) -> bool:
+        '''
+        Jump straight to the best fit, without hysteresis.  Used when the data shown
+        is replaced, rather than added to.
+
+        Returns:
+            True if the unit or the ceiling changed
+        '''
+        self._low = 0
+        index, ceiling = self.bestFit( maximum )
+        if (index, ceiling) == (self.index, self.ceiling):
+            return False
+        self.index, self.ceiling = index, ceiling
+        return True
+
+    def update( self, maximum : float ) -> bool:
+        '''
+        Adjust the scale for the current maximum.  Call this once per tick, so the
+        hysteresis counts ticks.
+
+        Parameters:
+            maximum - The largest value shown, in raw units
+
+        Returns:
+            True if the unit or the ceiling changed
+        '''
+        if maximum > self.top:
+            self.index, self.ceiling = self.bestFit( maximum )
+            self._low = 0
+            return True
+        if not maximum < self.top * self.shrinkThreshold:
+            self._low = 0
+            return False
+        self._low += 1
+        if self._low < self.shrinkTicks:
+            return False
+        return self.fit( maximum )
@@ -0,0 +1,360 @@
+#!/usr/bin/python3
+#
+# Fixed size storage for the points shown on a rolling chart.
+#
+from array import array
+import math
+
+class ChartBuffer:
+    '''
+    A preallocated circular buffer holding the most recent samples of one or more
+    data series.  Each series is an array of doubles of the same length, so the
+    buffer as a whole is (series x window), and pushing a sample never allocates.
+    Missing values are stored as NaN.
+
+    Each sample is given an x value, which is simply a count of the samples pushed
+    so far.  The samples held are the last window x values.
+
+    The maximum over every series is tracked as samples are pushed.  It is only
+    recomputed from the whole buffer when the sample that held the maximum falls
+    out of the window.
+
+    Parameters:
+        seriesCount - Number of data series
+        window      - Number of samples kept for each series
+    '''
+    def __init__( self, seriesCount : int, window : int ):
+        self._window  = window
+        self._data    = [ array( 'd', [math.nan] ) * window for _ in range( seriesCount ) ]
+        self._head    = 0
+        self._count   = 0
+        self._x       = -1
+        self._maxV    = -math.inf
+        self._maxX    = -1
+
+    @property
+    def window( self ) -> int:
+        return self._window
+
+    @property
+    def x( self ) -> int:
+        '''
+        The x value of the newest sample, or -1 if the buffer is empty.
+        '''
+        return self._x
+
+    @property
+    def firstX( self ) -> int:
+        '''
+        The x value of the oldest sample held.
+        '''
+        return self._x - self._count + 1
+
+    def __len__( self ) -> int:
+        return self._count
+
+    def push( self, values : list[float] ) -> int:
+        '''
+        Add one sample for each series.  values should have one entry per series,
+        None (or NaN) marks a missing value.
+
+        Returns:
+            The x value given to the sample
+        '''
+        self._x += 1
+        head = self._head
+        for series, v in zip( self._data, values ):
+            if v is None:
+                v = math.nan
+            series[head] = v
+            if v >= self._maxV:
+                self._maxV = v
+                self._maxX = self._x
+        self._head = (head + 1) % self._window
+        if self._count < self._window:
+            self._count += 1
+        # With nothing but missing values held there is no maximum to lose, so an
+        # all NaN series does not rescan the buffer on every push
+        if 0 <= self._maxX < self.firstX:
+            self._recomputeMax()
+        return self._x
+
+    def _recomputeMax( self ) -> None:
+        '''
+        Find the maximum value, and where it is, over the whole buffer.
+        '''
+        self._maxV = -math.inf
+        self._maxX = -1
+        for x, index in self._slots():
+            for series in self._data:
+                v = series[index]
+                if v >= self._maxV:
+                    self._maxV = v
+                    self._maxX = x
+
+    def _slots( self ):
+        '''
+        Generate (x, index) for every sample held, oldest first.
+        '''
+        start = (self._head - self._count) % self._window
+        x = self.firstX
+        for i in range( self._count ):
+            yield x + i, (start + i) % self._window
+
+    def maximum( self, default : float = 0.0 ) -> float:
+        '''
+        The largest value held in any series, or default if there are no values.
+        '''
+        return self._maxV if self._maxX >= 0 else default
+
+    def addSeries( self ) -> int:
+        '''
+        Add a series, with every value held so far missing.
+
+        Returns:
+            The index of the new series
+        '''
+        self._data.append( array( 'd', [math.nan] ) * self._window )
+        return len( self._data ) - 1
+
+    def removeSeries( self, series : int ) -> None:
+        '''
+        Remove a series.  The series after it move down one index.
+        '''
+        del self._data[series]
+        self._recomputeMax()
+
+    def add( self, values : list[float] ) -> bool:
+        '''
+        Add one sample.  This is the same as push, and lets a ChartBuffer be used as
+        a level of a ChartHistory, where every sample completes a point.
+
+        Returns:
+            True, every sample is a complete point
+        '''
+        self.push( values )
+        return True
+
+    def newest( self, series : int ) -> float:
+        '''
+        The most recent value of a series, NaN if it is missing or the buffer is empty.
+        '''
+        if self._count == 0:
+            return math.nan
+        return self._data[series][(self._head - 1) % self._window]
+
+    def points( self, series : int ):
+        '''
+        Generate (x, value) for every value of a series, oldest first.  Missing values
+        are skipped.
+
+        Parameters:
+            series - Index of the series
+        '''
+        data = self._data[series]
+        for x, index in self._slots():
+            v = data[index]
+            if v == v:
+                yield x, v
+
+class BucketBuffer:
+    '''
+    Decimated storage for long histories.  Every factor samples are reduced to one
+    bucket holding the minimum, maximum and average of each series over those
+    samples.  The reduction is done incrementally as samples arrive, so adding a
+    sample is constant time, and the buckets are kept in ChartBuffers so the
+    memory used is fixed.
+
+    Bucket x values are converted back to sample x values with rawX, so decimated
+    and raw data can share an axis.
+
+    Parameters:
+        seriesCount - Number of data series
+        window      - Number of buckets kept
+        factor      - Number of samples in each bucket
+    '''
+    def __init__( self, seriesCount : int, window : int, factor : int ):
+        self.factor    = factor
+        self.completed = False
+        self.low       = ChartBuffer( seriesCount, window )
+        self.high      = ChartBuffer( seriesCount, window )
+        self.mean      = ChartBuffer( seriesCount, window )
+        self._low      = array( 'd', [math.inf] ) * seriesCount
+        self._high     = array( 'd', [-math.inf] ) * seriesCount
+        self._sum      = array( 'd', [0.0] ) * seriesCount
+        self._count    = array( 'l', [0] ) * seriesCount
+        self._pending  = 0
+
+    def add( self, values : list[float] ) -> bool:
+        '''
+        Add one sample to the bucket being built.
+
+        Returns:
+            True if this sample completed a bucket, this is also left in completed.
+        '''
+        for index, v in enumerate( values ):
+            if v is None or v != v:
+                continue
+            if v < self._low[index]:
+                self._low[index] = v
+            if v > self._high[index]:
+                self._high[index] = v
+            self._sum[index]   += v
+            self._count[index] += 1
+        self._pending += 1
+        self.completed = self._pending >= self.factor
+        if self.completed:
+            self._flush()
+        return self.completed
+
+    def _flush( self ) -> None:
+        '''
+        Store the bucket that was just completed, and start a new one.
+        '''
+        for index, count in enumerate( self._count ):
+            if count == 0:
+                self._low[index]  = math.nan
+                self._high[index] = math.nan
+                self._sum[index]  = math.nan
+            else:
+                self._sum[index] /= count
+        self.low.push( self._low )
+        self.high.push( self._high )
+        self.mean.push( self._sum )
+        for index in range( len( self._count )):
+            self._low[index]   = math.inf
+            self._high[index]  = -math.inf
+            self._sum[index]   = 0.0
+            self._count[index] = 0
+        self._pending = 0
+
+    def addSeries( self ) -> int:
+        '''
+        Add a series, with every bucket held so far missing.
+
+        Returns:
+            The index of the new series
+        '''
+        for buffer in (self.low, self.high, self.mean):
+            buffer.addSeries()
+        self._low.append( math.inf )
+        self._high.append( -math.inf )
+        self._sum.append( 0.0 )
+        self._count.append( 0 )
+        return len( self._count ) - 1
+
+    def removeSeries( self, series : int ) -> None:
+        '''
+        Remove a series.  The series after it move down one index.
+        '''
+        for buffer in (self.low, self.high, self.mean):
+            buffer.removeSeries( series )
+        for accumulator in (self._low, self._high, self._sum, self._count):
+            del accumulator[series]
+
+    def rawX( self, x : int ) -> int:
+        '''
+        Convert a bucket x value to the x value of the last sample in the bucket.
+        '''
+        return x * self.factor + self.factor - 1
+
+    def maximum( self, default : float = 0.0 ) -> float:
+        return self.high.maximum( default )
+
+    def points( self, series : int ):
+        '''
+        Generate the points to draw for a series, oldest first.  Each bucket gives two
+        points, its minimum and then its maximum, so the line traces the envelope of
+        the original samples.
+        '''
+        half = self.factor // 2
+        for (x, low), (_, high) in zip( self.low.points( series ), self.high.points( series )):
+            x = self.rawX( x )
+            yield x - half, low
+            yield x, high
+
+class ChartHistory:
+    '''
+    The storage behind a chart that can show several lengths of history.  Each view
+    is a number of samples to show.  Views that fit within maxPoints keep the raw
+    samples in a ChartBuffer; longer views use a BucketBuffer whose buckets are
+    sized so the view never needs more than maxPoints points.  Every sample is fed
+    to every level as it arrives, so switching views never has to recompute
+    anything, and the memory used is fixed no matter how long the history is.
+
+    Parameters:
+        seriesCount - Number of data series
+        views       - List of view lengths, in samples
+        maxPoints   - The most points a view may draw for each series
+    '''
+    def __init__( self, seriesCount : int, views : list[int], maxPoints : int = 1000 ):
+        self.views  = list( views )
+        self.levels = []
+        self._x     = -1
+        buckets = maxPoints // 2
+        for view in self.views:
+            if view <= maxPoints:
+                self.levels.append( ChartBuffer( seriesCount, view + 1 ))
+            else:
+                factor = -(-view // buckets)
+                self.levels.append( BucketBuffer( seriesCount, -(-view // factor) + 1, factor ))
+
+    @property
+    def x( self ) -> int:
+        '''
+        The x value of the newest sample, or -1 if nothing has been pushed.
+        '''
+        return self._x
+
+    def push( self, values : list[float], only : int = None ) -> int:
+        '''
+        Add one sample to every level.
+
+        Parameters:
+            values - One value per series
+            only   - Feed only this view's level.  Used when a single view is
+                     rebuilt from a recording, the other levels are left empty.
+
+        Returns:
+            The x value given to the sample
+        '''
+        self._x += 1
+        if only is not None:
+            self.levels[only].add( values )
+            return self._x
+        for level in self.levels:
+            level.add( values )
+        return self._x
+
+    def addSeries( self ) -> int:
+        '''
+        Add a series to every level, with no history.
+
+        Returns:
+            The index of the new series
+        '''
+        for level in self.levels:
+            index = level.addSeries()
+        return index
+
+    def removeSeries( self, series : int ) -> None:
+        '''
+        Remove a series, and its history, from every level.
+        '''
+        for level in self.levels:
+            level.removeSeries( series )
+
+    def level( self, view : int ):
+        '''
+        The ChartBuffer or BucketBuffer behind a view.  Both have points and maximum.
+        '''
+        return self.levels[view]
+
+    def maximum( self, view : int, default : float = 0.0 ) -> float:
+        return self.levels[view].maximum( default )
+
+    def points( self, view : int, series : int ):
+        '''
+        Generate the points to draw for one series of a view, oldest first.
+        '''
+        return self.levels[view].points( series )
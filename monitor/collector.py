@@ -0,0 +1,370 @@
+#!/usr/bin/python3
+#
+# Background data collection for the system monitor.  Nothing in here depends on
+# Qt, so the same collector can feed the GUI or any other front end.
+#
+from collections import deque
+import threading
+import time
+
+from systemsupport import CPUInfo, CPULoad, multiDriveStat, NetworkLoad, DriveTempSampler, BatteryInfo
+from configfile import ConfigClass
+from fanspeed import GetCaseFanSpeed
+from hwmon import HwmonSensors
+from deviceregistry import DeviceRegistry, DeviceEvent, NO_EVENTS
+
+class MonitorSample:
+    '''
+    One complete set of readings taken by the Collector.
+
+    Attributes:
+        timestamp    - time.monotonic_ns() when the sample was taken
+        wallTime     - time.time() when the sample was taken
+        cpu          - CPU name -> percent utilization
+        cpuStates    - Whole system time by state ("user", "system", "iowait", ...) -> percent
+        temperatures - "CPU" and drive names -> temperature in degrees C, or None
+        fans         - "CPU" and optionally "CaseFan" -> RPM
+        pwm          - "CPU" -> fan duty cycle in percent
+        sensors      - every hardware monitor input except drives, "<chip>.<label>" -> value
+        disks        - drive name -> (read, write) in bytes per second
+        networks     - device name -> (read, write) in bytes per second
+        battery      - oneUpPower battery readings, see BatteryInfo.read, empty if
+                       there is no battery
+        events       - DeviceEvents for drives and interfaces that were plugged in or
+                       removed just before this sample, usually empty
+    '''
+    __slots__ = ( 'timestamp', 'wallTime', 'cpu', 'cpuStates', 'temperatures', 'fans', 'pwm', 'sensors', 'disks', 'networks', 'battery', 'events' )
+
+    def __init__( self ):
+        self.timestamp    : int   = time.monotonic_ns()
+        self.wallTime     : float = time.time()
+        self.cpu          : dict[str,float] = {}
+        self.cpuStates    : dict[str,float] = {}
+        self.temperatures : dict[str,float] = {}
+        self.fans         : dict[str,float] = {}
+        self.pwm          : dict[str,float] = {}
+        self.sensors      : dict[str,float] = {}
+        self.disks        : dict[str,tuple[float,float]] = {}
+        self.networks     : dict[str,tuple[float,float]] = {}
+        self.battery      : dict[str,float] = {}
+        self.events       : tuple[DeviceEvent,...] = NO_EVENTS
+
+class Collector:
+    '''
+    Collect all of the data the monitor displays on a worker thread.
+
+    Every interval the worker takes a MonitorSample and appends it to a ring of
+    recent samples.  The ring is a bounded deque, whose append and popleft are
+    atomic, so the worker and the consumer never take a lock.  If the consumer
+    falls behind, the oldest samples are dropped.  After each sample all of the
+    listeners are called, on the worker thread, so a front end can wake up and
+    drain the ring.
+
+    Parameters:
+        config   - ConfigClass with the monitor settings
+        interval - Seconds between samples
+        ringSize - Number of samples kept for the consumer
+    '''
+    def __init__( self, config : ConfigClass, interval : float = 1.0, ringSize : int = 64 ):
+        self.config   = config
+        self.interval = interval
+
+        # Get all the filters loaded
+        self.driveTempFilter = self.config.getValueAsList( 'drive', 'temp_ignore' )
+        self.drivePerfFilter = self.config.getValueAsList( 'drive', 'perf_ignore' )
+        self.networkFilter   = self.config.getValueAsList( 'network', 'device_ignore' )
+
+        # Get supporting objects
+        self.cpuinfo    = CPUInfo()
+        self.cpuload    = CPULoad()
+        self.caseFanPin = self.config.getValue( 'cooling', 'casefan', None )
+        if self.caseFanPin is None:
+            self.caseFan = None
+        else:
+            self.caseFan = GetCaseFanSpeed( int(self.caseFanPin) )
+        self.multiDrive = multiDriveStat()
+        self.network    = NetworkLoad( self.networkFilter )
+        self.hwmon      = HwmonSensors()
+        self.battery    = BatteryInfo()
+        self._hasFan     = self.cpuinfo.model == 5
+        self._tempDrives = [ d for d in self.multiDrive.drives if not d in self.driveTempFilter ]
+        self._perfDrives = [ d for d in self.multiDrive.drives if not d in self.drivePerfFilter ]
+
+        # Drive temperatures are read in the background, on their own cadence
+        self.tempInterval = float( self.config.getValue( 'drive', 'temp_interval', 10 ))
+        intervals = {}
+        extraCmds = {}
+        for _drive in self.tempDrives:
+            value = self.config.getValue( 'temp_interval', _drive, None )
+            if value is not None:
+                intervals[_drive] = float(value)
+            extraCmd = self.config.getValue( 'smartctl', _drive, None )
+            if extraCmd is not None:
+                extraCmds[_drive] = extraCmd
+        self.driveTemps = DriveTempSampler( self.multiDrive, self.tempDrives, self.tempInterval, intervals, extraCmds )
+        
+        # Drives and network interfaces that are plugged in or removed later
+        rescanInterval = float( self.config.getValue( 'monitor', 'rescan_interval', 5 ))
+        self.registry = DeviceRegistry( self.multiDrive.devices, self.network.devices,
+                                        [], self.networkFilter, rescanInterval )
+
+        # Optionally record every sample to disk
+        recordDir = self.config.getValue( 'record', 'directory', None )
+        if recordDir:
+            from recorder import SampleRecorder
+            self.recorder = SampleRecorder( recordDir, interval,
+                                            float( self.config.getValue( 'record', 'flush_interval', 5 )))
+        else:
+            self.recorder = None
+
+        self._ring      : deque[MonitorSample] = deque( maxlen=ringSize )
+        self._latest    : MonitorSample = None
+        self._listeners = []
+        self._stop      = threading.Event()
+        self._thread    = None
+
+    @property
+    def tempDrives( self ) -> list[str]:
+        '''
+        The drives shown on the temperature chart.
+        '''
+        return self._tempDrives
+
+    @property
+    def perfDrives( self ) -> list[str]:
+        '''
+        The drives shown on the disk I/O chart.
+        '''
+        return self._perfDrives
+
+    @property
+    def cpuNames( self ) -> list[str]:
+        '''
+        The CPUs shown on the utilization chart.
+        '''
+        return self.cpuload.cpuNames
+
+    @property
+    def fanNames( self ) -> list[str]:
+        '''
+        The fans whose speed is sampled, empty if there is no fan.
+        '''
+        if not self.hasFan:
+            return []
+        return ["CPU"] if self.caseFan is None else ["CPU", "CaseFan"]
+
+    @property
+    def networkNames( self ) -> list[str]:
+        '''
+        The network interfaces being monitored.
+        '''
+        return self.network.names
+
+    @property
+    def hasFan( self ) -> bool:
+        '''
+        True when the CPU fan speed can be read, which is only on a Raspberry PI 5.
+        '''
+        return self._hasFan
+
+    def _applyEvents( self, events : tuple[DeviceEvent,...] ) -> None:
+        '''
+        Start or stop monitoring the devices that came or went.  The drive lists are
+        replaced rather than changed in place, so a reader on another thread always
+        sees a complete list.
+        '''
+        for event in events:
+            name = event.name
+            if event.subsystem == "net":
+                if event.action == "add":
+                    self.network.addDevice( event.device )
+                else:
+                    self.network.removeDevice( name )
+            elif event.action == "add":
+                self.multiDrive.addDrive( event.device )
+                if not name in self.driveTempFilter:
+                    interval = self.config.getValue( 'temp_interval', name, None )
+                    self.driveTemps.addDrive( name, float(interval) if interval is not None else None,
+                                              self.config.getValue( 'smartctl', name, None ))
+                    self._tempDrives = self._tempDrives + [name]
+                if not name in self.drivePerfFilter:
+                    self._perfDrives = self._perfDrives + [name]
+            else:
+                self.driveTemps.removeDrive( name )
+                self.multiDrive.removeDrive( name )
+                self._tempDrives = [ d for d in self._tempDrives if d != name ]
+                self._perfDrives = [ d for d in self._perfDrives if d != name ]
+    
+    def addListener( self, callback ) -> None:
+        '''
+        Register a function to be called, with no arguments, after every sample.  The
+        function is called on the collector thread, so it must be thread safe.
+        '''
+        self._listeners.append( callback )
+
+    def collect( self ) -> MonitorSample:
+        '''
+        Take one sample of everything.  Since this calls out to other things, every
+        reading is wrapped in a handler so that one failure does not lose the rest.
+
+        Returns:
+            A MonitorSample
+        '''
+        sample = MonitorSample()
+        
+        # Pick up drives and network interfaces that were plugged in or removed
+        try:
+            sample.events = self.registry.poll()
+            if sample.events:
+                self._applyEvents( sample.events )
+        except Exception as e:
+            print( f"error checking for device changes: {e}" )
+
+        # Obtain the current fan speed
+        if self.hasFan:
+            try:
+                sample.fans["CPU"] = self.cpuinfo.CPUFanSpeed
+                sample.pwm["CPU"]  = self.cpuinfo.CPUFanPWM
+                if self.caseFan:
+                    sample.fans["CaseFan"] = self.caseFan.RPM
+            except Exception as e:
+                print( f"error getting fan speed: {e}" )
+
+        # Every hardware monitor input, fans, PWM outputs, temperatures and voltages
+        try:
+            self.hwmon.read( sample.sensors )
+        except Exception as e:
+            print( f"error getting hardware monitor sensors: {e}" )
+
+        # The battery, if the oneUpPower driver is loaded
+        try:
+            self.battery.read( sample.battery )
+        except Exception as e:
+            print( f"error getting battery state: {e}" )
+
+        # Setup the temperature for the CPU and Drives
+        try:
+            sample.temperatures["CPU"] = float(self.cpuinfo.temperature)
+        except Exception:
+            sample.temperatures["CPU"] = 0.0
+
+        # Obtain the drive temperatures, these are sampled in the background so we
+        # only pick up the latest cached value here.
+        for _drive in self.tempDrives:
+            sample.temperatures[_drive] = self.driveTemps.temperature( _drive )
+
+        # Obtain the drive read and write rates
+        try:
+            drives = self.multiDrive.readWriteRates()
+            for drive in drives:
+                if not drive in self.drivePerfFilter:
+                    sample.disks[drive] = drives[drive]
+        except Exception as e:
+            print( f"error getting drive rates: {e}" )
+
+        # obtain network device read and writes rates
+        try:
+            sample.networks = self.network.rates
+        except Exception as e:
+            print( f"error getting network rates: {e}" )
+
+        # Get the CPU load precentages
+        try:
+            sample.cpu = self.cpuload.getPercentages()
+            sample.cpuStates = self.cpuload.breakdown
+        except Exception as e:
+            print( f"error getting cpu load: {e}" )
+
+        return sample
+
+    def _run( self ) -> None:
+        '''
+        Worker loop.  Samples are scheduled against the monotonic clock, so the
+        interval does not drift with the time it takes to collect.
+        '''
+        deadline = time.monotonic()
+        while not self._stop.is_set():
+            sample = self.collect()
+            self._latest = sample
+            self._ring.append( sample )
+            if self.recorder is not None:
+                try:
+                    self.recorder.write( sample )
+                except Exception as e:
+                    print( f"error recording sample: {e}" )
+            for callback in self._listeners:
+                try:
+                    callback()
+                except Exception as e:
+                    print( f"error in collector listener: {e}" )
+            deadline += self.interval
+            now = time.monotonic()
+            if deadline < now:
+                # We fell behind, don't try to catch up with a burst of samples
+                deadline = now
+            self._stop.wait( deadline - now )
+
+    def start( self ) -> None:
+        '''
+        Start the collector thread.
+        '''
+        if self._thread is None:
+            self._thread = threading.Thread( target=self._run, name="collector", daemon=True )
+            self._thread.start()
+
+    def stop( self ) -> None:
+        '''
+        Stop the collector thread, the drive temperature sampler and the device
+        registry, and close the recording.
+        '''
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.driveTemps.stop()
+        self.registry.close()
+        if self.recorder is not None:
+            self.recorder.close()
+
+    def pop( self ) -> MonitorSample:
+        '''
+        Remove and return the oldest sample not yet consumed, or None if there are none.
+        '''
+        try:
+            return self._ring.popleft()
+        except IndexError:
+            return None
+
+    def samples( self ) -> list[MonitorSample]:
+        '''
+        Remove and return all of the samples taken since the last call, oldest first.
+        '''
+        result = []
+        try:
+            while True:
+                result.append( self._ring.popleft() )
+        except IndexError:
+            pass
+        return result
+
+    @property
+    def latest( self ) -> MonitorSample:
+        '''
+        The most recent sample, or None if nothing has been collected yet.
+        '''
+        return self._latest
+
+if __name__ == "__main__":
+
+    collector = Collector( ConfigClass( "/etc/sysmon.ini" ))
+    collector.start()
+    try:
+        while True:
+            time.sleep( 2 )
+            for sample in collector.samples():
+                print( f"{sample.wallTime:.3f} cpu={sample.cpu} temps={sample.temperatures}" )
+                print( f"    fans={sample.fans} disks={sample.disks} net={sample.networks}" )
+                for event in sample.events:
+                    print( f"    {event.action} {event.subsystem} {event.name}" )
+    except KeyboardInterrupt:
+        collector.stop()
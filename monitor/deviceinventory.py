@@ -0,0 +1,158 @@
+#!/usr/bin/python3
+#
+# Discover block and network devices straight from sysfs, without starting any
+# processes.
+#
+from typing import NamedTuple
+import os
+
+# The kernel always counts block device sizes and I/O statistics in 512 byte
+# sectors, whatever the logical block size of the device is.
+KERNEL_SECTOR_SIZE = 512
+
+class BlockDevice(NamedTuple):
+    '''
+    A block device from /sys/block.
+
+    Attributes:
+        name              - Device name, e.g. "nvme0n1"
+        kind              - "nvme", "mmc", "usb", "sata" or "virtual"
+        rotational        - True for spinning disks
+        logicalBlockSize  - Smallest unit the device can address, in bytes
+        physicalBlockSize - Native block size of the media, in bytes
+        size              - Size of the device in bytes
+    '''
+    name              : str
+    kind              : str
+    rotational        : bool
+    logicalBlockSize  : int
+    physicalBlockSize : int
+    size              : int
+
+class NetDevice(NamedTuple):
+    '''
+    A network interface from /sys/class/net.
+
+    Attributes:
+        name - Interface name, e.g. "wlan0"
+        kind - "loopback", "wireless", "usb", "ethernet" or "virtual"
+    '''
+    name : str
+    kind : str
+
+def _readText( path : str, default : str = "" ) -> str:
+    try:
+        with open( path, "r", encoding="utf8" ) as f:
+            return f.read().strip()
+    except OSError:
+        return default
+
+def _readInt( path : str, default : int = 0 ) -> int:
+    try:
+        return int( _readText( path ))
+    except ValueError:
+        return default
+
+def blockDevice( name : str, root : str = "/sys/block" ) -> BlockDevice:
+    '''
+    Describe one block device.
+
+    Parameters:
+        name - The device name
+        root - Where the block devices are listed
+    '''
+    path = os.path.join( root, name )
+    real = os.path.realpath( path )
+    if not os.path.exists( os.path.join( path, "device" )):
+        kind = "virtual"
+    elif "/usb" in real:
+        kind = "usb"
+    elif name.startswith( "vd" ) or name.startswith( "xvd" ):
+        # virtio and Xen disks are backed by the host
+        kind = "virtual"
+    elif name.startswith( "nvme" ):
+        kind = "nvme"
+    elif name.startswith( "mmcblk" ):
+        kind = "mmc"
+    else:
+        kind = "sata"
+    logical = _readInt( os.path.join( path, "queue", "logical_block_size" ), KERNEL_SECTOR_SIZE )
+    return BlockDevice( name              = name,
+                        kind              = kind,
+                        rotational        = _readText( os.path.join( path, "queue", "rotational" )) == "1",
+                        logicalBlockSize  = logical,
+                        physicalBlockSize = _readInt( os.path.join( path, "queue", "physical_block_size" ), logical ),
+                        size              = _readInt( os.path.join( path, "size" )) * KERNEL_SECTOR_SIZE )
+
+def blockDevices( ignore : list[str] = [], root : str = "/sys/block" ) -> dict[str,BlockDevice]:
+    '''
+    Find the block devices worth monitoring.  Loop and ram disks are always left out.
+
+    Parameters:
+        ignore - Names of devices to leave out
+        root   - Where the block devices are listed
+
+    Returns:
+        A dictionary of device name to BlockDevice, sorted by name
+    '''
+    result = {}
+    try:
+        names = sorted( entry.name for entry in os.scandir( root ))
+    except OSError:
+        return result
+    for name in names:
+        if "loop" in name or "ram" in name or name in ignore:
+            continue
+        result[name] = blockDevice( name, root )
+    return result
+
+def netDevice( name : str, root : str = "/sys/class/net" ) -> NetDevice:
+    '''
+    Describe one network interface.
+
+    Parameters:
+        name - The interface name
+        root - Where the interfaces are listed
+    '''
+    path = os.path.join( root, name )
+    real = os.path.realpath( path )
+    if name == "lo" or _readText( os.path.join( path, "type" )) == "772":
+        kind = "loopback"
+    elif os.path.exists( os.path.join( path, "wireless" )) or os.path.exists( os.path.join( path, "phy80211" )):
+        kind = "wireless"
+    elif "/virtual/" in real or not os.path.exists( os.path.join( path, "device" )):
+        kind = "virtual"
+    elif "/usb" in real:
+        kind = "usb"
+    else:
+        kind = "ethernet"
+    return NetDevice( name, kind )
+
+def netDevices( ignore : list[str] = [], root : str = "/sys/class/net" ) -> dict[str,NetDevice]:
+    '''
+    Find the network interfaces.
+
+    Parameters:
+        ignore - Names of interfaces to leave out
+        root   - Where the interfaces are listed
+
+    Returns:
+        A dictionary of interface name to NetDevice, sorted by name
+    '''
+    result = {}
+    try:
+        names = sorted( entry.name for entry in os.scandir( root ))
+    except OSError:
+        return result
+    for name in names:
+        if name in ignore:
+            continue
+        result[name] = netDevice( name, root )
+    return result
+
+if __name__ == "__main__":
+
+    for device in blockDevices().values():
+        print( device )
+    for device in netDevices().values():
+        print( device )
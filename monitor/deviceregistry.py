@@ -0,0 +1,184 @@
+#!/usr/bin/python3
+#
+# Keep track of drives and network interfaces that come and go while the monitor
+# is running.
+#
+from typing import NamedTuple
+import socket
+import time
+
+from deviceinventory import BlockDevice, NetDevice, blockDevices, netDevices
+
+# Netlink protocol and multicast group of the kernel's uevent broadcasts
+NETLINK_KOBJECT_UEVENT = 15
+UEVENT_KERNEL_GROUP    = 1
+
+class DeviceEvent(NamedTuple):
+    '''
+    A device that appeared or went away.
+
+    Attributes:
+        action    - "add" or "remove"
+        subsystem - "block" for drives, "net" for network interfaces
+        name      - The device name, e.g. "sda" or "usb0"
+        device    - The BlockDevice or NetDevice; for a removal this is the last
+                    description seen
+    '''
+    action    : str
+    subsystem : str
+    name      : str
+    device    : object
+
+# Returned by poll() when nothing changed, so a quiet tick allocates nothing
+NO_EVENTS : tuple[DeviceEvent,...] = ()
+
+class DeviceRegistry:
+    '''
+    The current set of drives and network interfaces.
+
+    When the kernel's uevent netlink socket can be opened, it is read without
+    blocking on every poll().  The device lists are only rescanned when an add,
+    remove or move event arrives for the block or net subsystem, so a quiet system
+    costs a single failed recv per tick.  Without the socket (no permission, or not
+    Linux) the lists are rescanned every rescanInterval seconds.  A rescan is only a
+    couple of os.scandir calls.
+
+    Parameters:
+        blocks         - The drives already being monitored
+        networks       - The network interfaces already being monitored
+        blockIgnore    - Names of drives to leave out
+        netIgnore      - Names of network interfaces to leave out
+        rescanInterval - Seconds between rescans when uevents are not available
+    '''
+    def __init__( self, blocks : dict[str,BlockDevice], networks : dict[str,NetDevice],
+                  blockIgnore : list[str] = [], netIgnore : list[str] = [], rescanInterval : float = 5.0 ):
+        self._blocks         = dict( blocks )
+        self._networks       = dict( networks )
+        self._blockIgnore    = list( blockIgnore )
+        self._netIgnore      = list( netIgnore )
+        self._rescanInterval = rescanInterval
+        self._nextScan       = time.monotonic() + rescanInterval
+        self._socket         = self._openUevents()
+
+    @staticmethod
+    def _openUevents() -> socket.socket:
+        '''
+        Subscribe to the kernel's uevent broadcasts.
+
+        Returns:
+            A non-blocking socket, or None if uevents can not be received
+        '''
+        try:
+            sock = socket.socket( socket.AF_NETLINK, socket.SOCK_DGRAM | socket.SOCK_NONBLOCK | socket.SOCK_CLOEXEC,
+                                  NETLINK_KOBJECT_UEVENT )
+        except (AttributeError, OSError):
+            return None
+        try:
+            sock.bind( (0, UEVENT_KERNEL_GROUP) )
+        except OSError:
+            sock.close()
+            return None
+        return sock
+
+    @property
+    def usingUevents( self ) -> bool:
+        '''
+        True when device changes are picked up from kernel uevents, False when the
+        device lists are rescanned periodically.
+        '''
+        return self._socket is not None
+
+    @property
+    def blocks( self ) -> dict[str,BlockDevice]:
+        return self._blocks
+
+    @property
+    def networks( self ) -> dict[str,NetDevice]:
+        return self._networks
+
+    def _changed( self ) -> bool:
+        '''
+        Drain every pending uevent.  Kernel uevents are a header such as
+        "add@/devices/...", followed by NUL separated KEY=value pairs.
+
+        Returns:
+            True if any of them added, removed or renamed a drive or network interface
+        '''
+        changed = False
+        while True:
+            try:
+                message = self._socket.recv( 8192 )
+            except BlockingIOError:
+                return changed
+            except OSError:
+                # Overrun (ENOBUFS) or similar, events were lost so look for ourselves
+                return True
+            if changed:
+                continue
+            fields = message.split( b"\0" )
+            if not fields[0].split( b"@", 1 )[0] in (b"add", b"remove", b"move"):
+                continue
+            if b"SUBSYSTEM=block" in fields or b"SUBSYSTEM=net" in fields:
+                changed = True
+
+    def poll( self ) -> tuple[DeviceEvent,...]:
+        '''
+        Check for devices that appeared or went away since the last call.  This is
+        cheap enough to be called on every sample.
+
+        Returns:
+            A tuple of DeviceEvent, removals first, or NO_EVENTS if nothing changed
+        '''
+        if self._socket is not None:
+            if not self._changed():
+                return NO_EVENTS
+        else:
+            now = time.monotonic()
+            if now < self._nextScan:
+                return NO_EVENTS
+            self._nextScan = now + self._rescanInterval
+        return self.rescan()
+
+    def rescan( self ) -> tuple[DeviceEvent,...]:
+        '''
+        List the devices again, and compare with what was there before.
+
+        Returns:
+            A tuple of DeviceEvent, removals first, or NO_EVENTS if nothing changed
+        '''
+        events = []
+        blocks   = blockDevices( self._blockIgnore )
+        networks = netDevices( self._netIgnore )
+        for subsystem, old, new in (("block", self._blocks, blocks), ("net", self._networks, networks)):
+            for name in old:
+                if not name in new:
+                    events.append( DeviceEvent( "remove", subsystem, name, old[name] ))
+        for subsystem, old, new in (("block", self._blocks, blocks), ("net", self._networks, networks)):
+            for name in new:
+                if not name in old:
+                    events.append( DeviceEvent( "add", subsystem, name, new[name] ))
+        if not events:
+            return NO_EVENTS
+        self._blocks   = blocks
+        self._networks = networks
+        return tuple( events )
+
+    def close( self ) -> None:
+        '''
+        Stop listening for uevents.
+        '''
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+if __name__ == "__main__":
+
+    registry = DeviceRegistry( blockDevices(), netDevices() )
+    print( f"Watching {list(registry.blocks)} {list(registry.networks)}, uevents={registry.usingUevents}" )
+    try:
+        while True:
+            time.sleep( 1 )
+            for event in registry.poll():
+                print( event )
+    except KeyboardInterrupt:
+        registry.close()
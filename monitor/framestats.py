@@ -0,0 +1,87 @@
+#!/usr/bin/python3
+#
+# Debug counters for what drawing the charts costs.
+#
+import time
+
+class FrameStats:
+    '''
+    Measure the CPU cost of each frame, so the rendering backends can be compared
+    on a given machine.
+
+    A frame runs from one refresh to the next.  Its cost is the CPU time the GUI
+    thread used in that time: appending the samples to the series, and every paint
+    that followed, whichever backend did the painting.  The CPU time of the whole
+    process is kept as well, since it also covers any threads the OpenGL driver
+    runs.  The update part, appending to the series, is timed on its own.
+
+    The figures are exponential moving averages over roughly the last `frames`
+    frames, so nothing is allocated per frame.
+
+    Parameters:
+        renderer - Name of the backend being measured, shown in the summary
+        frames   - Number of frames the averages cover
+    '''
+    def __init__( self, renderer : str, frames : int = 60 ):
+        self.renderer    = renderer
+        self._alpha      = 2.0 / (frames + 1)
+        self._thread     = time.thread_time_ns()
+        self._process    = time.process_time_ns()
+        self._update     = 0
+        self.frames      = 0
+        self.threadMs    = 0.0
+        self.processMs   = 0.0
+        self.updateMs    = 0.0
+        self.maxThreadMs = 0.0
+
+    def _average( self, average : float, value : float ) -> float:
+        if self.frames == 1:
+            return value
+        return average + self._alpha * (value - average)
+
+    def startFrame( self ) -> None:
+        '''
+        Finish the current frame and start the next one.  Call this at the start of
+        every refresh, before anything is drawn.
+        '''
+        thread  = time.thread_time_ns()
+        process = time.process_time_ns()
+        threadMs  = (thread - self._thread) / 1e6
+        processMs = (process - self._process) / 1e6
+        started = self._update != 0
+        self._thread  = thread
+        self._process = process
+        self._update  = time.perf_counter_ns()
+        if not started:
+            # Everything before the first frame was start up
+            return
+        self.frames  += 1
+        self.threadMs  = self._average( self.threadMs, threadMs )
+        self.processMs = self._average( self.processMs, processMs )
+        if threadMs > self.maxThreadMs:
+            self.maxThreadMs = threadMs
+
+    def updated( self ) -> None:
+        '''
+        Call this once the samples have been appended to the charts.
+        '''
+        if self.frames == 0:
+            return
+        self.updateMs = self._average( self.updateMs, (time.perf_counter_ns() - self._update) / 1e6 )
+
+    def summary( self ) -> str:
+        '''
+        The averages, as one line of text.
+        '''
+        return (f"{self.renderer}: frame {self.threadMs:.2f} ms gui cpu, {self.processMs:.2f} ms process cpu, "
+                f"update {self.updateMs:.2f} ms, worst {self.maxThreadMs:.2f} ms")
+
+if __name__ == "__main__":
+
+    stats = FrameStats( "test", frames=5 )
+    for i in range( 6 ):
+        stats.startFrame()
+        sum( range( 200000 ))
+        stats.updated()
+        time.sleep( 0.01 )
+    print( stats.summary() )
@@ -0,0 +1,198 @@
+#!/usr/bin/python3
+#
+# Read the kernel hardware monitors (/sys/class/hwmon) through persistent file
+# descriptors.
+#
+import os
+import re
+
+from sysfsreader import SysfsFile
+
+class HwmonSensor:
+    '''
+    One input of a hardware monitor, such as temp1_input, fan1_input or pwm1.  The
+    file is opened once and re-read in place.  Values are converted to natural
+    units: degrees C for temperatures, RPM for fans, percent duty for PWM outputs,
+    and volts for voltages.
+
+    Parameters:
+        chip  - Key of the hwmon device, e.g. "pwmfan", see HwmonChip.key
+        kind  - "temp", "fan", "pwm" or "in"
+        label - Label for the sensor, from <sensor>_label if the driver provides one,
+                otherwise the sensor name, e.g. "fan1"
+        path  - Full path of the input file
+    '''
+    SCALE = { "temp" : 1/1000, "fan" : 1, "pwm" : 100/255, "in" : 1/1000 }
+
+    def __init__( self, chip : str, kind : str, label : str, path : str ):
+        self.chip  = chip
+        self.kind  = kind
+        self.label = label
+        self.path  = path
+        self._scale = HwmonSensor.SCALE[kind]
+        self._file  = SysfsFile( path, 64 )
+
+    @property
+    def name( self ) -> str:
+        '''
+        A unique name for the sensor, "<chip>.<label>"
+        '''
+        return f"{self.chip}.{self.label}"
+
+    def read( self ) -> float:
+        '''
+        Read the current value of the sensor.
+
+        Raises:
+            OSError if the value can not be read
+        '''
+        return self._file.readInt() * self._scale
+
+    def close( self ) -> None:
+        self._file.close()
+
+class HwmonChip:
+    '''
+    A hardware monitor device, and all of its fan, PWM, temperature and voltage inputs.
+
+    Parameters:
+        path - The hwmon directory, e.g. /sys/class/hwmon/hwmon2
+    '''
+    _INPUT = re.compile( r"^(temp|fan|in)(\d+)_input$|^(pwm)(\d+)$" )
+
+    # Drivers whose inputs are read from a drive, with an admin or SMART command
+    DRIVE_CHIPS = ( "nvme", "drivetemp" )
+
+    def __init__( self, path : str ):
+        self.path = path
+        self.name = self._readText( "name" ) or os.path.basename( path )
+        self.key  = self.name
+        self.sensors : list[HwmonSensor] = []
+        for entry in sorted( os.listdir( path )):
+            match = HwmonChip._INPUT.match( entry )
+            if match is None:
+                continue
+            kind   = match.group(1) or match.group(3)
+            number = match.group(2) or match.group(4)
+            label  = self._readText( f"{kind}{number}_label" ) or f"{kind}{number}"
+            try:
+                self.sensors.append( HwmonSensor( self.name, kind, label, os.path.join( path, entry )))
+            except OSError:
+                pass
+
+    @property
+    def device( self ) -> str:
+        '''
+        Name of the device the monitor belongs to, e.g. "cooling_fan" or "1-0048",
+        or the hwmon directory name if it has none.
+        '''
+        parent = os.path.dirname( self.path )
+        if os.path.basename( parent ) == "hwmon":
+            return os.path.basename( os.path.dirname( parent ))
+        return os.path.basename( self.path )
+
+    @property
+    def driveBacked( self ) -> bool:
+        '''
+        True if reading the inputs talks to a drive (nvme, drivetemp, or any monitor
+        of a block device).  A read can take an admin or SMART command, and can
+        keep a disk from spinning down.
+        '''
+        return self.name in HwmonChip.DRIVE_CHIPS or os.path.isdir( os.path.join( self.path, "device", "block" ))
+
+    def setKey( self, key : str ) -> None:
+        '''
+        Change the name the sensors are reported under, to tell apart chips with the
+        same name.
+        '''
+        self.key = key
+        for sensor in self.sensors:
+            sensor.chip = key
+
+    def close( self ) -> None:
+        for sensor in self.sensors:
+            sensor.close()
+
+    def _readText( self, name : str ) -> str:
+        try:
+            with open( os.path.join( self.path, name ), "r", encoding="utf8" ) as f:
+                return f.read().strip()
+        except OSError:
+            return ""
+
+    def of( self, kind : str ) -> list[HwmonSensor]:
+        '''
+        The sensors of one kind, "temp", "fan", "pwm" or "in".
+        '''
+        return [ s for s in self.sensors if s.kind == kind ]
+
+def enumerateHwmon( root : str = "/sys/class/hwmon" ) -> list[HwmonChip]:
+    '''
+    Find every hardware monitor on the system.  Chips that share a name, such as
+    two pwmfan devices, are keyed "<name>-<device>" so their sensors stay apart.
+
+    Returns:
+        A list of HwmonChip, in hwmon order
+    '''
+    chips = []
+    try:
+        entries = sorted( os.scandir( root ), key=lambda e: int( e.name[5:] ) if e.name[5:].isdigit() else 0 )
+    except OSError:
+        return chips
+    for entry in entries:
+        chips.append( HwmonChip( os.path.realpath( entry.path )))
+    names = [ chip.name for chip in chips ]
+    for chip in chips:
+        if names.count( chip.name ) > 1:
+            chip.setKey( f"{chip.name}-{chip.device}" )
+    return chips
+
+class HwmonSensors:
+    '''
+    All of the hardware monitor inputs on the system, enumerated once at startup.
+    Reading them is one pread per input, with no processes started.
+
+    Monitors backed by a drive are left out.  Reading them sends the drive a
+    command, which is too much for every tick and can reset a disk's spin-down
+    timer; their temperatures are read by DriveTempSampler on its own, slower,
+    interval.
+    '''
+    def __init__( self ):
+        self.chips = []
+        for chip in enumerateHwmon():
+            if chip.driveBacked:
+                chip.close()
+            else:
+                self.chips.append( chip )
+        self.sensors = [ s for chip in self.chips for s in chip.sensors ]
+
+    def read( self, out : dict[str,float] = None ) -> dict[str,float]:
+        '''
+        Read every sensor.
+
+        Parameters:
+            out - Optional dictionary to fill in, a new one is created if not given
+
+        Returns:
+            A dictionary of sensor name to value.  Sensors that can not be read, or
+            return something that is not a number, are left out.
+        '''
+        if out is None:
+            out = {}
+        for sensor in self.sensors:
+            try:
+                out[sensor.name] = sensor.read()
+            except (OSError, ValueError):
+                out.pop( sensor.name, None )
+        return out
+
+if __name__ == "__main__":
+
+    sensors = HwmonSensors()
+    for chip in sensors.chips:
+        print( f"{chip.key} ({chip.path})" )
+        for s in chip.sensors:
+            try:
+                print( f"    {s.kind:<5} {s.label:<20} {s.read():10.2f}" )
+            except OSError as error:
+                print( f"    {s.kind:<5} {s.label:<20} {error}" )
@@ -0,0 +1,224 @@
+#!/usr/bin/python3
+#
+# Headless mode: serve the collector's samples as OpenMetrics text over HTTP, for
+# Prometheus or anything else that scrapes that format.  Nothing in here depends
+# on Qt.
+#
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import threading
+
+from collector import Collector, MonitorSample
+from configfile import ConfigClass
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+DEFAULT_ADDRESS = "127.0.0.1"
+DEFAULT_PORT    = 9101
+
+def _escape( value : str ) -> str:
+    '''
+    Escape a label value: backslash, double quote and line feed.
+    '''
+    return value.replace( "\\", "\\\\" ).replace( '"', '\\"' ).replace( "\n", "\\n" )
+
+class MetricsRenderer:
+    '''
+    Turn a MonitorSample into an OpenMetrics text exposition.  Every metric family
+    is written with its TYPE and HELP lines, followed by one line per label set,
+    and the exposition ends with "# EOF".
+    '''
+    def __init__( self ):
+        self._lines : list[str] = []
+
+    def _family( self, name : str, help : str, values : dict, label : str ) -> None:
+        '''
+        Add a gauge with one sample per entry of values.  Missing (None) values are
+        left out.
+        '''
+        if not values:
+            return
+        lines = self._lines
+        lines.append( f"# TYPE {name} gauge" )
+        lines.append( f"# HELP {name} {help}" )
+        for key, value in values.items():
+            if value is None:
+                continue
+            lines.append( f'{name}{{{label}="{_escape( key )}"}} {value}' )
+
+    def _pairs( self, name : str, help : str, values : dict, label : str, directions : tuple[str,str] ) -> None:
+        '''
+        Add a gauge for read/write pairs, with the direction as a second label.
+        '''
+        if not values:
+            return
+        lines = self._lines
+        lines.append( f"# TYPE {name} gauge" )
+        lines.append( f"# HELP {name} {help}" )
+        for key, pair in values.items():
+            key = _escape( key )
+            for direction, value in zip( directions, pair ):
+                if value is not None:
+                    lines.append( f'{name}{{{label}="{key}",direction="{direction}"}} {value}' )
+
+    def _single( self, name : str, help : str, value : float ) -> None:
+        if value is None:
+            return
+        self._lines.append( f"# TYPE {name} gauge" )
+        self._lines.append( f"# HELP {name} {help}" )
+        self._lines.append( f"{name} {value}" )
+
+    def render( self, sample : MonitorSample ) -> bytes:
+        '''
+        Render one sample.
+
+        Returns:
+            The complete exposition, encoded as UTF-8
+        '''
+        self._lines = []
+        self._single( "oneup_sample_timestamp_seconds", "Wall clock time the sample was taken.", sample.wallTime )
+        self._family( "oneup_cpu_utilization_percent", "CPU utilization over the last sample interval.", sample.cpu, "cpu" )
+        self._family( "oneup_cpu_state_percent", "Share of the whole system's CPU time spent in each state.", sample.cpuStates, "state" )
+        self._family( "oneup_temperature_celsius", "CPU and drive temperatures.", sample.temperatures, "sensor" )
+        self._family( "oneup_fan_rpm", "Fan speed.", sample.fans, "fan" )
+        self._family( "oneup_fan_duty_percent", "Fan PWM duty cycle.", sample.pwm, "fan" )
+        self._family( "oneup_hwmon_value", "Every hardware monitor input, in degrees C, RPM, percent duty or volts.", sample.sensors, "sensor" )
+        self._pairs( "oneup_disk_bytes_per_second", "Drive throughput over the last sample interval.", sample.disks, "drive", ("read", "write") )
+        self._pairs( "oneup_network_bytes_per_second", "Network throughput over the last sample interval.", sample.networks, "device", ("receive", "transmit") )
+        battery = sample.battery
+        if battery:
+            self._single( "oneup_battery_capacity_percent", "Battery state of charge.", battery.get( "capacity" ))
+            self._single( "oneup_battery_charge_microamp_hours", "Estimated charge left in the battery.", battery.get( "charge_now" ))
+            self._single( "oneup_battery_charge_full_microamp_hours", "Charge of a full battery.", battery.get( "charge_full" ))
+            self._single( "oneup_battery_time_to_empty_seconds", "Estimated runtime left on battery.", battery.get( "time_to_empty_avg" ))
+            self._single( "oneup_battery_time_to_full_seconds", "Estimated time to a full charge.", battery.get( "time_to_full_now" ))
+            self._single( "oneup_ac_online", "1 when running from the charger, 0 on battery.", battery.get( "ac_online" ))
+        self._lines.append( "# EOF\n" )
+        return "\n".join( self._lines ).encode( "utf8" )
+
+class MetricsServer:
+    '''
+    Serve the latest sample as OpenMetrics text on /metrics.
+
+    The exposition is rendered once, on the collector thread, each time a sample is
+    taken, and kept as bytes.  A scrape only hands out the cached bytes, so it never
+    reads the hardware, and never waits on smartctl.  Drive temperatures are the
+    values cached by the collector's DriveTempSampler.
+
+    Parameters:
+        collector - The Collector to serve, it is started by start()
+        address   - Address to listen on, the default only accepts local connections
+        port      - TCP port to listen on
+    '''
+    def __init__( self, collector : Collector, address : str = DEFAULT_ADDRESS, port : int = DEFAULT_PORT ):
+        self.collector = collector
+        self.renderer  = MetricsRenderer()
+        self._body     : bytes = b"# EOF\n"
+        self._server   = ThreadingHTTPServer( (address, port), self._handlerClass() )
+        self._server.daemon_threads = True
+        self._thread   = None
+        collector.addListener( self._sampleTaken )
+
+    def _sampleTaken( self ) -> None:
+        '''
+        Called on the collector thread after every sample.  Replacing the reference
+        is atomic, so a scrape in progress keeps the body it started with.
+        '''
+        sample = self.collector.latest
+        if sample is not None:
+            self._body = self.renderer.render( sample )
+        # Nobody else is draining the ring
+        self.collector.samples()
+
+    @property
+    def body( self ) -> bytes:
+        '''
+        The current exposition.
+        '''
+        return self._body
+
+    @property
+    def address( self ) -> tuple:
+        '''
+        The (address, port) being served.
+        '''
+        return self._server.server_address
+
+    def _handlerClass( self ):
+        server = self
+
+        class Handler( BaseHTTPRequestHandler ):
+            def do_GET( self ):
+                if self.path.split( "?", 1 )[0] == "/metrics":
+                    body = server.body
+                    self.send_response( 200 )
+                    self.send_header( "Content-Type", CONTENT_TYPE )
+                else:
+                    body = b"oneUpMon metrics are at /metrics\n"
+                    self.send_response( 404 if self.path != "/" else 200 )
+                    self.send_header( "Content-Type", "text/plain; charset=utf-8" )
+                self.send_header( "Content-Length", str( len( body )))
+                self.end_headers()
+                self.wfile.write( body )
+
+            def log_message( self, format, *args ):
+                # Scrapes every few seconds would fill the journal
+                pass
+
+        return Handler
+
+    def start( self ) -> None:
+        '''
+        Start the collector, and serve requests on a background thread.
+        '''
+        self.collector.start()
+        if self._thread is None:
+            self._thread = threading.Thread( target=self._server.serve_forever, name="metrics", daemon=True )
+            self._thread.start()
+
+    def serveForever( self ) -> None:
+        '''
+        Start the collector, and serve requests on this thread until interrupted.
+        '''
+        self.collector.start()
+        try:
+            self._server.serve_forever()
+        finally:
+            self.stop()
+
+    def stop( self ) -> None:
+        '''
+        Stop serving, and stop the collector.
+        '''
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+        self.collector.stop()
+
+def main( argv : list[str] = None ) -> None:
+    '''
+    Run the headless metrics server.  The address, port and sample interval come
+    from the [serve] and [monitor] sections of /etc/sysmon.ini, and can be
+    overridden on the command line.
+    '''
+    config = ConfigClass( "/etc/sysmon.ini" )
+    parser = argparse.ArgumentParser( description="Serve system monitor samples as OpenMetrics text" )
+    parser.add_argument( "--serve", action="store_true", help=argparse.SUPPRESS )
+    parser.add_argument( "--address", default=config.getValue( 'serve', 'address', DEFAULT_ADDRESS ),
+                         help="address to listen on" )
+    parser.add_argument( "--port", type=int, default=int( config.getValue( 'serve', 'port', DEFAULT_PORT )),
+                         help="TCP port to listen on" )
+    args = parser.parse_args( argv )
+
+    refresh_ms = max( 50, int( config.getValue( 'monitor', 'refresh_ms', 1000 )))
+    server = MetricsServer( Collector( config, refresh_ms / 1000 ), args.address, args.port )
+    print( f"Serving metrics on http://{args.address}:{args.port}/metrics" )
+    try:
+        server.serveForever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
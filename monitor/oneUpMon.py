@@ -8,10 +8,25 @@ Requires: PyQt6 (including QtCharts)
 """
 
 import sys
-from systemsupport import CPUInfo, CPULoad, multiDriveStat, NetworkLoad
+
+# Headless mode, serve the samples over HTTP instead of drawing them.  This is
+# handled before anything else is imported, so it runs on a box without PyQt6.
+if __name__ == "__main__" and "--serve" in sys.argv[1:]:
+    from metricsserver import main as serve
+    serve(sys.argv[1:])
+    sys.exit(0)
+
 import gc
+import time
 from configfile import ConfigClass
-from fanspeed import GetCaseFanSpeed
+from collector import Collector
+from samplebus import BusCollector, openBus
+from deviceregistry import DeviceEvent
+from recorder import SampleRecording
+from chartbuffer import ChartBuffer, ChartHistory
+from allocstats import AllocationStats
+from framestats import FrameStats
+from autoscale import AutoScaler, BYTE_RATE_UNITS
 
 # --------------------------
 # Globals
@@ -22,31 +37,62 @@ MIN_HEIGHT  = 800
 
 DATA_WINDOW = 60
 
+# Lengths of history that can be shown, in seconds.  The first is the default.
+HISTORY_VIEWS  = [("1 min", DATA_WINDOW), ("10 min", 600), ("1 h", 3600), ("24 h", 86400)]
+
+# The most points drawn for one series, longer views are decimated to fit.
+HISTORY_POINTS = 1000
+
+# Read and write values of a device missing from a sample
+NO_DATA = (None, None)
+
+# How often a live window checks that the sample bus publisher is still there, or
+# whether one has started, in milliseconds
+BUS_CHECK_MS = 2000
+
 # --------------------------
 # UI
 # --------------------------
 
-from PyQt6.QtCore import Qt, QTimer
+from PyQt6.QtCore import Qt, QObject, QPointF, QTimer, pyqtSignal
 from PyQt6.QtGui import QPainter
-from PyQt6.QtWidgets import QApplication, QMainWindow, QWidget, QGridLayout
-from PyQt6.QtCharts import QChart, QChartView, QLineSeries, QValueAxis
+from PyQt6.QtWidgets import QApplication, QMainWindow, QWidget, QGridLayout, QHBoxLayout, QLabel, QComboBox, QSlider
+from PyQt6.QtCharts import QChart, QChartView, QLineSeries, QValueAxis, QCategoryAxis
 from PyQt6 import QtGui
 
 class RollingChart(QWidget):
     '''
     A reusable chart widget with one or more QLineSeries and a rolling X window.
+    
+    The samples are kept in a preallocated ChartHistory, which can hold several
+    views of different lengths.  Long views are decimated to min/max buckets, so a
+    view never draws more than HISTORY_POINTS points per series.  Each tick appends
+    at most a couple of points to each series and drops the points that scrolled
+    off, so the cost of a tick does not depend on the length of the view.  When
+    every point has to change (a change of view or of scale) the series are rebuilt
+    from the history with a single bulk replace.
 
     Parameters:
         title       - Chart title.
         series_defs - List of (name, color_qt_str or None) for each line.
         y_min,y_max - Fixed Y axis range.
         window      - Number of points to keep (points are 1 per tick by default).
+        views       - Optional list of view lengths in samples, the first is shown
+                      initially.  The default is a single view of window samples.
+        y2_range    - Optional (min, max, label format) of a second Y axis, on the right.
+        secondary   - Indexes of the series plotted against the second Y axis.
+        opengl      - Draw the lines with OpenGL rather than on the CPU.  The axes,
+                      legend and title are still drawn by QPainter.
     '''
-    def __init__(self, title: str, series_defs: list[tuple], y_min: float, y_max: float, window: int = DATA_WINDOW, parent=None):
+    def __init__(self, title: str, series_defs: list[tuple], y_min: float, y_max: float, window: int = DATA_WINDOW, parent=None, views: list[int] = None,
+                 y2_range: tuple = None, secondary: list[int] = [], opengl: bool = False):
         super().__init__(parent)
         self.title = title
-        self.pointWindow = window
-        self.xpos   = window - 1
+        self.opengl = opengl
+        self.history = ChartHistory(len(series_defs), views or [window], HISTORY_POINTS)
+        self.viewIndex = 0
+        self.pointWindow = self.history.views[0]
+        self.xpos   = -1
         self.chart  = QChart()
         
         self.chart.setTitle(title)
@@ -57,6 +103,7 @@ class RollingChart(QWidget):
         for name, color in series_defs:
             s = QLineSeries()
             s.setName(name)
+            s.setUseOpenGL(opengl)
             if color:
                 s.setColor(color)  # QColor or string like "#RRGGBB"
             self.series.append(s)
@@ -66,23 +113,34 @@ class RollingChart(QWidget):
         # want is the tick count etc, but NO lable on the axis.  There does not
         # appear to be a way to do that.
         self.axis_x = QValueAxis()
-        self.axis_x.setRange(0, self.pointWindow)
+        self.axis_x.setRange(-self.pointWindow, 0)
         self.axis_x.setMinorTickCount( 2 )
         self.axis_x.setTickCount( 10 )
         self.axis_x.setLabelFormat("%d")
         self.axis_x.setVisible(False)
 
         # Setup Y Axis...
-        self.axis_y = QValueAxis()
+        self.axis_y = self.createYAxis()
         self.axis_y.setRange(y_min, y_max)
         self.axis_y.setLabelFormat( "%d" )
 
         self.chart.addAxis(self.axis_x, Qt.AlignmentFlag.AlignBottom)
         self.chart.addAxis(self.axis_y, Qt.AlignmentFlag.AlignLeft)
-
-        for s in self.series:
+        
+        # Optional second Y Axis...
+        self.axis_y2 = None
+        if y2_range is not None:
+            self.axis_y2 = QValueAxis()
+            self.axis_y2.setRange(y2_range[0], y2_range[1])
+            self.axis_y2.setLabelFormat(y2_range[2])
+            self.chart.addAxis(self.axis_y2, Qt.AlignmentFlag.AlignRight)
+
+        for index, s in enumerate(self.series):
             s.attachAxis(self.axis_x)
-            s.attachAxis(self.axis_y)
+            if self.axis_y2 is not None and index in secondary:
+                s.attachAxis(self.axis_y2)
+            else:
+                s.attachAxis(self.axis_y)
 
         self.view = QChartView(self.chart)
         self.view.setRenderHints(QPainter.RenderHint.Antialiasing)
@@ -91,6 +149,12 @@ class RollingChart(QWidget):
         layout.setContentsMargins(0, 0, 0, 0)
         layout.addWidget(self.view, 0, 0)
         
+    def createYAxis(self) -> QValueAxis:
+        '''
+        Create the Y axis.  The base chart uses a plain value axis.
+        '''
+        return QValueAxis()
+    
     def append(self, values: list[float]):
         '''
         Append one sample (for each series) at the next x value. Handles rolling window.
@@ -100,189 +164,278 @@ class RollingChart(QWidget):
             values - A list of floating point numbers, on per data series in the
                     chart.
         '''
-        self.xpos += 1
-        for s, v in zip(self.series, values):
-            # Handle NaN by skipping, or plot zero—here we clamp None/NaN to None and skip
-            try:
-                if v is None:
-                    continue
-                # If you want to clamp, do it here: v = max(self.axis_y.min(), min(self.axis_y.max(), v))
-                s.append(self.xpos, float(v))
-            except Exception as error:
-                # ignore bad data points
-                print( f"Exception error {error}" )
-                pass
+        self.xpos = self.history.push(values)
+        
+        # Raw views draw every sample, decimated views only when a bucket fills.
+        # Missing (None or NaN) values are skipped.
+        level = self.history.level(self.viewIndex)
+        if isinstance(level, ChartBuffer):
+            x = self.xpos
+            for s, v in zip(self.series, values):
+                if v is not None and v == v:
+                    s.append(x, v)
+        elif level.completed:
+            x    = level.rawX(level.low.x)
+            half = level.factor // 2
+            for index, s in enumerate(self.series):
+                low = level.low.newest(index)
+                if low == low:
+                    s.append(x - half, low)
+                    s.append(x, level.high.newest(index))
             
         # Trim series to rolling window
-        min_x_to_keep = max(0, self.xpos - self.pointWindow)
+        min_x_to_keep = self.xpos - self.pointWindow
         self.axis_x.setRange(min_x_to_keep, self.xpos)
-        
         for s in self.series:
-            # Efficient trim: remove points with x < min_x_to_keep
-            # QLineSeries doesn't provide O(1) pop from front, so we rebuild if large
-            points = s.points()
-            if points and points[0].x() < min_x_to_keep:
-                # binary search for first index >= min_x_to_keep
-                lo, hi = 0, len(points)
-                while lo < hi:
-                    mid = (lo + hi) // 2
-                    if points[mid].x() < min_x_to_keep:
-                        lo = mid + 1
-                    else:
-                        hi = mid
-                s.replace(points[lo:])  # keep tail only
-
-class scaleValues:
-    def __init__( self, range_y ):
-        self.index      = 0
-        self.valueRange = range_y
+            self.trim(s, min_x_to_keep)
     
-    @property
-    def scale( self ):
-        return self.valueRange[self.index][1]
+    def addSeries(self, name: str, color=None) -> int:
+        '''
+        Add a line to the chart while it is running, for a device that was plugged
+        in.  It has no history, so it starts at the right hand edge.
+        
+        Parameters:
+            name  - Name shown in the legend
+            color - Optional QColor or color string
+            
+        Returns:
+            The index of the new series
+        '''
+        s = QLineSeries()
+        s.setName(name)
+        s.setUseOpenGL(self.opengl)
+        if color:
+            s.setColor(color)
+        self.chart.addSeries(s)
+        s.attachAxis(self.axis_x)
+        s.attachAxis(self.axis_y)
+        self.series.append(s)
+        self.chart.legend().setVisible(len(self.series) > 1)
+        return self.history.addSeries()
     
-    def scaleValue(self, value : float ):
-        return value / self.scale
+    def removeSeries(self, index: int):
+        '''
+        Remove a line, and its history, for a device that went away.  The series
+        after it move down one index.
+        
+        Parameters:
+            index - Index of the series to remove
+        '''
+        s = self.series.pop(index)
+        self.chart.removeSeries(s)
+        self.history.removeSeries(index)
+        self.chart.legend().setVisible(len(self.series) > 1)
     
-    def nextScale( self ):
-        if (self.index + 1) < len(self.valueRange):
-            self.index += 1
-        #print( f"Switched scale to {self.valueRange[self.index]}")
+    def load(self, columns: list, start: int, end: int):
+        '''
+        Replace everything shown with samples start to end-1 of a recording.  Only
+        the current view is rebuilt, the chart is reloaded when the view changes.
+        
+        Parameters:
+            columns    - One sequence of values per series, or None for a series
+                         that was not recorded
+            start, end - The range of samples to show
+        '''
+        self.history = ChartHistory(len(self.series), self.history.views, HISTORY_POINTS)
+        values = [None] * len(columns)
+        for index in range(start, end):
+            for c, column in enumerate(columns):
+                values[c] = column[index] if column is not None else None
+            self.xpos = self.history.push(values, self.viewIndex)
+        self.axis_x.setRange(self.xpos - self.pointWindow, self.xpos)
+        self.redraw()
     
-    def prevScale( self ):
-        if self.index > 0:
-            self.index -= 1
-        #print( f"Switches scale to {self.valueRange[self.index]}")
-            
-    def scalePointsDown( self, points ):
-        amount = self.valueRange[self.index][1]
-        for point in points:
-            point.setY(point.y() / amount)
-            
-    def scaleDown( self, value ):
-        return value / 1024
+    def setView(self, view: int):
+        '''
+        Switch the length of history shown.
+        
+        Parameters:
+            view - Index into the views passed when the chart was created
+        '''
+        self.viewIndex   = view
+        self.pointWindow = self.history.views[view]
+        self.axis_x.setRange(self.xpos - self.pointWindow, self.xpos)
+        self.redraw()
     
-    def scaleUp( self, value ):
-        return value * 1024
-            
-    def scalePointsUp( self, points ):
-        amount = self.valueRange[self.index][1]
-        for point in points:
-            point.setY(point.y() * amount)
-
-    @property
-    def name( self ):
-        return self.valueRange[self.index][0]
+    def maximum(self) -> float:
+        '''
+        The largest value held for the current view, in stored units.
+        '''
+        return self.history.maximum(self.viewIndex)
     
+    def trim(self, s: QLineSeries, min_x_to_keep: int):
+        '''
+        Remove the points at the front of a series that are older than min_x_to_keep.
+        Normally this is a single point per tick.
+        '''
+        count = s.count()
+        drop = 0
+        while drop < count and s.at(drop).x() < min_x_to_keep:
+            drop += 1
+        if drop:
+            s.removePoints(0, drop)
     
+    def redraw(self):
+        '''
+        Rebuild every series from the history, with one bulk replace per series.
+        '''
+        for index, s in enumerate(self.series):
+            s.replace([ QPointF(x, v) for x, v in self.history.points(self.viewIndex, index) ])
+
 class RollingChartDynamic(RollingChart):
-    def __init__(self, title : str, series_defs: list[tuple], range_y : list[tuple], window=DATA_WINDOW,parent=None):
-        self.maxY = 512
-        super().__init__(title,series_defs,0,self.maxY,window,parent)
+    '''
+    A RollingChart for values that cover a huge range, such as bytes per second.
+    
+    The series always hold the raw values.  The unit tier (Bytes/s, KiB/s, ...) is
+    applied only to the axis: the axis range is set in raw units, and its labels
+    are written in the current unit.  Changing the tier therefore only relabels a
+    handful of ticks, no stored point is touched.
+    
+    The unit and ceiling are chosen by an AutoScaler, which jumps straight to the
+    right tier when the maximum grows, and only shrinks once the maximum has stayed
+    low for SHRINK_TICKS ticks.  The axis and title, each of which makes QtCharts
+    lay the chart out again, are only touched when the scale actually changes.
+    
+    Parameters:
+        units - List of (name, factor) of the units, smallest first
+    '''
+    TICKS        = 4
+    SHRINK_TICKS = 10
+    
+    def __init__(self, title : str, series_defs: list[tuple], units : list[tuple] = BYTE_RATE_UNITS, window=DATA_WINDOW,parent=None,views=None,opengl=False):
+        self.scale = AutoScaler(units, shrinkTicks=RollingChartDynamic.SHRINK_TICKS)
+        super().__init__(title,series_defs,0,self.scale.top,window,parent,views,opengl=opengl)
         self.title = title
-        self.max   = 0
-        self.scale = scaleValues(range_y)
         self.chart.setTitle( title+ f" ({self.scale.name})" )
+        self.setCeiling( self.scale.ceiling )
     
-    def getBestFit( self, value ):
-        values = [4,8,16,32,64,128,256,512,1024]
-        for i in values:
-            if value < i:
-                return i
-        return 4
+    def createYAxis(self) -> QValueAxis:
+        '''
+        The Y axis is a category axis, so its labels can be written in the current
+        unit while the range stays in raw units.
+        '''
+        axis = QCategoryAxis()
+        axis.setLabelsPosition(QCategoryAxis.AxisLabelsPosition.AxisLabelsPositionOnValue)
+        return axis
+    
+    def setCeiling(self, ceiling: int):
+        '''
+        Set the top of the Y axis, in the current unit, and label the ticks.
+        
+        Parameters:
+            ceiling - Top of the axis in the current unit
+        '''
+        for label in self.axis_y.categoriesLabels():
+            self.axis_y.remove(label)
+        self.axis_y.setStartValue(0)
+        for tick in range(1, RollingChartDynamic.TICKS + 1):
+            value = ceiling * tick / RollingChartDynamic.TICKS
+            self.axis_y.append(f"{value:g}", value * self.scale.factor)
+        self.axis_y.setRange(0, ceiling * self.scale.factor)
     
     def append(self, values: list[float]):
         '''
         Append one sample (for each series) at the next x value. Handles rolling window.
         values must match the number of series.
         
+        If the largest value in the window no longer fits the current scale, or has
+        been well below it for a while, the axis is rescaled.
+        
         Parameters:
             values - A list of floating point numbers, on per data series in the
                     chart.
         '''
-        scaleUp = False
-        self.xpos += 1
-        for s, v in zip(self.series, values):
-            # Handle NaN by skipping, or plot zero—here we clamp None/NaN to None and skip
-            try:
-                if v is None:
-                    continue
-                sv = self.scale.scaleValue(v)
-                if sv > 1024:
-                    scaleUp = True
-                # If you want to clamp, do it here: v = max(self.axis_y.min(), min(self.axis_y.max(), v))
-                #if v:
-                #    print( f"value : {v} scaled: {sv} " )
-                s.append(self.xpos, float(sv))
-            except Exception as error:
-                # ignore bad data points
-                print( f"Exception error {error}" )
-                pass
-            
-        # Trim series to rolling window
-        min_x_to_keep = max(0, self.xpos - self.pointWindow)
-        self.axis_x.setRange(min_x_to_keep, self.xpos)
-            
-        if scaleUp:
-            self.scale.nextScale()
+        super().append(values)
+        self.updateScale()
+    
+    def setView(self, view: int):
+        super().setView(view)
+        self.updateScale(refit=True)
+    
+    def load(self, columns: list, start: int, end: int):
+        super().load(columns, start, end)
+        self.updateScale(refit=True)
+    
+    def updateScale(self, refit: bool = False):
+        '''
+        Let the AutoScaler pick the unit and axis ceiling for the current window
+        maximum, and update the axis and title only if they changed.
+        
+        Parameters:
+            refit - Jump to the best fit at once, for when the whole window was replaced
+        '''
+        unit = self.scale.index
+        maximum = self.maximum()
+        if not (self.scale.fit(maximum) if refit else self.scale.update(maximum)):
+            return
+        if self.scale.index != unit:
             self.chart.setTitle(self.title + f" ({self.scale.name})" )
-
-        maxV = 0
-        for s in self.series:
-            drop = 0
-            points = s.points()
-            for index, point in enumerate(points):
-                if point.x() < min_x_to_keep:
-                    drop = index
-                if scaleUp:
-                    point.setY( self.scale.scaleDown(point.y()))
-                if maxV < point.y():
-                    maxV = point.y()
-            s.replace( points[drop:] )
-      
-        if maxV > 1:
-            self.axis_y.setRange( 0, self.getBestFit(maxV) )
-        
-        #print( f"maxV left is {maxV}" )
-        if maxV < 1:
-            self.scale.prevScale()
-            self.chart.setTitle( self.title + f" ({self.scale.name})")
-            for s in self.series:
-                points = s.points()
-                for point in points:
-                    point.setY( self.scale.scaleUp(point.y()))
-                s.replace(points)
+        self.setCeiling(self.scale.ceiling)
                 
+class CollectorBridge(QObject):
+    '''
+    Carry the collector's "sample ready" notification from the collector thread to
+    the GUI thread.  The signal is emitted on the collector thread, and delivered
+    through a queued connection, so the slot always runs in the GUI event loop.
+    '''
+    sampleReady = pyqtSignal()
+
 class MonitorWindow(QMainWindow):
     '''
-    Creating a window to monitor various system aspects.
+    Creating a window to monitor various system aspects.  All of the data is
+    collected on a background thread by a Collector, this window only draws.
     
     Parameters:
-        refresh_ms  - Time between refreshes of data on screen, in milliseconds, the
-                      default is 1 second.
-        window      - How much data do we want to store in the graph?  Each data point
-                      is a data refresh period.
+        refresh_ms  - Time between refreshes of data on screen, in milliseconds.  The
+                      default is the [monitor] refresh_ms value from the configuration
+                      file, or 1 second if that is not set.
+        replay      - Path of a recording to show instead of live data.  A slider
+                      scrubs through it.
+        window      - How much data is shown in the graph initially, in seconds.  The
+                      other lengths of history in HISTORY_VIEWS can be picked from
+                      the window.
         Parent      - Owning parent of this window... default is None.
     '''
-    def __init__(self, refresh_ms: int = 1000, keepWindow = DATA_WINDOW, parent=None):
+    def __init__(self, refresh_ms: int = None, keepWindow = DATA_WINDOW, parent=None, replay: str = None):
         super().__init__(parent)
         
         # Get all the filters loaded
         self.config = ConfigClass("/etc/sysmon.ini")
-        self.driveTempFilter = self.config.getValueAsList( 'drive', 'temp_ignore' )
-        self.drivePerfFilter = self.config.getValueAsList( 'drive', 'perf_ignore' )
-        
-        # Get supporting objects
-        self.cpuinfo    = CPUInfo()
-        self.cpuload    = CPULoad()
-        self.caseFanPin = self.config.getValue( 'cooling', 'casefan',None )
-        if self.caseFanPin is None :
-            self.caseFan = None
+        self.recording = SampleRecording(replay) if replay else None
+        if self.recording is not None:
+            refresh_ms = int(self.recording.interval * 1000)
+        elif refresh_ms is None:
+            refresh_ms = int( self.config.getValue( 'monitor', 'refresh_ms', 1000 ))
+        refresh_ms = max( 50, refresh_ms )
+        
+        # The lengths of history that can be shown, starting with keepWindow
+        viewList = [ (name, seconds) for name, seconds in HISTORY_VIEWS if seconds >= keepWindow ]
+        if not viewList or viewList[0][1] != keepWindow:
+            viewList.insert( 0, (f"{keepWindow} s", keepWindow) )
+        self.viewNames = [ name for name, _ in viewList ]
+        views = [ max( 2, int( seconds * 1000 / refresh_ms )) for _, seconds in viewList ]
+        self.views = views
+        keepWindow = views[0]
+        
+        # Get supporting objects.  If a collector is already publishing samples on
+        # the shared memory bus, use those rather than reading the hardware again.
+        # If the publisher stops, or starts later, the window switches over, see
+        # check_bus.
+        self.refresh_ms = refresh_ms
+        reader = self.recording
+        self.busPath = self.config.getValue( 'bus', 'path', '' )
+        self.useBus = reader is None and self.busPath.lower() != 'none'
+        if self.useBus:
+            reader = self.open_bus()
+        if reader is not None:
+            self.collector = BusCollector( self.config, reader )
         else:
-            self.caseFan = GetCaseFanSpeed( int(self.caseFanPin) )
-        self.multiDrive = multiDriveStat()
+            self.collector = Collector( self.config, refresh_ms / 1000 )
         
-        self.setWindowTitle("System Monitor")
+        if self.recording is not None:
+            self.setWindowTitle(f"System Monitor - {replay}")
+        else:
+            self.setWindowTitle("System Monitor")
         self.setMinimumSize(MIN_WIDTH, MIN_HEIGHT)
 
         central = QWidget(self)
@@ -292,179 +445,389 @@ class MonitorWindow(QMainWindow):
         grid.setVerticalSpacing(8)
         self.setCentralWidget(central)
 
-        # Charts
+        # Charts, drawn on the CPU unless [monitor] renderer asks for OpenGL
+        self.renderer = self.config.getValue( 'monitor', 'renderer', 'raster' ).lower()
+        if self.renderer not in ('raster', 'opengl'):
+            print( f"Unknown renderer {self.renderer}, using raster" )
+            self.renderer = 'raster'
+        opengl = self.renderer == 'opengl'
+        self.cpuNames = self.collector.cpuNames
         self.use_chart = RollingChart(
             title="CPU Utilization",
-            series_defs=[ (name, None) for name in self.cpuload.cpuNames ],
+            series_defs=[ (name, None) for name in self.cpuNames ],
             y_min=0, y_max=100,
-            window=keepWindow
+            window=keepWindow,
+            views=views,
+            opengl=opengl
             )
         
-        series = [("CPU", None)]
-        for name in self.multiDrive.drives:
-            if not name in self.driveTempFilter:
-                series.append( (name,None) )
-
+        self.tempNames = ["CPU"] + self.collector.tempDrives
         self.cpu_chart = RollingChart(
             title="Temperature (°C)",
-            series_defs= series,
+            series_defs= [ (name, None) for name in self.tempNames ],
             y_min=20, y_max=80,
-            window=keepWindow
+            window=keepWindow,
+            views=views,
+            opengl=opengl
             )
         
-        if self.cpuinfo.model == 5:
-            self.caseFanPin = self.config.getValue( "cooling", "casefan", None )
-            if self.caseFanPin is None:
-                series = [("CPU",None)]
-            else:
-                series = [("CPU",None),("CaseFan",None)]
-
+        if self.collector.hasFan:
+            self.fanNames = self.collector.fanNames
             self.fan_chart = RollingChart(
-                title="Fan Speed",
-                series_defs=[("RPM",None)],
+                title="Fan Speed (RPM) / Duty",
+                series_defs=[ (name, None) for name in self.fanNames ] + [("CPU PWM", None)],
                 y_min=0,y_max=6000,
-                window=keepWindow
+                window=keepWindow,
+                views=views,
+                y2_range=(0, 100, "%d%%"),
+                secondary=[len(self.fanNames)],
+                opengl=opengl
             )
         else:
+            self.fanNames  = []
             self.fan_chart = None
 
+        self.diskNames = list(self.collector.perfDrives)
         series = []
-        for name in self.multiDrive.drives:
-            if not name in self.drivePerfFilter:
-                series.append( (f"{name} Read", None) )
-                series.append( (f"{name} Write", None ) )
+        for name in self.diskNames:
+            series.append( (f"{name} Read", None) )
+            series.append( (f"{name} Write", None ) )
             
         self.io_chart = RollingChartDynamic(
             title="Disk I/O",
             series_defs=series,
-            range_y=[("Bytes/s", 1),("KiB/s", 1024),("MiB/s", 1024*1024),("GiB/s", 1024*1024*1024)],
+            units=BYTE_RATE_UNITS,
             window=keepWindow,
+            views=views,
+            opengl=opengl
         )
         
-        self.networkFilter   = self.config.getValueAsList( 'network', 'device_ignore')
-        self.network = NetworkLoad(self.networkFilter)
+        self.networkNames = list(self.collector.networkNames)
         series = []
-        for name in self.network.names:
+        for name in self.networkNames:
             series.append( (f"{name} Read", None) )
             series.append( (f"{name} Write", None) )
         
         self.network_chart = RollingChartDynamic(
             title="Network I/O",
             series_defs=series,
-            range_y=[("Bytes/s", 1),("KiB/s", 1024),("MiB/s", 1024*1024),("GiB/s", 1024*1024*1024)],
+            units=BYTE_RATE_UNITS,
             window=keepWindow,
+            views=views,
+            opengl=opengl
         )
+
+        self.charts = [ c for c in (self.use_chart, self.cpu_chart, self.fan_chart, self.io_chart, self.network_chart) if c ]
         
-        self.networkFilter   = self.config.getValueAsList( 'network', 'device_ignore')
-        self.network = NetworkLoad(self.networkFilter)
-        series = []
-        for name in self.network.names:
-            series.append( (f"{name} Read", None) )
-            series.append( (f"{name} Write", None) )
+        # History selection
+        controls = QHBoxLayout()
+        controls.addStretch(1)
+        controls.addWidget(QLabel("History:"))
+        self.viewSelect = QComboBox()
+        self.viewSelect.addItems(self.viewNames)
+        self.viewSelect.currentIndexChanged.connect(self.set_view)
+        controls.addWidget(self.viewSelect)
+        grid.addLayout(controls, 0, 0, 1, 2 )
         
-        self.network_chart = RollingChartDynamic(
-            title="Network I/O",
-            series_defs=series,
-            range_y=[("Bytes/s", 1),("KiB/s", 1024),("MiB/s", 1024*1024),("GiB/s", 1024*1024*1024)],
-            window=keepWindow,
-        )
+        # Scrubbing through a recording
+        if self.recording is not None:
+            self.replayColumns = self.recording_columns()
+            self.replayTime = QLabel()
+            self.replaySlider = QSlider(Qt.Orientation.Horizontal)
+            self.replaySlider.setRange(0, max(0, len(self.recording) - 1))
+            self.replaySlider.setTracking(False)
+            self.replaySlider.valueChanged.connect(self.scrub)
+            self.replaySlider.sliderMoved.connect(self.show_replay_time)
+            controls.insertWidget(0, self.replayTime)
+            controls.insertWidget(0, self.replaySlider, 4)
 
         # Layout: 2x2 grid (CPU, NVMe on top; IO full width bottom)
-        grid.addWidget(self.use_chart, 0, 0, 1, 2 )
-        grid.addWidget(self.io_chart,  1, 0, 1, 2 )
-        grid.addWidget(self.network_chart, 2, 0, 1, 2 )
+        grid.addWidget(self.use_chart, 1, 0, 1, 2 )
+        grid.addWidget(self.io_chart,  2, 0, 1, 2 )
+        grid.addWidget(self.network_chart, 3, 0, 1, 2 )
         if self.fan_chart:
-            grid.addWidget(self.cpu_chart, 3, 0, 1, 1 )
-            grid.addWidget(self.fan_chart, 3, 1, 1, 1 )
+            grid.addWidget(self.cpu_chart, 4, 0, 1, 1 )
+            grid.addWidget(self.fan_chart, 4, 1, 1, 1 )
+        else:
+            grid.addWidget(self.cpu_chart, 4, 0, 1, 2 )
+
+        # Reused for every sample drawn
+        self._tempValues = [ None for _ in self.tempNames ]
+        self._fanValues  = [ None for _ in range(len(self.fanNames) + 1) ]
+        self._diskValues = [ None for _ in range(2 * len(self.diskNames)) ]
+        self._netValues  = [ None for _ in range(2 * len(self.networkNames)) ]
+        self._cpuValues  = [ None for _ in self.cpuNames ]
+        
+        # Optional allocation and garbage collection counters, shown in the status bar
+        if self.config.getValue( 'debug', 'alloc_stats', 'no' ).lower() in ('yes', 'true', '1'):
+            self.allocStats = AllocationStats()
+        else:
+            self.allocStats = None
+        
+        # Optional cost of each frame, to compare the renderers
+        if self.config.getValue( 'debug', 'frame_stats', 'no' ).lower() in ('yes', 'true', '1'):
+            self.frameStats = FrameStats(self.renderer)
+        else:
+            self.frameStats = None
+
+        # Samples arrive from the collector thread
+        self.bridge = CollectorBridge(self)
+        self.bridge.sampleReady.connect(self.refresh_metrics, Qt.ConnectionType.QueuedConnection)
+        self.collector.addListener(self.bridge.sampleReady.emit)
+        if self.recording is not None:
+            last = self.replaySlider.maximum()
+            if self.replaySlider.value() == last:
+                self.scrub(last)
+            else:
+                self.replaySlider.setValue(last)
         else:
-            grid.addWidget(self.cpu_chart, 3, 0, 1, 2 )
+            self.collector.start()
+            if self.useBus:
+                self.busTimer = QTimer(self)
+                self.busTimer.timeout.connect(self.check_bus)
+                self.busTimer.start(BUS_CHECK_MS)
 
-        # Get the initial information from the syste
+    def open_bus(self):
+        '''
+        Open the sample bus, if a collector is publishing on it.
+        
+        Returns:
+            A SampleBusReader, or None
+        '''
+        return openBus( self.busPath ) if self.busPath else openBus()
+    
+    def check_bus(self):
+        '''
+        Called on a timer while showing live data.  When the bus publisher has
+        stopped sending samples, collect locally instead.  While collecting locally,
+        go back to the bus as soon as a publisher is running again.
+        '''
+        if isinstance(self.collector, BusCollector):
+            if not self.collector.alive:
+                print("sample bus publisher stopped, collecting locally")
+                self.use_collector(Collector( self.config, self.refresh_ms / 1000 ))
+            return
+        reader = self.open_bus()
+        if reader is not None:
+            self.use_collector(BusCollector( self.config, reader ))
+    
+    def use_collector(self, collector):
+        '''
+        Take the samples from another collector, keeping what the charts hold.  The
+        samples the old one took are drawn first, and chart lines are added or
+        removed for the drives and interfaces the new one sees differently.
+        
+        Parameters:
+            collector - The Collector or BusCollector to use from now on
+        '''
+        self.collector.stop()
         self.refresh_metrics()
+        self.collector = collector
+        
+        drives = set(collector.perfDrives) | set(collector.tempDrives)
+        shown  = set(self.diskNames) | set(self.tempNames[1:])
+        networks = set(collector.networkNames)
+        events = [ DeviceEvent("remove", "block", name, None) for name in sorted(shown - drives) ]
+        events += [ DeviceEvent("add", "block", name, None) for name in sorted(drives - shown) ]
+        events += [ DeviceEvent("remove", "net", name, None) for name in sorted(set(self.networkNames) - networks) ]
+        events += [ DeviceEvent("add", "net", name, None) for name in sorted(networks - set(self.networkNames)) ]
+        self.apply_events(events)
         
-        # Timer
-        self.timer = QTimer(self)
-        self.timer.timeout.connect(self.refresh_metrics)
-        self.timer.start(refresh_ms)
+        collector.addListener(self.bridge.sampleReady.emit)
+        collector.start()
 
+    def set_view(self, view: int):
+        '''
+        Switch every chart to another length of history.
+        
+        Parameters:
+            view - Index into the list of views
+        '''
+        for chart in self.charts:
+            chart.setView(view)
+        if self.recording is not None:
+            self.scrub(self.replaySlider.value())
+    
+    def recording_columns(self) -> list[tuple]:
+        '''
+        Find the recorded series behind every line of every chart.
+        
+        Returns:
+            A list of (chart, columns), with None for a line that was not recorded
+        '''
+        def column(name):
+            try:
+                return self.recording.column(name)
+            except KeyError:
+                return None
+        
+        result = [
+            (self.use_chart, [ column(f"cpu/{name}") for name in self.cpuNames ]),
+            (self.cpu_chart, [ column(f"temperatures/{name}") for name in self.tempNames ]),
+            (self.io_chart, [ column(f"disks/{name}/{direction}") for name in self.diskNames for direction in ("read", "write") ]),
+            (self.network_chart, [ column(f"networks/{name}/{direction}") for name in self.networkNames for direction in ("read", "write") ]),
+        ]
+        if self.fan_chart:
+            result.append((self.fan_chart, [ column(f"fans/{name}") for name in self.fanNames ] + [ column("pwm/CPU") ]))
+        return result
+    
+    def show_replay_time(self, position: int):
+        '''
+        Show the time of a position in the recording.
+        '''
+        if position < len(self.recording):
+            self.replayTime.setText(time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.recording.times[position])))
+    
+    def scrub(self, position: int):
+        '''
+        Show the recording up to a sample, as much of it as the current view covers.
+        
+        Parameters:
+            position - Index of the newest sample to show
+        '''
+        if len(self.recording) == 0:
+            return
+        end   = position + 1
+        start = max(0, end - self.views[self.viewSelect.currentIndex()])
+        for chart, columns in self.replayColumns:
+            chart.load(columns, start, end)
+        self.show_replay_time(position)
     def refresh_metrics(self):
         '''
-        This routine is called periodically, as setup in the __init__ functon.  Since this
-        routine calls out to other things, we want to make sure that there is no possible
-        exception, so everything needs to be wrapped in a handler.
+        This routine is called on the GUI thread whenever the collector has taken new
+        samples.  All of the pending samples are drawn, so nothing is lost if the GUI
+        was busy for a while.
         '''
+        if self.frameStats is not None:
+            self.frameStats.startFrame()
         
-        gc.collect()
+        sample = self.collector.pop()
+        while sample is not None:
+            self.draw_sample(sample)
+            sample = self.collector.pop()
+        
+        status = []
+        if self.frameStats is not None:
+            self.frameStats.updated()
+            status.append(self.frameStats.summary())
+        if self.allocStats is not None:
+            blocks, collections, pause = self.allocStats.tick()
+            status.append(
+                f"blocks {blocks:+d}  gc {collections} ({pause:.2f} ms)  "
+                f"max gc pause {self.allocStats.maxPauseNs / 1e6:.2f} ms" )
+        if status:
+            self.statusBar().showMessage("   ".join(status))
+    
+    def draw_sample(self, sample):
+        '''
+        Append one MonitorSample to the charts.  Anything missing from the sample is
+        passed on as None, which the charts skip.  The value lists are allocated once
+        and refilled for every sample.
+        
+        Parameters:
+            sample - The MonitorSample to draw
+        '''
+        if sample.events:
+            self.apply_events(sample.events)
+        
+        values = self._tempValues
+        for index, name in enumerate(self.tempNames):
+            values[index] = sample.temperatures.get(name)
+        self.cpu_chart.append( values )
         
-        # Obtain the current fan speed
-        if self.cpuinfo.model == 5:
-            try:
-                if self.caseFanPin:
-                    fan_speed = [self.cpuinfo.CPUFanSpeed,self.caseFan.RPM]
-                else:
-                    fan_speed = [self.cpuinfo.CPUFanSpeed]
-            except Exception as e:
-                print( f"error getting fan speed: {e}" )
-                fan_speed = [None,None]
-        else:
-            fan_speed = [None,None]
-        
-        # Setup the temperature for the CPU and Drives
-        temperatures = []
-        try:
-            temperatures.append( float(self.cpuinfo.temperature) )
-        except Exception:
-            temperatures.append( 0.0 )
-             
-        # Obtain the drive temperatures
-        try:
-            for _drive in self.multiDrive.drives:
-                if not _drive in self.driveTempFilter:
-                    extraCmd = self.config.getValue( 'smartctl', _drive, None )
-                    temperatures.append( self.multiDrive.driveTemp( _drive, extraCmd ))
-        except Exception:
-            temperatures = [ 0.0 for _ in self.multiDrive.drives ]
-
-        # Obtain the NVMe Device read and write rates
-        try:
-            rwData = []
-            drives = self.multiDrive.readWriteBytes()
-            for drive in drives:
-                if not drive in self.drivePerfFilter:
-                    rwData.append( float(drives[drive][0]))
-                    rwData.append( float(drives[drive][1]))
-        except Exception :
-            rwData = [ None, None ]
-            
-        # obtain network device read and writes rates
-        try:
-            netData = []
-            networks = self.network.stats
-            for network in networks:
-                netData.append( float( networks[network][0]))
-                netData.append( float( networks[network][1]))
-        except Exception:
-            netData = [None,None]
-            
-        # Get the CPU load precentages
-        try:
-            p = self.cpuload.getPercentages()
-            values = [p[name] for name in self.cpuload.cpuNames]
-        except Exception:
-            values = [ None for name in self.cpuload.cpuNames ]
-
-        # Append to charts
-        self.cpu_chart.append( temperatures )
         if self.fan_chart:
-            self.fan_chart.append( fan_speed )
-        self.io_chart.append( rwData )
-        self.network_chart.append( netData )
+            values = self._fanValues
+            for index, name in enumerate(self.fanNames):
+                values[index] = sample.fans.get(name)
+            values[-1] = sample.pwm.get("CPU")
+            self.fan_chart.append( values )
+        
+        values = self._diskValues
+        for index, drive in enumerate(self.diskNames):
+            values[2*index], values[2*index+1] = sample.disks.get( drive, NO_DATA )
+        self.io_chart.append( values )
+            
+        values = self._netValues
+        for index, network in enumerate(self.networkNames):
+            values[2*index], values[2*index+1] = sample.networks.get( network, NO_DATA )
+        self.network_chart.append( values )
+        
+        values = self._cpuValues
+        for index, name in enumerate(self.cpuNames):
+            values[index] = sample.cpu.get(name)
         self.use_chart.append( values )
+        
+    def apply_events(self, events):
+        '''
+        Add and remove chart lines for drives and network interfaces that were
+        plugged in or went away.  The collector has already started or stopped
+        monitoring them, so this only has to keep the charts in step.
+        
+        Parameters:
+            events - DeviceEvents from a MonitorSample
+        '''
+        for event in events:
+            name = event.name
+            if event.subsystem == "net":
+                self.update_pair(self.network_chart, self.networkNames, self._netValues, name, event.action)
+                continue
+            if not name in self.collector.drivePerfFilter:
+                self.update_pair(self.io_chart, self.diskNames, self._diskValues, name, event.action)
+            if not name in self.collector.driveTempFilter:
+                if event.action == "add" and not name in self.tempNames:
+                    self.tempNames.append(name)
+                    self._tempValues.append(None)
+                    self.cpu_chart.addSeries(name)
+                elif event.action == "remove" and name in self.tempNames:
+                    index = self.tempNames.index(name)
+                    self.cpu_chart.removeSeries(index)
+                    del self.tempNames[index]
+                    del self._tempValues[index]
+    
+    def update_pair(self, chart, names, values, name, action):
+        '''
+        Add or remove the read and write lines of one device on an I/O chart.
+        
+        Parameters:
+            chart  - The chart to change
+            names  - The device names shown on the chart, updated in place
+            values - The reused value list for the chart, resized in place
+            name   - The device
+            action - "add" or "remove"
+        '''
+        if action == "add" and not name in names:
+            names.append(name)
+            values.extend((None, None))
+            chart.addSeries(f"{name} Read")
+            chart.addSeries(f"{name} Write")
+        elif action == "remove" and name in names:
+            index = names.index(name)
+            chart.removeSeries(2*index+1)
+            chart.removeSeries(2*index)
+            del names[index]
+            del values[-2:]
+    
+    def closeEvent(self, event):
+        '''
+        Stop the collector when the window is closed.
+        '''
+        self.collector.stop()
+        if self.frameStats is not None and self.frameStats.frames:
+            print(f"{self.frameStats.frames} frames, {self.frameStats.summary()}")
+        super().closeEvent(event)
 
 def main():
+    # Show a recording instead of live data
+    replay = None
+    if "--replay" in sys.argv[1:-1]:
+        replay = sys.argv[sys.argv.index("--replay") + 1]
+    
     gc.enable()
     app = QApplication(sys.argv)
-    w = MonitorWindow(refresh_ms=1000)
+    w = MonitorWindow(replay=replay)
+    # Everything created so far lives for the life of the application, move it out
+    # of the way of the garbage collector.
+    gc.freeze()
     w.show()
     sys.exit(app.exec())
 
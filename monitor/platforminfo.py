@@ -0,0 +1,120 @@
+#!/usr/bin/python3
+#
+# Detect what we are running on, once.
+#
+from typing import NamedTuple
+import glob
+import os
+
+class PlatformInfo(NamedTuple):
+    '''
+    A description of the board we are running on.  None of this changes while the
+    system is up, so it is detected once by getPlatform() and shared by everything
+    that needs it.
+
+    Attributes:
+        boardModel - The board model string, e.g. "Raspberry Pi 5 Model B Rev 1.0"
+        model      - Raspberry PI generation, 5, 4 or 3, or 0 if not a Raspberry PI.
+                     Compute Modules are treated the same as standard model B's.
+        soc        - The SoC, e.g. "bcm2712", or "" if unknown
+        cores      - Number of CPU cores
+        fanInput   - Path of the CPU fan tachometer input, or None if there is no fan
+        hwmon      - Tuple of (name, path) for every hardware monitor in /sys/class/hwmon
+    '''
+    boardModel : str
+    model      : int
+    soc        : str
+    cores      : int
+    fanInput   : str
+    hwmon      : tuple
+
+def _readDeviceTree( name : str ) -> list[str]:
+    '''
+    Read a device-tree property, which is a list of NUL terminated strings.
+    '''
+    try:
+        with open( f"/proc/device-tree/{name}", "rb" ) as f:
+            return [ p.decode( "utf8", "replace" ) for p in f.read().split( b"\0" ) if p ]
+    except OSError:
+        return []
+
+def _boardModel() -> str:
+    '''
+    Obtain the board model, from the device tree, or from /proc/cpuinfo on kernels
+    without a device tree.
+    '''
+    model = _readDeviceTree( "model" )
+    if model:
+        return model[0]
+    try:
+        with open( "/proc/cpuinfo", "r", encoding="utf8" ) as f:
+            for line in f:
+                if line.startswith( "Model" ):
+                    return line.split( ":", 1 )[1].strip()
+    except OSError:
+        pass
+    return ""
+
+def _modelNumber( boardModel : str ) -> int:
+    '''
+    Check for the board model.  See if the model string matches something we are
+    looking for.
+    '''
+    if "Compute Module 5" in boardModel:
+        return 5
+    elif "Raspberry Pi 5" in boardModel:
+        return 5
+    elif "Raspberry Pi 4" in boardModel:
+        return 4
+    elif "Compute Module 4" in boardModel:
+        return 4
+    elif "Raspberry Pi 3" in boardModel:
+        return 3
+    else:
+        return 0
+
+def _soc() -> str:
+    '''
+    The SoC is the last entry of the root compatible property, e.g. "brcm,bcm2712".
+    '''
+    compatible = _readDeviceTree( "compatible" )
+    if compatible:
+        return compatible[-1].split( "," )[-1]
+    return ""
+
+def _hwmon() -> tuple:
+    result = []
+    try:
+        for entry in sorted( os.scandir( "/sys/class/hwmon" ), key=lambda e: e.name ):
+            try:
+                with open( os.path.join( entry.path, "name" ), "r", encoding="utf8" ) as f:
+                    result.append( (f.read().strip(), entry.path) )
+            except OSError:
+                pass
+    except OSError:
+        pass
+    return tuple( result )
+
+_platform : PlatformInfo = None
+
+def getPlatform() -> PlatformInfo:
+    '''
+    Obtain the PlatformInfo for this system.  It is detected on the first call, and
+    the same object is returned after that.
+    '''
+    global _platform
+    if _platform is None:
+        boardModel = _boardModel()
+        fanInputs  = glob.glob( "/sys/devices/platform/cooling_fan/hwmon/*/fan1_input" )
+        _platform  = PlatformInfo( boardModel = boardModel,
+                                   model      = _modelNumber( boardModel ),
+                                   soc        = _soc(),
+                                   cores      = os.cpu_count() or 1,
+                                   fanInput   = fanInputs[0] if fanInputs else None,
+                                   hwmon      = _hwmon() )
+    return _platform
+
+if __name__ == "__main__":
+
+    for name, value in getPlatform()._asdict().items():
+        print( f"{name:<10} = {value}" )
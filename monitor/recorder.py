@@ -0,0 +1,280 @@
+#!/usr/bin/python3
+#
+# Record the monitor's samples to disk, and read them back.
+#
+# A recording is one file per day (or per set of series, if drives or interfaces
+# come and go), all little endian:
+#
+#   header   HEADER, then the series names as UTF-8 separated by line feeds,
+#            padded with NULs to headerSize bytes
+#   records  one per sample: the wall clock time, then one double per series,
+#            NaN where a value is missing
+#
+# Every record is the same size, so the file can be memory mapped and any sample,
+# or any column, found by arithmetic.
+#
+from array import array
+import bisect
+import datetime
+import math
+import mmap
+import os
+import struct
+import time
+
+from collector import MonitorSample
+from samplebus import flatten, unflatten
+
+MAGIC   = b"OUMR"
+VERSION = 1
+
+# magic, version, series count, header size, sample interval
+HEADER = struct.Struct( "<4sIIId" )
+
+def _midnightAfter( wallTime : float ) -> float:
+    '''
+    The wall clock time of the next local midnight.
+    '''
+    day = datetime.date.fromtimestamp( wallTime ) + datetime.timedelta( days=1 )
+    return time.mktime( day.timetuple() )
+
+class SampleRecorder:
+    '''
+    Append samples to a recording.
+
+    Records are collected in memory and written out, and fsync'd, at most every
+    flushInterval seconds, so recording does not add a stream of small writes to
+    the drives being measured.  A new file is started at local midnight, and
+    whenever the set of series changes.  A recording left by an earlier run on the
+    same day, with the same series, is appended to.
+
+    Parameters:
+        directory     - Where the recordings are kept
+        interval      - Seconds between samples, recorded in the header
+        flushInterval - Most seconds between writes to disk
+        prefix        - Start of the file names, which are <prefix>-YYYY-MM-DD[.N].rec
+    '''
+    def __init__( self, directory : str, interval : float = 1.0, flushInterval : float = 5.0, prefix : str = "oneupmon" ):
+        self.directory     = directory
+        self.interval      = interval
+        self.flushInterval = flushInterval
+        self.prefix        = prefix
+        self.path          : str = None
+        self._fd           : int = None
+        self._names        : list[str] = []
+        self._keys         : set[str] = set()
+        self._record       : array = array( 'd' )
+        self._pending      = bytearray()
+        self._nextFlush    = 0.0
+        self._nextDay      = 0.0
+        os.makedirs( directory, exist_ok=True )
+
+    @staticmethod
+    def _header( names : list[str], interval : float ) -> bytes:
+        encoded = "\n".join( names ).encode( "utf8" )
+        size = -(-(HEADER.size + len( encoded )) // 64) * 64
+        header = HEADER.pack( MAGIC, VERSION, len( names ), size, interval ) + encoded
+        return header + bytes( size - len( header ))
+
+    def _open( self, wallTime : float, names : list[str] ) -> None:
+        '''
+        Open the file for this day and these series, creating it if needed.
+        '''
+        self._close()
+        header = self._header( names, self.interval )
+        recordSize = 8 * (len( names ) + 1)
+        day = datetime.date.fromtimestamp( wallTime ).isoformat()
+        number = 0
+        while True:
+            suffix = "" if number == 0 else f".{number}"
+            path = os.path.join( self.directory, f"{self.prefix}-{day}{suffix}.rec" )
+            fd = os.open( path, os.O_RDWR | os.O_CREAT | os.O_CLOEXEC, 0o644 )
+            size = os.fstat( fd ).st_size
+            if size == 0:
+                os.write( fd, header )
+                break
+            if size >= len( header ) and os.pread( fd, len( header ), 0 ) == header:
+                # Same series, carry on from the last whole record
+                end = len( header ) + (size - len( header )) // recordSize * recordSize
+                if end != size:
+                    os.ftruncate( fd, end )
+                os.lseek( fd, end, os.SEEK_SET )
+                break
+            os.close( fd )
+            number += 1
+        self._fd      = fd
+        self.path     = path
+        self._names   = names
+        self._keys    = set( names )
+        self._record  = array( 'd', [math.nan] ) * (len( names ) + 1)
+        self._nextDay = _midnightAfter( wallTime )
+
+    def write( self, sample : MonitorSample ) -> None:
+        '''
+        Add one sample to the recording.  It reaches the disk within flushInterval
+        seconds.
+        '''
+        flat = flatten( sample )
+        if self._fd is None or sample.wallTime >= self._nextDay or len( flat ) != len( self._names ) or flat.keys() != self._keys:
+            self.flush()
+            self._open( sample.wallTime, list( flat ))
+        record = self._record
+        record[0] = sample.wallTime
+        for index, name in enumerate( self._names, 1 ):
+            value = flat[name]
+            record[index] = math.nan if value is None else value
+        self._pending += record.tobytes()
+        now = time.monotonic()
+        if now >= self._nextFlush:
+            self.flush()
+            self._nextFlush = now + self.flushInterval
+
+    def flush( self ) -> None:
+        '''
+        Write out, and fsync, everything recorded so far.
+        '''
+        if self._fd is None or not self._pending:
+            return
+        try:
+            os.write( self._fd, self._pending )
+            os.fsync( self._fd )
+        except OSError as error:
+            print( f"Could not write to {self.path}, error {error}" )
+        self._pending.clear()
+
+    def _close( self ) -> None:
+        if self._fd is not None:
+            os.close( self._fd )
+            self._fd = None
+
+    def close( self ) -> None:
+        '''
+        Write out what is left, and close the recording.
+        '''
+        self.flush()
+        self._close()
+
+class SampleRecording:
+    '''
+    A recording, memory mapped read-only.  The file may still be growing; refresh()
+    picks up the records added since it was opened.
+
+    Parameters:
+        path - The recording to read
+
+    Raises:
+        OSError if the file can not be read, ValueError if it is not a recording
+    '''
+    def __init__( self, path : str ):
+        self.path = path
+        with open( path, "rb" ) as f:
+            header = f.read( HEADER.size )
+            if len( header ) < HEADER.size:
+                raise ValueError( f"{path} is not a recording" )
+            magic, version, count, headerSize, interval = HEADER.unpack( header )
+            if magic != MAGIC or version != VERSION:
+                raise ValueError( f"{path} is not a version {VERSION} recording" )
+            names = f.read( headerSize - HEADER.size ).rstrip( b"\0" )
+        self.names      = names.decode( "utf8" ).split( "\n" ) if names else []
+        self.interval   = interval
+        self.headerSize = headerSize
+        self.width      = count + 1
+        self._index     = { name : column for column, name in enumerate( self.names, 1 ) }
+        self._map       = None
+        self._values    : memoryview = None
+        self.refresh()
+        self._next      = len( self )
+
+    def refresh( self ) -> None:
+        '''
+        Map the file again, to see records written since the last time.
+        '''
+        self.close()
+        with open( self.path, "rb" ) as f:
+            size = os.fstat( f.fileno() ).st_size
+            count = (size - self.headerSize) // (8 * self.width)
+            if count <= 0:
+                self._values = memoryview( array( 'd' ))
+                return
+            self._map = mmap.mmap( f.fileno(), 0, access=mmap.ACCESS_READ )
+        self._values = memoryview( self._map )[self.headerSize:self.headerSize + count * 8 * self.width].cast( 'd' )
+
+    def __len__( self ) -> int:
+        return len( self._values ) // self.width
+
+    def column( self, name : str ) -> memoryview:
+        '''
+        Every value of one series, straight out of the mapped file.
+
+        Parameters:
+            name - The series, e.g. "temperatures/CPU" or "disks/sda/read"
+        '''
+        return self._values[self._index[name]::self.width]
+
+    @property
+    def times( self ) -> memoryview:
+        '''
+        The wall clock time of every sample.
+        '''
+        return self._values[0::self.width]
+
+    def find( self, wallTime : float ) -> int:
+        '''
+        The index of the first sample taken at or after a wall clock time.
+        '''
+        return bisect.bisect_left( self.times, wallTime )
+
+    def sample( self, index : int ) -> MonitorSample:
+        '''
+        Rebuild one recorded sample.
+        '''
+        start = index * self.width
+        wallTime = self._values[start]
+        return unflatten( self.names, self._values[start + 1:start + self.width], 0, wallTime )
+
+    def latest( self ) -> MonitorSample:
+        '''
+        The last sample recorded, or None if the recording is empty.
+        '''
+        if len( self ) == 0:
+            return None
+        return self.sample( len( self ) - 1 )
+
+    def samples( self ) -> list[MonitorSample]:
+        '''
+        The samples recorded since the recording was opened, or since the last call,
+        so a recording that is still being written can be followed.
+        '''
+        self.refresh()
+        result = [ self.sample( index ) for index in range( self._next, len( self )) ]
+        self._next = len( self )
+        return result
+
+    @property
+    def replaced( self ) -> bool:
+        return False
+
+    def close( self ) -> None:
+        if self._values is not None:
+            self._values.release()
+            self._values = None
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # A column is still in use, the mapping goes when that does
+                pass
+            self._map = None
+
+if __name__ == "__main__":
+    import sys
+
+    recording = SampleRecording( sys.argv[1] )
+    print( f"{len(recording)} samples of {len(recording.names)} series, every {recording.interval} s" )
+    if len( recording ):
+        times = recording.times
+        print( f"from {time.ctime( times[0] )} to {time.ctime( times[-1] )}" )
+        for name in recording.names:
+            values = [ v for v in recording.column( name ) if v == v ]
+            if values:
+                print( f"    {name:<40} min {min(values):12.2f}  max {max(values):12.2f}" )
@@ -0,0 +1,533 @@
+#!/usr/bin/python3
+#
+# A shared memory sample bus.  One collector process publishes every sample into a
+# memory mapped ring in /dev/shm, and any number of viewers map it read-only, so
+# adding a viewer costs nothing on the hardware side.
+#
+# Layout of the file, all little endian:
+#
+#   header   HEADER, at offset 0
+#   names    NAMES_SIZE bytes: u64 sequence, u32 length, then the series names
+#            as UTF-8, separated by line feeds
+#   slots    slotCount slots of SLOT followed by maxSeries doubles
+#
+# Each slot, and the names block, is guarded by a sequence counter used as a
+# seqlock: the writer makes it odd, writes, then makes it even again.  A reader
+# copies what it needs, and keeps it only if the counter was even and unchanged
+# over the copy.
+#
+import fcntl
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+
+from collector import Collector, MonitorSample
+from configfile import ConfigClass
+from deviceregistry import DeviceEvent, NO_EVENTS
+
+MAGIC        = b"OUMB"
+VERSION      = 1
+DEFAULT_PATH = "/dev/shm/oneupmon.bus"
+
+# magic, version, slot count, max series, names size, samples written, interval
+HEADER = struct.Struct( "<4sIIIIQd" )
+# sequence, layout generation, timestamp (monotonic ns), wall time
+SLOT   = struct.Struct( "<QQqd" )
+NAMES  = struct.Struct( "<QI" )
+
+HEADER_SIZE = 64
+NAMES_SIZE  = 65536
+WRITTEN_OFFSET = struct.calcsize( "<4sIIII" )
+
+# MonitorSample attributes that are dictionaries of name -> value, and those that
+# are dictionaries of name -> (read, write)
+VALUES = ( "cpu", "cpuStates", "temperatures", "fans", "pwm", "sensors", "battery" )
+PAIRS  = ( "disks", "networks" )
+
+def _align( value : int, alignment : int = 64 ) -> int:
+    return -(-value // alignment) * alignment
+
+def flatten( sample : MonitorSample ) -> dict[str,float]:
+    '''
+    Turn a MonitorSample into series name -> value.  Series are named
+    "<attribute>/<key>", and read/write pairs "<attribute>/<key>/read" and
+    "<attribute>/<key>/write".
+    '''
+    result = {}
+    for attribute in VALUES:
+        for key, value in getattr( sample, attribute ).items():
+            result[f"{attribute}/{key}"] = value
+    for attribute in PAIRS:
+        for key, (read, write) in getattr( sample, attribute ).items():
+            result[f"{attribute}/{key}/read"]  = read
+            result[f"{attribute}/{key}/write"] = write
+    return result
+
+def unflatten( names : list[str], values, timestamp : int, wallTime : float ) -> MonitorSample:
+    '''
+    Build a MonitorSample from series names and values, the reverse of flatten.  NaN
+    values become None.
+    '''
+    sample = MonitorSample()
+    sample.timestamp = timestamp
+    sample.wallTime  = wallTime
+    for name, value in zip( names, values ):
+        attribute, key = name.split( "/", 1 )
+        if value != value:
+            value = None
+        if attribute in PAIRS:
+            key, direction = key.rsplit( "/", 1 )
+            pairs = getattr( sample, attribute )
+            pair = pairs.get( key, (None, None) )
+            pairs[key] = (value, pair[1]) if direction == "read" else (pair[0], value)
+        else:
+            getattr( sample, attribute )[key] = value
+    return sample
+
+class SampleBusWriter:
+    '''
+    Publish samples into the shared memory ring.
+
+    The file is built under a temporary name and renamed into place, so a reader
+    never sees a half written header.  It is locked while the writer is alive; a
+    second writer refuses to start.  The set of series can change as devices come
+    and go: each slot records the generation of the names it was written with.
+
+    Parameters:
+        path      - Where to create the bus
+        slots     - Number of samples kept in the ring
+        maxSeries - The most values a sample can hold, extra series are dropped
+        interval  - Seconds between samples, recorded for the readers
+    '''
+    def __init__( self, path : str = DEFAULT_PATH, slots : int = 64, maxSeries : int = 1024, interval : float = 1.0 ):
+        self.path       = path
+        self.slotCount  = slots
+        self.maxSeries  = maxSeries
+        self.slotSize   = _align( SLOT.size + 8 * maxSeries )
+        self.slotOffset = HEADER_SIZE + NAMES_SIZE
+        self._names     : list[str] = []
+        self._index     : dict[str,int] = {}
+        self._layout    : list[str] = []
+        self._layoutKeys : set[str] = set()
+        self._generation = 0
+        self._written    = 0
+        self._warned     = False
+
+        try:
+            existing = os.open( path, os.O_RDONLY | os.O_CLOEXEC )
+        except OSError:
+            existing = None
+        if existing is not None:
+            try:
+                fcntl.flock( existing, fcntl.LOCK_EX | fcntl.LOCK_NB )
+            except OSError:
+                raise RuntimeError( f"another collector is already publishing to {path}" )
+            finally:
+                os.close( existing )
+
+        temp = f"{path}.{os.getpid()}"
+        self._fd = os.open( temp, os.O_RDWR | os.O_CREAT | os.O_TRUNC | os.O_CLOEXEC, 0o644 )
+        fcntl.flock( self._fd, fcntl.LOCK_EX )
+        os.ftruncate( self._fd, self.slotOffset + self.slotCount * self.slotSize )
+        self._map = mmap.mmap( self._fd, 0 )
+        HEADER.pack_into( self._map, 0, MAGIC, VERSION, slots, maxSeries, NAMES_SIZE, 0, interval )
+        self._values = [ math.nan ] * maxSeries
+        self._setNames( [] )
+        os.rename( temp, path )
+
+    def _setNames( self, names : list[str] ) -> None:
+        '''
+        Publish a new list of series names, under the names seqlock.
+        '''
+        if len( names ) > self.maxSeries:
+            if not self._warned:
+                print( f"sample bus: {len(names)} series, only the first {self.maxSeries} are published" )
+                self._warned = True
+            names = names[:self.maxSeries]
+        encoded = "\n".join( names ).encode( "utf8" )[:NAMES_SIZE - NAMES.size]
+        sequence = 2 * self._generation + 1
+        struct.pack_into( "<Q", self._map, HEADER_SIZE, sequence )
+        struct.pack_into( "<I", self._map, HEADER_SIZE + 8, len( encoded ))
+        self._map[HEADER_SIZE + NAMES.size:HEADER_SIZE + NAMES.size + len( encoded )] = encoded
+        self._generation += 1
+        struct.pack_into( "<Q", self._map, HEADER_SIZE, 2 * self._generation )
+        self._names = names
+        self._index = { name : index for index, name in enumerate( names ) }
+
+    def write( self, sample : MonitorSample ) -> None:
+        '''
+        Publish one sample into the next slot of the ring.
+        '''
+        flat = flatten( sample )
+        if len( flat ) != len( self._layout ) or flat.keys() != self._layoutKeys:
+            self._layout = list( flat )
+            self._layoutKeys = set( flat )
+            self._setNames( self._layout )
+        values = self._values
+        index  = self._index
+        for name, value in flat.items():
+            position = index.get( name )
+            if position is not None:
+                values[position] = math.nan if value is None else value
+
+        offset   = self.slotOffset + (self._written % self.slotCount) * self.slotSize
+        sequence = struct.unpack_from( "<Q", self._map, offset )[0]
+        struct.pack_into( "<Q", self._map, offset, sequence + 1 )
+        SLOT.pack_into( self._map, offset, sequence + 1, self._generation, sample.timestamp, sample.wallTime )
+        struct.pack_into( f"<{len(self._names)}d", self._map, offset + SLOT.size, *values[:len(self._names)] )
+        struct.pack_into( "<Q", self._map, offset, sequence + 2 )
+        self._written += 1
+        struct.pack_into( "<Q", self._map, WRITTEN_OFFSET, self._written )
+
+    def close( self ) -> None:
+        '''
+        Stop publishing, and remove the bus.
+        '''
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+            try:
+                os.unlink( self.path )
+            except OSError:
+                pass
+            os.close( self._fd )
+
+class SampleBusReader:
+    '''
+    Read samples from the shared memory ring, through a read-only mapping.  Values
+    are read straight out of the shared pages with struct.unpack_from; nothing is
+    read from the hardware.
+
+    Parameters:
+        path - The bus to read
+
+    Raises:
+        OSError if the bus does not exist, ValueError if it is not a sample bus
+    '''
+    def __init__( self, path : str = DEFAULT_PATH ):
+        self.path = path
+        fd = os.open( path, os.O_RDONLY | os.O_CLOEXEC )
+        try:
+            self._inode = os.fstat( fd ).st_ino
+            self._map   = mmap.mmap( fd, 0, access=mmap.ACCESS_READ )
+        finally:
+            os.close( fd )
+        magic, version, slots, maxSeries, namesSize, _, interval = HEADER.unpack_from( self._map, 0 )
+        if magic != MAGIC or version != VERSION:
+            self._map.close()
+            raise ValueError( f"{path} is not a version {VERSION} sample bus" )
+        self.slotCount  = slots
+        self.maxSeries  = maxSeries
+        self.interval   = interval
+        self.slotSize   = _align( SLOT.size + 8 * maxSeries )
+        self.slotOffset = HEADER_SIZE + namesSize
+        self._names      : list[str] = []
+        self._generation = -1
+        self._next       = max( 0, self.written - 1 )
+
+    @property
+    def written( self ) -> int:
+        '''
+        The number of samples published so far.
+        '''
+        return struct.unpack_from( "<Q", self._map, WRITTEN_OFFSET )[0]
+
+    @property
+    def replaced( self ) -> bool:
+        '''
+        True if the bus was removed or created again by a new writer, in which case
+        a new reader is needed.
+        '''
+        try:
+            return os.stat( self.path ).st_ino != self._inode
+        except OSError:
+            return True
+
+    def alive( self, timeout : float = None ) -> bool:
+        '''
+        Check that a writer is still publishing.
+
+        Parameters:
+            timeout - Seconds without a sample before the writer is considered gone,
+                      the default is five sample intervals
+        '''
+        written = self.written
+        if written == 0:
+            return False
+        offset = self.slotOffset + ((written - 1) % self.slotCount) * self.slotSize
+        timestamp = SLOT.unpack_from( self._map, offset )[2]
+        if timeout is None:
+            timeout = max( 5.0, 5 * self.interval )
+        return (time.monotonic_ns() - timestamp) / 1e9 < timeout
+
+    def _readNames( self, generation : int ) -> bool:
+        '''
+        Read the series names, if they are the generation wanted.
+        '''
+        for _ in range( 100 ):
+            sequence = struct.unpack_from( "<Q", self._map, HEADER_SIZE )[0]
+            if sequence & 1:
+                continue
+            length = struct.unpack_from( "<I", self._map, HEADER_SIZE + 8 )[0]
+            data = self._map[HEADER_SIZE + NAMES.size:HEADER_SIZE + NAMES.size + length]
+            if struct.unpack_from( "<Q", self._map, HEADER_SIZE )[0] != sequence:
+                continue
+            if sequence // 2 != generation:
+                return False
+            self._names = data.decode( "utf8" ).split( "\n" ) if data else []
+            self._generation = generation
+            return True
+        return False
+
+    def read( self, number : int ) -> MonitorSample:
+        '''
+        Read one sample.
+
+        Parameters:
+            number - Which sample, counting from 0 for the first one published
+
+        Returns:
+            The MonitorSample, or None if it has been overwritten, or was being
+            written to and could not be read consistently
+        '''
+        offset = self.slotOffset + (number % self.slotCount) * self.slotSize
+        for _ in range( 100 ):
+            sequence, generation, timestamp, wallTime = SLOT.unpack_from( self._map, offset )
+            if sequence & 1:
+                continue
+            if generation != self._generation and not self._readNames( generation ):
+                return None
+            values = struct.unpack_from( f"<{len(self._names)}d", self._map, offset + SLOT.size )
+            if struct.unpack_from( "<Q", self._map, offset )[0] != sequence:
+                continue
+            # Each write adds two to the slot's sequence, so it tells which lap of the
+            # ring this is
+            if sequence // 2 != number // self.slotCount + 1:
+                return None
+            return unflatten( self._names, values, timestamp, wallTime )
+        return None
+
+    def latest( self ) -> MonitorSample:
+        '''
+        The most recent sample, or None if nothing has been published.
+        '''
+        written = self.written
+        if written == 0:
+            return None
+        return self.read( written - 1 )
+
+    def samples( self ) -> list[MonitorSample]:
+        '''
+        Every sample published since the last call, oldest first.  If the reader
+        fell more than a ring behind, the samples that were overwritten are skipped.
+        '''
+        result = []
+        written = self.written
+        self._next = max( self._next, written - self.slotCount + 1 )
+        while self._next < written:
+            sample = self.read( self._next )
+            self._next += 1
+            if sample is not None:
+                result.append( sample )
+        return result
+
+    def close( self ) -> None:
+        self._map.close()
+
+class BusCollector:
+    '''
+    A stand in for Collector that takes its samples from a sample bus instead of
+    the hardware, so a front end can use either.  Drives and interfaces that come
+    and go are turned into DeviceEvents, just as the Collector would report them.
+    A SampleRecording can be used in place of the reader, to show or follow a
+    recording.
+
+    Parameters:
+        config - ConfigClass with the monitor settings, for the drive filters
+        reader - The SampleBusReader (or SampleRecording) to take samples from
+    '''
+    def __init__( self, config : ConfigClass, reader : SampleBusReader ):
+        self.config = config
+        self.reader = reader
+        self.interval = reader.interval
+        self.driveTempFilter = self.config.getValueAsList( 'drive', 'temp_ignore' )
+        self.drivePerfFilter = self.config.getValueAsList( 'drive', 'perf_ignore' )
+        self.caseFan = None
+
+        sample = reader.latest() or MonitorSample()
+        self._latest     = sample
+        self._cpuNames   = list( sample.cpu )
+        self._fanNames   = list( sample.fans )
+        self._tempDrives = [ name for name in sample.temperatures if name != "CPU" ]
+        self._perfDrives = list( sample.disks )
+        self._networks   = list( sample.networks )
+        self._drives     = set( sample.disks ) | set( self._tempDrives )
+
+        self._ring      : list[MonitorSample] = []
+        self._lock      = threading.Lock()
+        self._listeners = []
+        self._stop      = threading.Event()
+        self._thread    = None
+
+    @property
+    def cpuNames( self ) -> list[str]:
+        return self._cpuNames
+
+    @property
+    def fanNames( self ) -> list[str]:
+        return self._fanNames
+
+    @property
+    def networkNames( self ) -> list[str]:
+        return self._networks
+
+    @property
+    def tempDrives( self ) -> list[str]:
+        return self._tempDrives
+
+    @property
+    def perfDrives( self ) -> list[str]:
+        return self._perfDrives
+
+    @property
+    def hasFan( self ) -> bool:
+        return len( self._fanNames ) > 0
+
+    @property
+    def latest( self ) -> MonitorSample:
+        return self._latest
+
+    @property
+    def alive( self ) -> bool:
+        '''
+        True while the publisher is still writing samples, see SampleBusReader.alive.
+        '''
+        return self.reader.alive()
+
+    def addListener( self, callback ) -> None:
+        '''
+        Register a function to be called, with no arguments, when new samples have
+        arrived.  It is called on the reader thread.
+        '''
+        self._listeners.append( callback )
+
+    def _events( self, sample : MonitorSample ) -> tuple[DeviceEvent,...]:
+        '''
+        Compare the drives and interfaces in a sample with the ones seen before.
+        '''
+        drives = set( sample.disks ) | set( name for name in sample.temperatures if name != "CPU" )
+        networks = set( sample.networks )
+        if drives == self._drives and networks == set( self._networks ):
+            return NO_EVENTS
+        events = []
+        for subsystem, old, new in (("block", self._drives, drives), ("net", set( self._networks ), networks)):
+            events.extend( DeviceEvent( "remove", subsystem, name, None ) for name in sorted( old - new ))
+            events.extend( DeviceEvent( "add", subsystem, name, None ) for name in sorted( new - old ))
+        self._drives   = drives
+        self._networks = [ n for n in self._networks if n in networks ] + sorted( networks - set( self._networks ))
+        return tuple( events )
+
+    def _run( self ) -> None:
+        '''
+        Reader loop, wake up twice per sample interval and pick up what was published.
+        '''
+        idle = 0
+        while not self._stop.wait( self.interval / 2 ):
+            samples = self.reader.samples()
+            if not samples:
+                # If the publisher was restarted the bus is a new file, follow it
+                idle += 1
+                if idle >= 10 and self.reader.replaced:
+                    reader = openBus( self.reader.path )
+                    if reader is not None:
+                        self.reader.close()
+                        self.reader = reader
+                    idle = 0
+                continue
+            idle = 0
+            for sample in samples:
+                sample.events = self._events( sample )
+            self._latest = samples[-1]
+            with self._lock:
+                self._ring.extend( samples )
+                del self._ring[:-64]
+            for callback in self._listeners:
+                try:
+                    callback()
+                except Exception as e:
+                    print( f"error in sample bus listener: {e}" )
+
+    def start( self ) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread( target=self._run, name="samplebus", daemon=True )
+            self._thread.start()
+
+    def stop( self ) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.reader.close()
+
+    def pop( self ) -> MonitorSample:
+        '''
+        Remove and return the oldest sample not yet consumed, or None if there are none.
+        '''
+        with self._lock:
+            return self._ring.pop( 0 ) if self._ring else None
+
+    def samples( self ) -> list[MonitorSample]:
+        '''
+        Remove and return all of the samples received since the last call, oldest first.
+        '''
+        with self._lock:
+            result, self._ring = self._ring, []
+        return result
+
+def openBus( path : str = DEFAULT_PATH ) -> SampleBusReader:
+    '''
+    Open the sample bus if a collector is publishing to it.
+
+    Returns:
+        A SampleBusReader, or None if there is no bus or its writer has stopped
+    '''
+    try:
+        reader = SampleBusReader( path )
+    except (OSError, ValueError):
+        return None
+    if not reader.alive():
+        reader.close()
+        return None
+    return reader
+
+def main() -> None:
+    '''
+    Run a collector and publish its samples on the bus, until interrupted.
+    '''
+    config = ConfigClass( "/etc/sysmon.ini" )
+    refresh_ms = max( 50, int( config.getValue( 'monitor', 'refresh_ms', 1000 )))
+    path = config.getValue( 'bus', 'path', DEFAULT_PATH )
+    collector = Collector( config, refresh_ms / 1000 )
+    writer = SampleBusWriter( path, int( config.getValue( 'bus', 'slots', 64 )), interval=refresh_ms / 1000 )
+
+    def publish():
+        for sample in collector.samples():
+            writer.write( sample )
+
+    collector.addListener( publish )
+    collector.start()
+    print( f"Publishing samples on {path}" )
+    try:
+        while True:
+            time.sleep( 3600 )
+    except KeyboardInterrupt:
+        pass
+    finally:
+        collector.stop()
+        writer.close()
+
+if __name__ == "__main__":
+    main()
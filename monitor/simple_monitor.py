@@ -4,9 +4,12 @@
 """
 PyQt5 CPU/NVMe Monitor
 
-- getCPUTemp()  -> float (°C)
-- getDriveTemp() -> float (°C)
-- getIORate()   -> tuple[float, float] in MB/s as (read_mb_s, write_mb_s)
+- getCPUTemp(sample)   -> float (°C)
+- getDriveTemp(sample) -> float (°C)
+- getIORate(sample)    -> tuple[float, float] in MB/s as (read_mb_s, write_mb_s)
+
+sample is the latest sample from the bus, fetched once per refresh with
+_busSample(), or None to read the hardware directly.
 
 Replace the stub return values with your real implementations later.
 """
@@ -14,25 +17,59 @@ Replace the stub return values with your real implementations later.
 import sys
 from typing import Tuple
 from systemsupport import multiDriveStat, CPUInfo, CPULoad
-
-sysdata = multiDriveStat()
-cpuinfo = CPUInfo()
+from samplebus import openBus
+
+# Use the samples of a collector already publishing on the shared memory bus, if
+# there is one, rather than reading the hardware again.  If there is none, or it
+# stops publishing, the hardware is read directly.
+bus = openBus()
+sysdata = None
+cpuinfo = None
+
+def _busSample():
+    """Return the latest sample on the bus, or None if no collector is publishing."""
+    global bus
+    if bus is not None and (bus.replaced or not bus.alive()):
+        bus.close()
+        bus = None
+    if bus is None:
+        bus = openBus()
+        if bus is None:
+            return None
+    return bus.latest()
+
+def _direct():
+    """Return the readers used when there is no bus, creating them the first time."""
+    global sysdata, cpuinfo
+    if sysdata is None:
+        sysdata = multiDriveStat()
+        cpuinfo = CPUInfo()
+    return sysdata, cpuinfo
 
 # --------------------------
 # Metrics function stubs
 # --------------------------
-def getCPUTemp() -> float:
+def getCPUTemp(sample) -> float:
     """Return current CPU temperature in °C."""
-    return float( cpuinfo.temperature )
+    if sample is not None:
+        return float( sample.temperatures["CPU"] )
+    return float( _direct()[1].temperature )
 
-def getDriveTemp() -> float:
+def getDriveTemp(sample) -> float:
     """Return current NVMe drive temperature in °C."""
-    return sysdata.driveTemp( "nvme0n1" )
+    if sample is not None:
+        # None until the collector has read the drive for the first time
+        temp = sample.temperatures.get( "nvme0n1" )
+        return float( "nan" ) if temp is None else float( temp )
+    return _direct()[0].driveTemp( "nvme0n1" )
 
-def getIORate() -> Tuple[float, float]:
+def getIORate(sample) -> Tuple[float, float]:
     """Return current NVMe IO rates (read_MBps, write_MBps)."""
-    data = sysdata.readWriteBytes()
-    return data["nvme0n1"]
+    if sample is not None:
+        read, write = sample.disks["nvme0n1"]
+    else:
+        read, write = _direct()[0].readWriteRates()["nvme0n1"]
+    return (read / 1e6, write / 1e6)
 
 
 # --------------------------
@@ -125,18 +162,20 @@ class MonitorWindow(QMainWindow):
         self.refresh_metrics()
 
     def refresh_metrics(self):
+        sample = _busSample()
+
         try:
-            cpu_c = float(getCPUTemp())
+            cpu_c = float(getCPUTemp(sample))
         except Exception:
             cpu_c = float("nan")
 
         try:
-            nvme_c = float(getDriveTemp())
+            nvme_c = float(getDriveTemp(sample))
         except Exception:
             nvme_c = float("nan")
 
         try:
-            read_mb, write_mb = getIORate()
+            read_mb, write_mb = getIORate(sample)
             read_mb = float(read_mb)
             write_mb = float(write_mb)
         except Exception:
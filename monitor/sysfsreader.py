@@ -0,0 +1,118 @@
+#!/usr/bin/python3
+#
+# Persistent readers for sysfs and procfs files that are sampled over and over.
+#
+import os
+
+class SysfsFile:
+    '''
+    A sysfs (or procfs) file that is kept open and re-read in place.
+
+    Files under /sys and /proc regenerate their contents every time they are read
+    from offset 0, so there is no need to open and close them for every sample.
+    This class opens the file once, and every read is a single pread() into a
+    buffer that is allocated once and reused.  If the contents do not fit in the
+    buffer, the buffer is grown and the read is retried.
+
+    Parameters:
+        path - Full path to the file to read
+        size - Initial size of the read buffer, in bytes
+    '''
+    def __init__( self, path : str, size : int = 4096 ):
+        self._path   = path
+        self._buffer = bytearray( size )
+        self._view   = memoryview( self._buffer )
+        self._fd     = os.open( path, os.O_RDONLY | os.O_CLOEXEC )
+
+    def __del__( self ):
+        self.close()
+
+    def __enter__( self ):
+        return self
+
+    def __exit__( self, *args ):
+        self.close()
+
+    @property
+    def path( self ) -> str:
+        return self._path
+
+    def close( self ) -> None:
+        '''
+        Close the underlying file descriptor.  It is safe to call this more than once.
+        '''
+        fd = getattr( self, "_fd", -1 )
+        if fd >= 0:
+            self._fd = -1
+            os.close( fd )
+
+    def _pread( self ) -> int:
+        '''
+        Read the entire file into the buffer.
+
+        Returns:
+            The number of bytes read.
+
+        Raises:
+            OSError if the file can not be read, for instance when the device has gone.
+        '''
+        while True:
+            count = os.preadv( self._fd, [self._buffer], 0 )
+            if count < len( self._buffer ):
+                return count
+            # The file did not fit, grow the buffer and read it again
+            self._buffer = bytearray( 2 * len( self._buffer ))
+            self._view   = memoryview( self._buffer )
+
+    def read( self ) -> memoryview:
+        '''
+        Read the file.
+
+        Returns:
+            A view of the file contents.  The view is only valid until the next read.
+        '''
+        return self._view[:self._pread()]
+
+    def readInt( self ) -> int:
+        '''
+        Read a file that contains a single integer, such as rx_bytes or fan1_input.
+
+        Returns:
+            The value as an integer
+        '''
+        count = self._pread()
+        return int( self._buffer[:count] )
+
+    def readInts( self, out : list[int] ) -> list[int]:
+        '''
+        Read a file that contains one line of whitespace separated integers, such
+        as /sys/block/<dev>/stat.  The values are stored into the list passed in,
+        which is resized only if the number of values changed.
+
+        Parameters:
+            out - The list to fill in
+
+        Returns:
+            The list passed in
+        '''
+        count = self._pread()
+        index = 0
+        size  = len( out )
+        for field in self._buffer[:count].split():
+            if index < size:
+                out[index] = int( field )
+            else:
+                out.append( int( field ))
+            index += 1
+        if index < size:
+            del out[index:]
+        return out
+
+if __name__ == "__main__":
+
+    stat = SysfsFile( "/proc/stat" )
+    print( bytes( stat.read() ).decode( "utf8" ).split( "\n" )[0] )
+    values = []
+    for name in os.listdir( "/sys/block" ):
+        with SysfsFile( f"/sys/block/{name}/stat" ) as f:
+            print( f"{name}: {f.readInts( values )}" )
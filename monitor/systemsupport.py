@@ -5,9 +5,109 @@
 # will be new direction for all prior version the RPIi.)
 #
 from gpiozero import CPUTemperature
+from sysfsreader import SysfsFile
+from platforminfo import PlatformInfo, getPlatform
+from hwmon import HwmonSensor
+from deviceinventory import BlockDevice, NetDevice, KERNEL_SECTOR_SIZE, blockDevices, netDevices
+from concurrent.futures import ThreadPoolExecutor
+from array import array
+import threading
 import time
 import os
 
+class DriveSample:
+    '''
+    An immutable record of the change in a drive's statistics between two reads of
+    /sys/block/<dev>/stat.  There is one attribute per field of the kernel stat
+    layout, named after the field, plus the elapsed time between the two reads.
+    Fields that the running kernel does not report are zero.
+    
+    All of the fields are deltas, except inFlight which is the number of requests
+    in flight at the time of the latest read.
+    
+    See: https://www.kernel.org/doc/html/latest/block/stat.html
+    '''
+    __slots__ = ( 'readIos', 'readMerges', 'readSectors', 'readTicks',
+                  'writeIos', 'writeMerges', 'writeSectors', 'writeTicks',
+                  'inFlight', 'ioTicks', 'timeInQueue',
+                  'discardIos', 'discardMerges', 'discardSectors', 'discardTicks',
+                  'flushIos', 'flushTicks',
+                  'elapsed' )
+    
+    # The stat file counts 512 byte sectors, even on drives with 4K logical blocks
+    SECTOR_SIZE = KERNEL_SECTOR_SIZE
+    
+    def __init__( self, current : list[int], previous : list[int], elapsed : float ):
+        '''
+        Parameters:
+            current  - The latest stat values
+            previous - The stat values from the prior read, or an empty list
+            elapsed  - Seconds between the two reads
+        '''
+        for index, name in enumerate( DriveSample.__slots__[:-1] ):
+            value = current[index] if index < len(current) else 0
+            if index != DriveStats.IN_FLIGHT and index < len(previous):
+                value -= previous[index]
+            object.__setattr__( self, name, value )
+        object.__setattr__( self, 'elapsed', elapsed )
+        
+    def __setattr__( self, name, value ):
+        raise AttributeError( f"DriveSample is read only, can not set {name}" )
+    
+    def __repr__( self ) -> str:
+        fields = ", ".join( f"{name}={getattr(self,name)}" for name in DriveSample.__slots__ )
+        return f"DriveSample({fields})"
+    
+    def _perSecond( self, value : float ) -> float:
+        return value / self.elapsed if self.elapsed > 0 else 0.0
+    
+    @property
+    def readBytes( self ) -> int:
+        return self.readSectors * DriveSample.SECTOR_SIZE
+    
+    @property
+    def writeBytes( self ) -> int:
+        return self.writeSectors * DriveSample.SECTOR_SIZE
+    
+    @property
+    def readBytesPerSec( self ) -> float:
+        return self._perSecond( self.readBytes )
+    
+    @property
+    def writeBytesPerSec( self ) -> float:
+        return self._perSecond( self.writeBytes )
+    
+    @property
+    def readIops( self ) -> float:
+        return self._perSecond( self.readIos )
+    
+    @property
+    def writeIops( self ) -> float:
+        return self._perSecond( self.writeIos )
+    
+    @property
+    def readAwait( self ) -> float:
+        '''
+        Average time in milliseconds a read spent queued and being serviced.
+        '''
+        return self.readTicks / self.readIos if self.readIos else 0.0
+    
+    @property
+    def writeAwait( self ) -> float:
+        '''
+        Average time in milliseconds a write spent queued and being serviced.
+        '''
+        return self.writeTicks / self.writeIos if self.writeIos else 0.0
+    
+    @property
+    def utilization( self ) -> float:
+        '''
+        Percent of the elapsed time the device had I/O in flight, from IO_TICKS.
+        '''
+        if self.elapsed <= 0:
+            return 0.0
+        return min( 100.0, self.ioTicks / (self.elapsed * 10.0) )
+    
 class DriveStats:
     '''
     DriveStat class - 
@@ -45,6 +145,10 @@ class DriveStats:
         self._last : list[int]  = []
         self._device = device
         self._stats : list[int] = []
+        self._file  : SysfsFile = None
+        self._lastTime  : int = 0
+        self._statsTime : int = 0
+        self._failed    : bool = False
         self._readStats()
     
     def _readStats( self ):
@@ -53,20 +157,40 @@ class DriveStats:
         so that when the data is read, all of the stats correlate to the same time.  The data
         is from the time the device has come online.
         
-        last and set to the old version of the data, and the latest data is stored in stats
+        last and set to the old version of the data, and the latest data is stored in stats.
+        The two lists are swapped and refilled in place, and the stat file is kept open
+        between reads.
         
         '''
+        self._last, self._stats = self._stats, self._last
+        self._lastTime = self._statsTime
+        self._statsTime = time.monotonic_ns()
         try:
-            self._last = self._stats
-            with open( f"/sys/block/{self._device}/stat", "r", encoding="utf8") as f:
-                curStats = f.readline().strip().split(" ")
-                self._stats = [int(l) for l in curStats if l]
+            if self._file is None:
+                self._file = SysfsFile( f"/sys/block/{self._device}/stat" )
+            self._file.readInts( self._stats )
+            self._failed = False
         except Exception as e:
-            print( f"Failure reading disk statistics for {self._device} error {e}" )
+            self._stats[:] = self._last
+            # The drive has probably been unplugged.  Say so once, and open the
+            # file again next time in case it comes back.
+            if not self._failed:
+                print( f"Failure reading disk statistics for {self._device} error {e}" )
+                self._failed = True
+            self.close()
+        
+    def close( self ) -> None:
+        '''
+        Close the stat file.  It is opened again by the next read.
+        '''
+        if self._file is not None:
+            self._file.close()
+            self._file = None
         
     def _getStats( self ) -> list[int]:
         '''
-        Read the devices statistics from the device,and return it.
+        Read the devices statistics from the device,and return it.  Every call is a
+        new read, so use sample() when more than one value is needed.
         
         Returns:
             An array containing all of the data colleected about the device.
@@ -80,6 +204,19 @@ class DriveStats:
             curData = [ d-self._last[i] for i,d in enumerate( self._stats ) ]
         return curData
 
+    def sample( self ) -> DriveSample:
+        '''
+        Read the device statistics once, and return the change since the previous
+        read.  Unlike the properties below, every field comes from the same read, so
+        any number of values and rates can be taken from one sample.
+        
+        Returns:
+            A DriveSample
+        '''
+        self._readStats()
+        elapsed = (self._statsTime - self._lastTime) / 1e9 if self._last else 0.0
+        return DriveSample( self._stats, self._last, elapsed )
+    
     @property
     def name(self) -> str:
         return self._device
@@ -114,7 +251,7 @@ class DriveStats:
     @property
     def readWriteBytes( self ) -> tuple[int,int]:
         curData = self._getStats()
-        return (curData[DriveStats.READ_SECTORS]*512,curData[DriveStats.WRITE_SECTORS]*512)
+        return (curData[DriveStats.READ_SECTORS]*KERNEL_SECTOR_SIZE,curData[DriveStats.WRITE_SECTORS]*KERNEL_SECTOR_SIZE)
 
 class multiDriveStat():
     '''
@@ -134,15 +271,107 @@ class multiDriveStat():
         #
         # Get all drives
         #
-        self._drives = []
-        with os.popen( 'ls -1 /sys/block | grep -v -e loop -e ram') as command:
-            lsblk_raw = command.read()
-            for l in lsblk_raw.split('\n'):
-                if len(l) == 0:
-                    continue
-                if not l in driveIgnoreList:
-                    self._drives.append( l )
+        self._devices : dict[str,BlockDevice] = blockDevices( driveIgnoreList )
+        self._drives = list( self._devices )
         self._stats = [ DriveStats(_) for _ in self._drives ]
+        self._hwmonTemps = self._findHwmonTemps()
+        
+    def _findHwmonTemps( self ) -> dict[str,HwmonSensor]:
+        '''
+        Map each drive to the hardware monitor temperature input for that drive, if
+        the kernel provides one.  The nvme driver registers a hwmon device for every
+        controller, and the drivetemp module does the same for SATA drives.  In both
+        cases the hwmon device link points at the same device as /sys/block/<drive>/device.
+        
+        This is done once, so that reading a temperature is a single small file read.
+        
+        Returns:
+            A dictionary of drive name to temperature sensor.  Drives without a
+            hwmon sensor are not in the dictionary.
+        '''
+        result = {}
+        hwmons = self._hwmonDevices()
+        for drive in self._drives:
+            sensor = self._findHwmonTemp( drive, hwmons )
+            if sensor is not None:
+                result[drive] = sensor
+        return result
+    
+    @staticmethod
+    def _hwmonDevices() -> dict[str,str]:
+        '''
+        Map the device behind every hardware monitor to the hwmon directory.
+        '''
+        hwmons = {}
+        try:
+            for entry in os.scandir( "/sys/class/hwmon" ):
+                device = os.path.join( entry.path, "device" )
+                if os.path.exists( device ):
+                    hwmons[os.path.realpath( device )] = entry.path
+        except OSError:
+            pass
+        return hwmons
+    
+    @staticmethod
+    def _findHwmonTemp( drive : str, hwmons : dict[str,str] ) -> HwmonSensor:
+        '''
+        Find the hardware monitor temperature input of one drive.
+        
+        Returns:
+            The HwmonSensor, or None if the drive does not have one
+        '''
+        hwmon = hwmons.get( os.path.realpath( f"/sys/block/{drive}/device" ))
+        if hwmon is None:
+            return None
+        tempInput = os.path.join( hwmon, "temp1_input" )
+        try:
+            return HwmonSensor( os.path.basename( hwmon ), "temp", drive, tempInput )
+        except OSError:
+            return None
+    
+    def addDrive( self, device : BlockDevice ) -> None:
+        '''
+        Start monitoring a drive that was plugged in after this object was created.
+        
+        Parameters:
+            device - The BlockDevice describing the drive
+        '''
+        if device.name in self._devices:
+            return
+        self._devices[device.name] = device
+        self._drives = self._drives + [device.name]
+        self._stats  = self._stats + [DriveStats( device.name )]
+        sensor = self._findHwmonTemp( device.name, self._hwmonDevices() )
+        if sensor is not None:
+            self._hwmonTemps[device.name] = sensor
+    
+    def removeDrive( self, _drive : str ) -> None:
+        '''
+        Stop monitoring a drive, normally because it was unplugged.
+        
+        Parameters:
+            _drive - The drive to remove
+        '''
+        if self._devices.pop( _drive, None ) is None:
+            return
+        self._drives = [ d for d in self._drives if d != _drive ]
+        for stats in self._stats:
+            if stats.name == _drive:
+                stats.close()
+        self._stats = [ s for s in self._stats if s.name != _drive ]
+        sensor = self._hwmonTemps.pop( _drive, None )
+        if sensor is not None:
+            sensor.close()
+    
+    def hasHwmonTemp( self, _drive : str ) -> bool:
+        '''
+        Check if the temperature of a drive can be read directly from the kernel,
+        without running smartctl.
+        
+        Parameters:
+            _drive - the drive to check
+        '''
+        return _drive in self._hwmonTemps
             
     @property
     def drives(self) -> list[str]:
@@ -154,6 +383,17 @@ class multiDriveStat():
         '''
         return self._drives
     
+    @property
+    def devices(self) -> dict[str,BlockDevice]:
+        '''
+        The inventory of the drives being monitored: type, rotational flag, block
+        sizes and size.
+        
+        Returns:
+            A dictionary of drive name to BlockDevice
+        '''
+        return self._devices
+    
     def driveSize( self, _drive ) -> int:
         '''
         This function is called to obtain the size of the drive requested.
@@ -164,29 +404,35 @@ class multiDriveStat():
         Returns:
             The size in bytes, or 0 if the drive does not exist
         '''
-        try:
-            byteCount = 0
-            with os.popen(f'cat /sys/block/{_drive}/size') as command:
-                sectorCount = command.read().strip()
-                byteCount = int(sectorCount) * 512
-            return byteCount
-        except:
+        device = self._devices.get( _drive )
+        if device is None:
             return 0
+        return device.size
         
     def driveTemp(self,_drive:str, extracmd = None) -> float:
         '''
-        Get the drive temperature using smart data.  There are three basic temperature
-        settings we can read, smart ID 194, 190 and the Temperature: value.  These are
-        depenent on the drive, so look for all of them, and depending on the result, we
-        get the value.
+        Get the drive temperature.  If the kernel exposes a hwmon temperature sensor for
+        the drive (NVMe, or SATA with the drivetemp module), that is read directly.
+        
+        Otherwise, use smart data.  There are three basic temperature settings we can
+        read, smart ID 194, 190 and the Temperature: value.  These are depenent on the
+        drive, so look for all of them, and depending on the result, we get the value.
         
         Parameters:
             _drive   : The device we wish to scan
-            extraCmd : An optional additional command to send to the device.
+            extraCmd : An optional additional command to send to the device, only
+                       used when smartctl is needed.
             
         Returns:
             The temperature as a float, or zero if there is an error.
         '''
+        tempSensor = self._hwmonTemps.get( _drive )
+        if tempSensor is not None:
+            try:
+                return tempSensor.read()
+            except Exception as error:
+                print( f"Could not read {tempSensor.path} error is {error}" )
+        
         smartOutRaw = ""
         if extracmd is None:
             cmd = f'sudo smartctl -A /dev/{_drive}'
@@ -227,7 +473,8 @@ class multiDriveStat():
         '''
         curData = {}
         for _ in self._stats:
-            curData[_.name] = _.readWriteSectors
+            sample = _.sample()
+            curData[_.name] = (sample.readSectors, sample.writeSectors)
         return curData
     
     def readWriteBytes( self ) -> dict[str,tuple[int,int]]:
@@ -237,8 +484,169 @@ class multiDriveStat():
         '''
         curData = {}
         for _ in self._stats:
-            curData[_.name] = _.readWriteBytes
+            sample = _.sample()
+            curData[_.name] = (sample.readBytes, sample.writeBytes)
+        return curData
+    
+    def readWriteRates( self ) -> dict[str,tuple[float,float]]:
+        '''
+        Just like the readWriteBytes function, but the byte counts are divided by the
+        actual time elapsed since the previous read, giving bytes per second.
+        
+        '''
+        curData = {}
+        for _ in self._stats:
+            sample = _.sample()
+            curData[_.name] = (sample.readBytesPerSec, sample.writeBytesPerSec)
         return curData
+    
+    def samples( self ) -> dict[str,DriveSample]:
+        '''
+        Read the statistics of every drive once.
+        
+        Returns:
+            A dictionary of drive name to DriveSample
+        '''
+        return { _.name : _.sample() for _ in self._stats }
+   
+class DriveTempSampler:
+    '''
+    Sample drive temperatures in the background.  Reading a drive temperature
+    means running smartctl, which can take hundreds of milliseconds per drive, so
+    it must never be done on the thread that draws the charts.  This class runs
+    the reads on a small thread pool, each drive on its own cadence, and keeps
+    the most recent value along with the time it was taken.  Callers only ever
+    look at the cached value, so they never wait on smartctl.
+    
+    Parameters:
+        multiDrive - The multiDriveStat object used to read the temperatures
+        drives     - List of drives to sample
+        interval   - Default number of seconds between samples of a drive
+        intervals  - Optional dictionary of drive -> seconds, overriding interval
+        extraCmds  - Optional dictionary of drive -> extra smartctl command
+    '''
+    def __init__( self, multiDrive, drives : list[str], interval : float = 10.0,
+                  intervals : dict[str,float] = {}, extraCmds : dict[str,str] = {} ):
+        self._multiDrive = multiDrive
+        self._interval   = interval
+        self._drives     = list(drives)
+        self._intervals  = { d : float(intervals.get( d, interval )) for d in self._drives }
+        self._extraCmds  = dict(extraCmds)
+        self._latest     : dict[str,tuple[float,float]] = {}
+        self._nextDue    = { d : 0.0 for d in self._drives }
+        self._inFlight   : set[str] = set()
+        self._lock       = threading.Lock()
+        self._stop       = threading.Event()
+        self._wake       = threading.Event()
+        self._pool       = ThreadPoolExecutor( max_workers=max(1,min(4,len(self._drives))),
+                                               thread_name_prefix="drivetemp" )
+        self._thread     = threading.Thread( target=self._run, name="drivetemp-scheduler", daemon=True )
+        self._thread.start()
+        
+    def addDrive( self, drive : str, interval : float = None, extraCmd : str = None ) -> None:
+        '''
+        Start sampling another drive, from any thread.  It is read straight away.
+        
+        Parameters:
+            drive    - The drive to add
+            interval - Seconds between samples, the default interval if not given
+            extraCmd - Optional extra smartctl command for the drive
+        '''
+        with self._lock:
+            if drive in self._intervals:
+                return
+            self._intervals[drive] = float( interval if interval is not None else self._interval )
+            self._nextDue[drive]   = 0.0
+            if extraCmd is not None:
+                self._extraCmds[drive] = extraCmd
+            self._drives = self._drives + [drive]
+        self._wake.set()
+    
+    def removeDrive( self, drive : str ) -> None:
+        '''
+        Stop sampling a drive, from any thread.  Its last temperature is forgotten.
+        
+        Parameters:
+            drive - The drive to remove
+        '''
+        with self._lock:
+            self._drives = [ d for d in self._drives if d != drive ]
+            self._intervals.pop( drive, None )
+            self._nextDue.pop( drive, None )
+            self._extraCmds.pop( drive, None )
+        self._latest.pop( drive, None )
+    
+    def _sample( self, drive : str ) -> None:
+        '''
+        Read the temperature of a single drive, and publish the result.  This runs
+        on one of the pool threads.
+        
+        Parameters:
+            drive - The drive to read
+        '''
+        try:
+            temp = self._multiDrive.driveTemp( drive, self._extraCmds.get( drive, None ))
+            if drive in self._intervals:
+                self._latest[drive] = (temp, time.monotonic())
+        except Exception as error:
+            print( f"Could not read temperature of {drive}, error {error}" )
+        finally:
+            with self._lock:
+                self._inFlight.discard( drive )
+    
+    def _run( self ) -> None:
+        '''
+        Scheduler loop.  Submit every drive that is due to the pool, then sleep until
+        the next drive is due, or until we are told to stop.  A drive whose previous
+        read is still running is not submitted again.  Drives can be added and
+        removed while this runs, so everything is looked up under the lock.
+        '''
+        while not self._stop.is_set():
+            now = time.monotonic()
+            for drive in self._drives:
+                with self._lock:
+                    due = self._nextDue.get( drive )
+                    if due is None or due > now or drive in self._inFlight:
+                        continue
+                    self._inFlight.add( drive )
+                    self._nextDue[drive] = now + self._intervals[drive]
+                self._pool.submit( self._sample, drive )
+            with self._lock:
+                wait = min( self._nextDue.values(), default=now + 1.0 ) - time.monotonic()
+            self._wake.wait( max( 0.1, wait ))
+            self._wake.clear()
+    
+    def latest( self, drive : str ) -> tuple[float,float]:
+        '''
+        Obtain the most recent temperature of a drive.
+        
+        Parameters:
+            drive - The drive to look up
+            
+        Returns:
+            A tuple of (temperature, timestamp), where the timestamp is the value of
+            time.monotonic() when the reading was taken.  If the drive has not been
+            read yet, (None, 0.0) is returned.
+        '''
+        return self._latest.get( drive, (None, 0.0) )
+    
+    def temperature( self, drive : str ) -> float:
+        '''
+        Obtain the most recent temperature of a drive, without the timestamp.
+        
+        Returns:
+            The temperature as a float, or None if the drive has not been read yet.
+        '''
+        return self.latest( drive )[0]
+    
+    def stop( self ) -> None:
+        '''
+        Stop sampling.  Reads that are already running are allowed to finish.
+        '''
+        self._stop.set()
+        self._wake.set()
+        self._thread.join()
+        self._pool.shutdown( wait=False )
    
 class CPUInfo:
     '''
@@ -246,35 +654,33 @@ class CPUInfo:
     
     '''
     def __init__( self ):
-        self._cputemp = CPUTemperature()
+        self._cputemp  = CPUTemperature()
+        self._platform = getPlatform()
+        self._fanSpeed : HwmonSensor = None
+        self._fanPWM   : HwmonSensor = None
+        if self.model == 5 and self._platform.fanInput is not None:
+            fanDir = os.path.dirname( self._platform.fanInput )
+            try:
+                self._fanSpeed = HwmonSensor( "pwmfan", "fan", "fan1", self._platform.fanInput )
+                if os.path.exists( os.path.join( fanDir, "pwm1" )):
+                    self._fanPWM = HwmonSensor( "pwmfan", "pwm", "pwm1", os.path.join( fanDir, "pwm1" ))
+            except OSError as error:
+                print( f"Could not open the fan hardware monitor, error {error}" )
         
-    def _cpuModel( self ) -> int:
+    @property
+    def platform( self ) -> PlatformInfo:
         '''
-        Check for the cpu model.  Scan cpuinfo to see if we can locate a string that
-        matches something we are looking for.
-        
-        Return:
-            Model of the Raspberry PI.  This treats the Comput Modules the same as
-            standard model B's
-        '''
-        with os.popen( "grep Model /proc/cpuinfo" ) as command:
-            data = command.read()
-            if "Compute Module 5" in data:
-                return 5
-            elif "Raspberry Pi 5" in data:
-                return 5
-            elif "Raspberry Pi 4" in data:
-                return 4
-            elif "Compute Module 4" in data:
-                return 4
-            elif "Raspberry Pi 3" in data:
-                return 3
-            else:
-                return 0
-            
+        The shared description of the board, detected once at startup.
+        '''
+        return self._platform
+    
     @property
     def model( self ) -> int:
-        return self._cpuModel()
+        '''
+        Model of the Raspberry PI.  This treats the Comput Modules the same as
+        standard model B's
+        '''
+        return self._platform.model
     
     @property
     def temperature( self ) -> float:
@@ -291,23 +697,36 @@ class CPUInfo:
     def CPUFanSpeed( self ) -> float:
         '''
         Obtain the speed of the CPU fan.  This is based on monitoring the hardware
-        monitor, assuming that fan1_input is the fan connected to the CPU.
+        monitor, assuming that fan1_input is the fan connected to the CPU.  The path
+        is found once at startup, and the file is kept open.
         
         Return:
             The fanspeed as a floating point number
         '''
-        speed = 0
-        if self._cpuModel() == 5:
+        speed = 0.0
+        if self._fanSpeed is not None:
             try:
-                command = os.popen( 'cat /sys/devices/platform/cooling_fan/hwmon/*/fan1_input' )
-                speed = int( command.read().strip())
+                speed = self._fanSpeed.read()
             except Exception as error:
                 print( f"Could not determine fan speed, error {error}" )
-            finally:
-                command.close()
-        else:
-            speed = 0
         return float(speed)
+    
+    @property
+    def CPUFanPWM( self ) -> float:
+        '''
+        Obtain the duty cycle the CPU fan is being driven at, from pwm1 next to
+        fan1_input.
+        
+        Return:
+            The duty cycle in percent, or 0.0 if there is no fan
+        '''
+        duty = 0.0
+        if self._fanPWM is not None:
+            try:
+                duty = self._fanPWM.read()
+            except Exception as error:
+                print( f"Could not determine fan duty cycle, error {error}" )
+        return float(duty)
 
 class CPULoad:
     '''
@@ -326,46 +745,67 @@ class CPULoad:
        
        This is usually not an issue.
     '''
+    # The columns of a cpu line in /proc/stat, in order
+    STATES = ( "user", "nice", "system", "idle", "iowait", "irq", "softirq", "steal", "guest", "guest_nice" )
+    IDLE   = 3
+    IOWAIT = 4
+    
+    # Guest time is also counted in user and nice, so only the first eight columns
+    # make up the total
+    COUNTED = 8
+    
     def __init__( self ) -> None:
         #
         # Get the current data
         #
-        self._previousData : dict[str,tuple[int,int]] = self._getRawData()
-        self._names : list[str] = []
-        self._cputemp : float = CPUTemperature()
+        self._statFile : SysfsFile = SysfsFile( "/proc/stat", 16384 )
+        self._rows     : list[str] = []
+        self._width    : int = 0
+        self._names    : list[str] = []
+        current = self._readCounters()
         
         #
-        # For each CPU, reset the total and idle amount, and create the list
-        # of names
+        # Start from zero, so the first period covers the time since boot
         #
-        for _item in self._previousData:
-            self._previousData[_item] = (0,0)
-            self._names.append(_item)
+        self._previous     : array = array( 'q', bytes( 8 * len(current) ))
+        self._delta        : list[int] = [ 0 ] * len(current)
+        self._previousTime : int   = time.monotonic_ns()
+        self._elapsed      : float = 0.0
+        self._breakdown : dict[str,float] = {}
+        self._cputemp : float = CPUTemperature()
         
-    def _getRawData( self ) -> dict[str,tuple[int,int]]:
+    def _readCounters( self ) -> array:
         '''
-        Obtain the raw CPU data from the system (located in /prop/stat), and
-        return just the cpu0 -> cpux values.  No assumption is made on the number of
-        cpus.
+        Obtain the raw CPU counters from the system (located in /proc/stat).  The
+        cpu lines are always first, the total followed by cpu0 -> cpux.  No
+        assumption is made on the number of cpus.
+        
+        The whole block of cpu lines is split and converted in one pass, so the cost
+        is the same few calls whether there are 4 or 256 CPUs.
         
         Returns:
-            A dictionary is returned, the format is name = (total, idle).  The total
-            time and idle time are use to determine the percent utilization of the system.
+            A flat array of every counter, one row per cpu line, in the order of
+            the rows.  The row names are left in self._rows, and the CPU names
+            (everything but the "cpu" total line) in self._names.
         '''
-        result = {}
-        with open("/proc/stat", "r",encoding="utf8") as f:
-            allLines = f.readlines()
-            for line in allLines:
-                cpu = line.replace('\t', ' ').strip().split()
-                if (len(cpu[0]) > 3) and (cpu[0][:3] == "cpu"):
-                    total = 0
-                    idle  = 0
-                    for _index in range( 1, len(cpu)):
-                        total += int(cpu[_index])
-                        if _index == 4 or _index == 5:
-                            idle += int(cpu[_index])
-                    result[cpu[0]] = (total,idle)
-        return result
+        data = self._statFile.read().tobytes()
+        end = 0
+        while data.startswith( b"cpu", end ):
+            end = data.find( b"\n", end ) + 1
+            if end == 0:
+                end = len( data )
+                break
+        tokens = data[:end].split()
+        if self._width == 0:
+            self._width = len( data[:data.find( b"\n" )].split() )
+        rows = tokens[::self._width]
+        if len( rows ) != len( self._rows ):
+            # CPUs were taken offline or brought back, forget the old counters
+            self._rows = [ r.decode() for r in rows ]
+            self._names = self._rows[1:]
+            self._previous = array( 'q', bytes( 8 * (len(tokens) - len(rows)) ))
+        del tokens[::self._width]
+        return array( 'q', map( int, tokens ))
 
     def getPercentages( self ) -> dict[str,float]:
         '''
@@ -375,25 +815,82 @@ class CPULoad:
         a delta from the prior time this function was called.  This data is then run
         through the following equation:
              
-             utilization = ((total - idle)/total) * 100
+             utilization = ((total - idle - iowait)/total) * 100
              
         If the snapshots are taken at relativy consistent intervals, the CPU
         utilization in percent, is reasonably lose to the actual percentage.
         
+        The same read also leaves the per state breakdown of every CPU, see
+        breakdown and cpuBreakdown.
+        
         Returns:
             A dictionary consisting of the name of the CPU, and a floating point
             number representing the current utilization of that CPU.
         '''
         results = {}
-        current = self._getRawData()
-        for _item in current:
-            total = current[_item][0] - self._previousData[_item][0]
-            idle  = current[_item][1] - self._previousData[_item][1]
-            percent = ((total - idle)/total) * 100
-            results[_item] = round(percent,2)
-        self._previousData = current
+        current = self._readCounters()
+        now     = time.monotonic_ns()
+        self._elapsed = (now - self._previousTime) / 1e9
+        self._previousTime = now
+        
+        self._delta    = [ c - p for c, p in zip( current, self._previous ) ]
+        self._previous = current
+        
+        width   = self._width - 1
+        counted = min( CPULoad.COUNTED, width )
+        for row, name in enumerate( self._rows ):
+            base  = row * width
+            total = sum( self._delta[base:base+counted] )
+            idle  = self._delta[base+CPULoad.IDLE] + self._delta[base+CPULoad.IOWAIT]
+            if total <= 0:
+                percent = 0.0
+            else:
+                percent = ((total - idle)/total) * 100
+            if row == 0:
+                self._breakdown = self.cpuBreakdown( name )
+            else:
+                results[name] = round(percent,2)
         return results
     
+    def cpuBreakdown( self, name : str = "cpu" ) -> dict[str,float]:
+        '''
+        Split the time covered by the last call to getPercentages by state, for one CPU.
+        
+        Parameters:
+            name - The CPU, e.g. "cpu2", or "cpu" for the whole system
+            
+        Returns:
+            A dictionary of state name ("user", "system", "iowait", ...) to percent of
+            the time.  Guest time is a part of user and nice time.  The dictionary is
+            empty if the CPU is not known.
+        '''
+        try:
+            row = self._rows.index( name )
+        except ValueError:
+            return {}
+        width   = self._width - 1
+        counted = min( CPULoad.COUNTED, width )
+        delta   = self._delta[row*width:(row+1)*width]
+        total   = sum( delta[:counted] )
+        if total <= 0:
+            return { state : 0.0 for state in CPULoad.STATES[:width] }
+        return { state : round( value * 100 / total, 2 ) for state, value in zip( CPULoad.STATES, delta ) }
+    
+    @property
+    def breakdown( self ) -> dict[str,float]:
+        '''
+        The breakdown by state of the whole system, from the last call to getPercentages.
+        '''
+        return self._breakdown
+    
+    @property
+    def elapsed( self ) -> float:
+        '''
+        The number of seconds covered by the last call to getPercentages.  The
+        percentages are already independent of the period, this is for reference.
+        '''
+        return self._elapsed
+    
     @property
     def cpuNames( self ) -> list[str]:
         '''
@@ -411,49 +908,203 @@ class CPULoad:
         Returns:
             Number of CPU's
         '''
-        return len(self._previousData)
+        return len(self._names)
+    
+class BatteryInfo:
+    '''
+    Read the battery and AC adapter that the oneUpPower driver (see battery/)
+    registers in /sys/class/power_supply.  The attribute files are opened the first
+    time they are read and kept open.  If the driver is not loaded nothing is read,
+    and nothing is reported.
+    
+    Parameters:
+        battery - Name of the battery power supply
+        ac      - Name of the AC adapter power supply
+        root    - Where the power supplies are listed
+    '''
+    # Numeric attributes of the battery
+    ATTRIBUTES = ( "capacity", "charge_now", "charge_full", "time_to_empty_avg", "time_to_full_now" )
+    
+    def __init__( self, battery : str = "BAT0", ac : str = "AC0", root : str = "/sys/class/power_supply" ):
+        self._batteryPath = os.path.join( root, battery )
+        self._acPath      = os.path.join( root, ac )
+        self._files : dict[str,SysfsFile] = {}
+        
+    @property
+    def present( self ) -> bool:
+        '''
+        True when the battery driver is loaded.
+        '''
+        return os.path.isdir( self._batteryPath )
+    
+    def _readInt( self, path : str ) -> int:
+        file = self._files.get( path )
+        if file is None:
+            file = SysfsFile( path, 64 )
+            self._files[path] = file
+        try:
+            return file.readInt()
+        except OSError:
+            # The driver went away, open the file again next time
+            self._files.pop( path ).close()
+            raise
+    
+    @property
+    def status( self ) -> str:
+        '''
+        The charging status, "Charging", "Discharging" or "Full", or "" if there is
+        no battery.
+        '''
+        try:
+            with open( os.path.join( self._batteryPath, "status" ), "r", encoding="utf8" ) as f:
+                return f.read().strip()
+        except OSError:
+            return ""
+    
+    def read( self, out : dict[str,float] = None ) -> dict[str,float]:
+        '''
+        Read the battery.
+        
+        Parameters:
+            out - Optional dictionary to fill in, a new one is created if not given
+            
+        Returns:
+            A dictionary of attribute name to value: capacity in percent, charge in
+            µAh, times in seconds, and "ac_online" which is 1 on mains power.  It is
+            empty if there is no battery.
+        '''
+        if out is None:
+            out = {}
+        if not self.present:
+            return out
+        for name in BatteryInfo.ATTRIBUTES:
+            try:
+                out[name] = float( self._readInt( os.path.join( self._batteryPath, name )))
+            except (OSError, ValueError):
+                out.pop( name, None )
+        try:
+            out["ac_online"] = float( self._readInt( os.path.join( self._acPath, "online" )))
+        except (OSError, ValueError):
+            out.pop( "ac_online", None )
+        return out
     
 class NetworkLoad:
     def __init__(self, networkIgnoreList : list[str]=[]):
-        self._networks = []
-        with os.popen( 'ls -1 /sys/class/net') as command:
-            net_raw = command.read()
-            for l in net_raw.split('\n'):
-                if len(l) == 0:
-                    continue
-                if not l in networkIgnoreList:
-                    self._networks.append( l )
+        self._devices : dict[str,NetDevice] = netDevices( networkIgnoreList )
+        self._networks = list( self._devices )
+        self._files : dict[str,tuple[SysfsFile,SysfsFile]] = {}
+        self._failed : set[str] = set()
         self.prevStats = {}
         for net in self._networks:
             self.prevStats[net] = self._getData(net)
+        self._prevTime : int   = time.monotonic_ns()
+        self._elapsed  : float = 0.0
     @property
     def names( self ):
         return self._networks
     
+    @property
+    def devices( self ) -> dict[str,NetDevice]:
+        '''
+        The inventory of the network interfaces being monitored.
+        
+        Returns:
+            A dictionary of interface name to NetDevice
+        '''
+        return self._devices
+    
+    def addDevice( self, device : NetDevice ) -> None:
+        '''
+        Start monitoring a network interface that appeared after this object was created.
+        
+        Parameters:
+            device - The NetDevice describing the interface
+        '''
+        if device.name in self._devices:
+            return
+        self._devices[device.name] = device
+        self.prevStats[device.name] = self._getData( device.name )
+        self._networks = self._networks + [device.name]
+    
+    def removeDevice( self, name : str ) -> None:
+        '''
+        Stop monitoring a network interface, normally because it went away.
+        
+        Parameters:
+            name - The interface to remove
+        '''
+        if self._devices.pop( name, None ) is None:
+            return
+        self._networks = [ n for n in self._networks if n != name ]
+        self.prevStats.pop( name, None )
+        self._failed.discard( name )
+        self._closeFiles( name )
+    
+    def _closeFiles( self, name : str ) -> None:
+        files = self._files.pop( name, None )
+        if files is not None:
+            files[0].close()
+            files[1].close()
+    
     def _getData( self, name : str ) -> tuple[int,int]:
-        readData = 0
-        writeData = 0
+        '''
+        Read the byte counters of a network device.  The statistic files are opened
+        the first time, and kept open after that.  If they can not be read, the
+        previous counters are returned, so the interface shows no traffic, and the
+        files are opened again on the next read.
+        '''
         try:
-            with open( f"/sys/class/net/{name}/statistics/rx_bytes" ) as f:
-                readData = f.read().strip()
-            with open( f"/sys/class/net/{name}/statistics/tx_bytes" ) as f:
-                writeData = f.read().strip()
+            files = self._files.get( name )
+            if files is None:
+                files = ( SysfsFile( f"/sys/class/net/{name}/statistics/rx_bytes", 64 ),
+                          SysfsFile( f"/sys/class/net/{name}/statistics/tx_bytes", 64 ))
+                self._files[name] = files
+            data = (files[0].readInt(), files[1].readInt())
+            if self._failed:
+                self._failed.discard( name )
+            return data
         except Exception as e:
-            print( f"Error {e}" )
-        
-        #print( f"{readData} {writeData}" )
-        return (int(readData), int(writeData))
+            if not name in self._failed:
+                print( f"Error reading network statistics for {name}: {e}" )
+                self._failed.add( name )
+            self._closeFiles( name )
+            return self.prevStats.get( name, (0, 0) )
         
     @property
     def stats(self) -> dict[tuple[int,int]]:
+        '''
+        Obtain the number of bytes received and sent by each network device since the
+        last time the stats or rates were read.
+        
+        Returns:
+            A dictionary of device name to a (read, write) tuple of byte counts.
+        '''
         data = {}
         curstats = {}
+        now = time.monotonic_ns()
         for net in self._networks:
             curstats[net] = self._getData( net )
             data[net] = ((curstats[net][0] - self.prevStats[net][0]),
                          (curstats[net][1] - self.prevStats[net][1]))
         self.prevStats = curstats
+        self._elapsed  = (now - self._prevTime) / 1e9
+        self._prevTime = now
         return data
+    
+    @property
+    def rates(self) -> dict[str,tuple[float,float]]:
+        '''
+        Just like stats, but the byte counts are divided by the actual time elapsed
+        since the last read, so the values are bytes per second no matter how often
+        this is called.
+        
+        Returns:
+            A dictionary of device name to a (read, write) tuple in bytes per second.
+        '''
+        data = self.stats
+        if self._elapsed <= 0:
+            return { net : (0.0, 0.0) for net in data }
+        return { net : (data[net][0] / self._elapsed, data[net][1] / self._elapsed) for net in data }
             
 if __name__ == "__main__":
     
@@ -469,12 +1120,13 @@ if __name__ == "__main__":
     cpuinfo = CPUInfo()
     print( f"CPU Temperature = {cpuinfo.temperature}" )
     print( f"CPU Fan Speed   = {cpuinfo.CPUFanSpeed}" )
+    print( f"CPU Fan PWM     = {cpuinfo.CPUFanPWM:.0f}%" )
     print( f"CPU Model       = {cpuinfo.model}" )
        
     test = multiDriveStat()
     print( test.drives )
     for drive in test.drives:
-        print( f"Drive {drive} size is {test.driveSize( drive )}" )
+        print( f"Drive {drive} size is {test.driveSize( drive )} {test.devices[drive]}" )
     print( test.readWriteSectors() )
     
     network = NetworkLoad( ['lo','eth0'])